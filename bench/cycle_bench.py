@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+import importlib.util
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import logbook
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from core import config, database, reporter, tracing, logpipe, inventory, ssh_client, metrics
+from fake_fleet import FakeFleet, build_specs
+
+def _load_checker():
+    spec = importlib.util.spec_from_file_location("gpu_node_checker", os.path.join(REPO_ROOT, "gpu-node-checker.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["gpu_node_checker"] = module
+    spec.loader.exec_module(module)
+    return module
+
+checker = _load_checker()
+
+SQLITE_WRITES = multiprocessing.Value('i', 0)
+WEBHOOK_CALLS = multiprocessing.Value('i', 0)
+
+def _quiet_logging():
+    logbook.NullHandler().push_application()
+    return logbook.Logger("GPU-INSPECTOR")
+
+def _count_sqlite_writes(func):
+    def wrapper(*args, **kwargs):
+        with SQLITE_WRITES.get_lock():
+            SQLITE_WRITES.value += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+_original_process_one_node = checker.process_one_node
+
+def timed_process_one_node(node_spec):
+    start = time.perf_counter()
+    node_report = _original_process_one_node(node_spec)
+    if node_report is not None:
+        node_report['bench_latency'] = time.perf_counter() - start
+    return node_report
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with WEBHOOK_CALLS.get_lock():
+            WEBHOOK_CALLS.value += 1
+        body = b'{"code":0}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _start_webhook_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/hook"
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+def run_case(args, node_count, workers, webhook_url):
+    specs = build_specs(node_count, latency=args.latency, fail_ratio=args.fail_ratio, hang_ratio=args.hang_ratio,
+                        down_ratio=args.down_ratio, auth_fail_ratio=args.auth_fail_ratio, muxi_ratio=args.muxi_ratio,
+                        hang_seconds=args.hang_seconds, seed=args.seed)
+    fleet = FakeFleet(specs, processes=args.fleet_processes, bastion=args.bastion).start()
+    all_configs = config.load_all_configs()
+    tmp_dir = tempfile.mkdtemp(prefix="gpu-bench-")
+    app_config = {
+        **all_configs,
+        'SQLITE_DB_PATH': os.path.join(tmp_dir, 'status.db'),
+        'MAX_WORKERS': workers,
+        'MYSQL': None,
+        'SSH_RECORD_DIR': args.record_dir,
+        'TRACE': {'dir': args.trace_dir, 'sample_rate': 1.0} if args.trace_dir else None,
+        'BASTIONS': fleet.bastion_config(args.bastion_channels) if args.bastion else None,
+        'FEISHU_WEBHOOKS': {group: webhook_url for group in ('hardware_group', 'software_group', 'analytics_group', 'table_sync_webhook')},
+    }
+    if not args.feishu_limits:
+        app_config['FEISHU_RATE_LIMIT'] = {'per_minute': 10 ** 9, 'burst': 10 ** 6}
+    reporter.configure_webhooks(app_config)
+    ssh_client.configure_bastions(app_config['BASTIONS'])
+    tracing.configure(app_config['TRACE'])
+    event_sink = database.MySQLEventSink(None)
+    table_sync = reporter.TableSyncBatcher(app_config)
+    database.init_sqlite(app_config['SQLITE_DB_PATH']).close()
+
+    rows = []
+    try:
+        for cycle in range(args.cycles):
+            base = {'sqlite_writes': SQLITE_WRITES.value, 'webhook_calls': WEBHOOK_CALLS.value, **fleet.stats.snapshot(),
+                    'fingerprint_hits': metrics.counter_total('inspector_fingerprint_hits_total'),
+                    'fingerprint_misses': metrics.counter_total('inspector_fingerprint_misses_total')}
+            start = time.perf_counter()
+            node_reports = checker.run_inspection_cycle(args.runner, inventory.from_specs(fleet.node_specs()), all_configs['profiles'],
+                                                        app_config, all_configs['thresholds'], event_sink, table_sync)
+            table_sync.flush()
+            wall = time.perf_counter() - start
+            latencies = [r['bench_latency'] for r in node_reports if r]
+            stats = fleet.stats.snapshot()
+            rows.append({
+                'nodes': node_count,
+                'workers': workers,
+                'cycle': cycle + 1,
+                'wall_s': round(wall, 3),
+                'node_p50_s': round(_percentile(latencies, 50), 3),
+                'node_p90_s': round(_percentile(latencies, 90), 3),
+                'node_p99_s': round(_percentile(latencies, 99), 3),
+                'node_max_s': round(max(latencies, default=0.0), 3),
+                'ssh_handshakes': stats['handshakes'] - base['handshakes'],
+                'ssh_commands': stats['commands'] - base['commands'],
+                'bastion_handshakes': stats['bastion_handshakes'] - base['bastion_handshakes'],
+                'sqlite_writes': SQLITE_WRITES.value - base['sqlite_writes'],
+                'fp_hits': metrics.counter_total('inspector_fingerprint_hits_total') - base['fingerprint_hits'],
+                'fp_misses': metrics.counter_total('inspector_fingerprint_misses_total') - base['fingerprint_misses'],
+                'webhook_calls': WEBHOOK_CALLS.value - base['webhook_calls'],
+            })
+    finally:
+        fleet.stop()
+    return rows
+
+def _print_table(rows):
+    columns = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="使用本地模拟 SSH 节点对 run_inspection_cycle 进行压测")
+    parser.add_argument('--nodes', default='10,50', help="节点数量列表，逗号分隔")
+    parser.add_argument('--workers', default='5,10', help="MAX_WORKERS 取值列表，逗号分隔")
+    parser.add_argument('--runner', default='gpu', choices=['gpu', 'system', 'network', 'storage'])
+    parser.add_argument('--cycles', type=int, default=2, help="每组参数连续执行的巡检轮数")
+    parser.add_argument('--latency', type=float, default=0.02, help="模拟命令执行延迟 (秒)")
+    parser.add_argument('--fail-ratio', type=float, default=0.0, help="所有命令返回非零退出码的节点比例")
+    parser.add_argument('--hang-ratio', type=float, default=0.0, help="命令卡住的节点比例")
+    parser.add_argument('--hang-seconds', type=float, default=20.0)
+    parser.add_argument('--down-ratio', type=float, default=0.0, help="SSH 端口拒绝连接的节点比例")
+    parser.add_argument('--auth-fail-ratio', type=float, default=0.0, help="SSH 认证失败的节点比例")
+    parser.add_argument('--muxi-ratio', type=float, default=0.0, help="沐曦节点比例")
+    parser.add_argument('--bastion', action='store_true', help="所有节点经本地模拟跳板机连接")
+    parser.add_argument('--bastion-channels', type=int, default=64, help="配合 --bastion，跳板机通道数上限 (max_channels)")
+    parser.add_argument('--fleet-processes', type=int, default=2, help="运行模拟节点的进程数")
+    parser.add_argument('--feishu-limits', action='store_true', help="启用真实的飞书限频")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record-dir', help="同时录制命令输出到该目录，供 replay_bench.py 回放")
+    parser.add_argument('--trace-dir', help="每轮都写入 Chrome trace 轨迹到该目录")
+    parser.add_argument('--json', help="将结果写入 JSON 文件")
+    parser.add_argument('--verbose', action='store_true', help="输出巡检程序日志")
+    parser.add_argument('--log-file', help="经日志管道写入 JSON 行日志文件 (控制台只输出 ERROR)")
+    parser.add_argument('--log-sample-rate', type=float, default=1.0, help="配合 --log-file，例行日志的节点采样比例")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        checker.setup_logging = _quiet_logging
+        _quiet_logging()
+    if args.log_file:
+        logpipe.start({'file': args.log_file, 'console_level': 'ERROR', 'routine_sample_rate': args.log_sample_rate})
+    for name in ('upsert_sqlite_record', 'update_issue_status', 'update_issue_tracking'):
+        setattr(database, name, _count_sqlite_writes(getattr(database, name)))
+    checker.process_one_node = timed_process_one_node
+
+    server, webhook_url = _start_webhook_server()
+    rows = []
+    try:
+        for node_count in [int(n) for n in args.nodes.split(',')]:
+            for workers in [int(w) for w in args.workers.split(',')]:
+                rows.extend(run_case(args, node_count, workers, webhook_url))
+    finally:
+        server.shutdown()
+
+    _print_table(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import random
+import logging
+import socket
+import threading
+import time
+import multiprocessing
+
+import paramiko
+
+# 节点类型探测命令在 fail 模式下仍正常返回，使检查项本身失败而不是被识别为 unknown
+DISCOVERY_COMMANDS = ("which mxgpu-smi", "nvidia-smi -L")
+
+# 模拟节点上常见命令的返回: (命令中包含的关键字, 退出码, 输出)。按顺序匹配，第一个命中的生效。
+NVIDIA_OUTPUTS = [
+    ("which mxgpu-smi", 1, ""),
+    ("nvidia-smi -L", 0, "\n".join(f"GPU {i}: NVIDIA H800 (UUID: GPU-fake-{i:04d})" for i in range(8))),
+    ("gpu_uuid", 0, "8"),
+    ("temperature.gpu", 0, None),
+    ("Thermal Slowdown", 0, "\n".join("        Thermal Slowdown                  : Not Active" for _ in range(8))),
+    ("ecc.errors.uncorrected", 0, "\n".join("0" for _ in range(8))),
+    ("grep -i xid", 1, ""),
+    ("nv_peer_mem", 0, "1"),
+    ("grep -c 'bridge'", 0, "4"),
+    ("ConnectX-7", 0, ""),
+    ("nvidia-fabricmanager", 0, "active"),
+    ("ACSCtl", 1, ""),
+]
+
+MUXI_OUTPUTS = [
+    ("which mxgpu-smi", 0, "/usr/bin/mxgpu-smi"),
+    ("mxgpu-smi -L", 0, "\n".join(f"GPU#{i} MXC500 (UUID: GPU-{i:08x})" for i in range(8))),
+    ("temperature.gpu", 0, None),
+    ("-q -d ECC", 0, "\n".join(f"GPU {i} ECC Errors : 0" for i in range(8))),
+    ("pci.link.gen.current", 0, "\n".join("5, 5, 16, 16" for _ in range(8))),
+    ("-q -d PERFORMANCE", 0, "\n".join("    Thermal Slowdown : Not Active" for _ in range(8))),
+    ("metaxlink -s", 0, "\n".join(f"Link {i}: UP" for i in range(7))),
+    ("ACSCtl", 1, ""),
+]
+
+def _ib_counters(rng):
+    # 8 个 IB 端口的 sysfs 计数器，数据计数按当前时间增长 (约 160 Gbps)，错误计数为 0
+    now = time.time()
+    lines = ["fake-boot-id", f"{now:.6f}"]
+    for dev in range(8):
+        for name, value in (('port_rcv_data', int(now * 5e9)), ('port_xmit_data', int(now * 5e9)),
+                            ('symbol_error', 0), ('link_downed', 0), ('port_rcv_errors', 0), ('port_xmit_discards', 0)):
+            lines.append(f"mlx5_{dev}/ports/1/counters/{name}:{value}")
+        lines.append(f"mlx5_{dev}/ports/1/hw_counters/out_of_buffer:0")
+    return "\n".join(lines)
+
+COMMON_OUTPUTS = [
+    ("/sys/class/infiniband", 0, _ib_counters),
+    ("Hardware error", 1, ""),
+    ("df -Ph", 0, "/dev/sda1       100G   40G   60G  40% /"),
+    ("free -m", 0, "35"),
+    ("link_state: down", 1, ""),
+    ("ibdev2netdev | wc -l", 0, "8"),
+    ("ip rule list | wc -l", 0, "19"),
+    ("lookup", 0, ""),
+    ("gpfs", 0, "mounted"),
+]
+
+# 沐曦快照命令的分段标记，与 checks/muxi_checks.py 中的 SNAPSHOT_MARK 一致
+MUXI_SNAPSHOT_MARK = "@@mxgpu-smi:"
+
+class FleetStats:
+    # 跨进程共享的计数器，供压测脚本读取
+    def __init__(self):
+        self.handshakes = multiprocessing.Value('i', 0)
+        self.commands = multiprocessing.Value('i', 0)
+        self.bastion_handshakes = multiprocessing.Value('i', 0)
+        self.bastion_channels = multiprocessing.Value('i', 0)
+
+    def incr(self, counter):
+        with counter.get_lock():
+            counter.value += 1
+
+    def snapshot(self):
+        return {'handshakes': self.handshakes.value, 'commands': self.commands.value,
+                'bastion_handshakes': self.bastion_handshakes.value, 'bastion_channels': self.bastion_channels.value}
+
+class FakeNode(paramiko.ServerInterface):
+    def __init__(self, spec, stats):
+        self.spec = spec
+        self.stats = stats
+        self.rng = random.Random(spec['port'])
+
+    def check_auth_password(self, username, password):
+        if self.spec.get('mode') == 'auth_fail':
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        self.stats.incr(self.stats.commands)
+        threading.Thread(target=self._run_command, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def _lookup(self, command):
+        if MUXI_SNAPSHOT_MARK in command:
+            return self._lookup_snapshot(command)
+        table = MUXI_OUTPUTS if self.spec.get('profile') == 'muxi' else NVIDIA_OUTPUTS
+        for keyword, exit_code, output in table + COMMON_OUTPUTS:
+            if keyword in command:
+                if output is None:
+                    output = "\n".join(str(self.rng.randint(55, 65)) for _ in range(8))
+                elif callable(output):
+                    output = output(self.rng)
+                return exit_code, output
+        return 127, ""
+
+    def _lookup_snapshot(self, command):
+        # 按段匹配各个子命令，拼出与节点上一致的带分隔标记的输出
+        lines = []
+        for segment in command.split(f"echo '{MUXI_SNAPSHOT_MARK}")[1:]:
+            name, _, rest = segment.partition("'")
+            exit_code, output = self._lookup(rest.split(" 2>&1")[0])
+            lines.append(f"{MUXI_SNAPSHOT_MARK}{name}")
+            if output:
+                lines.append(output)
+            lines.append(f"{MUXI_SNAPSHOT_MARK}rc={exit_code}")
+        return 0, "\n".join(lines)
+
+    def _run_command(self, channel, command):
+        try:
+            # paramiko 在 check_channel_exec_request 返回后才发送 exec 确认；
+            # 至少等待 10ms，避免退出码先于确认到达导致客户端报 "Channel closed"
+            latency = self.spec.get('latency', 0.0) * self.rng.uniform(0.5, 1.5)
+            time.sleep(max(latency, 0.01))
+            mode = self.spec.get('mode')
+            if mode == 'hang':
+                time.sleep(self.spec.get('hang_seconds', 30))
+            if mode == 'fail' and command.strip() not in DISCOVERY_COMMANDS:
+                channel.sendall_stderr(b"fake failure: command not available\n")
+                channel.send_exit_status(2)
+            else:
+                exit_code, output = self._lookup(command)
+                if output:
+                    channel.sendall((output + "\n").encode())
+                channel.send_exit_status(exit_code)
+        except Exception:
+            pass
+        finally:
+            channel.close()
+
+def _serve_connection(sock, spec, host_key, stats):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    try:
+        transport.start_server(server=FakeNode(spec, stats))
+        stats.incr(stats.handshakes)
+        # Transport 只弱引用 channel，必须持有 accept 返回的对象，否则会被回收并关闭
+        channels = []
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is not None:
+                channels = [c for c in channels if not c.closed] + [channel]
+    except Exception:
+        pass
+    finally:
+        transport.close()
+
+class FakeBastion(paramiko.ServerInterface):
+    # 只接受 direct-tcpip 通道的跳板机，通道另一端连接到模拟节点
+    def __init__(self, stats):
+        self.stats = stats
+        self.destinations = {}
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.destinations[chanid] = socket.create_connection(destination, timeout=5)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        self.stats.incr(self.stats.bastion_channels)
+        return paramiko.OPEN_SUCCEEDED
+
+def _pump(src_recv, dst_send, on_close):
+    try:
+        while True:
+            data = src_recv(65536)
+            if not data:
+                break
+            dst_send(data)
+    except Exception:
+        pass
+    finally:
+        on_close()
+
+def _serve_bastion_connection(sock, host_key, stats):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    server = FakeBastion(stats)
+    try:
+        transport.start_server(server=server)
+        stats.incr(stats.bastion_handshakes)
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is None:
+                continue
+            upstream = server.destinations.pop(channel.get_id())
+            upstream.settimeout(None)
+            threading.Thread(target=_pump, args=(channel.recv, upstream.sendall, upstream.close), daemon=True).start()
+            threading.Thread(target=_pump, args=(upstream.recv, channel.sendall, channel.close), daemon=True).start()
+    except Exception:
+        pass
+    finally:
+        transport.close()
+
+def _serve_bastion(listener, host_key, stats, ready):
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    ready.set()
+    while True:
+        sock, _ = listener.accept()
+        threading.Thread(target=_serve_bastion_connection, args=(sock, host_key, stats), daemon=True).start()
+
+def _serve_node(listener, spec, host_key, stats):
+    while True:
+        sock, _ = listener.accept()
+        threading.Thread(target=_serve_connection, args=(sock, spec, host_key, stats), daemon=True).start()
+
+def _serve_nodes(specs, host_key, stats, ready):
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    for spec, listener in specs:
+        threading.Thread(target=_serve_node, args=(listener, spec, host_key, stats), daemon=True).start()
+    ready.set()
+    while True:
+        time.sleep(3600)
+
+def build_specs(count, latency=0.0, fail_ratio=0.0, hang_ratio=0.0, down_ratio=0.0,
+                auth_fail_ratio=0.0, muxi_ratio=0.0, hang_seconds=30, seed=0):
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        roll = rng.random()
+        mode = None
+        for name, ratio in (('down', down_ratio), ('auth_fail', auth_fail_ratio), ('hang', hang_ratio), ('fail', fail_ratio)):
+            if roll < ratio:
+                mode = name
+                break
+            roll -= ratio
+        specs.append({
+            'index': i,
+            'profile': 'muxi' if rng.random() < muxi_ratio else 'nvidia',
+            'latency': latency,
+            'mode': mode,
+            'hang_seconds': hang_seconds,
+        })
+    return specs
+
+class FakeFleet:
+    # 在独立进程中启动 N 个本地 SSH 服务，避免与被测巡检程序争抢 GIL
+    def __init__(self, specs, processes=1, bastion=False):
+        self.specs = specs
+        self.processes = max(processes, 1)
+        self.bastion = bastion
+        self.bastion_port = None
+        self.stats = FleetStats()
+        self._procs = []
+        self._listeners = []
+
+    def start(self):
+        host_key = paramiko.RSAKey.generate(2048)
+        bound = []
+        for spec in self.specs:
+            # 每个节点使用独立的回环地址，保证 (host, type) 状态记录互不冲突
+            i = spec['index']
+            spec['address'] = f"127.{1 + i // 65025}.{(i // 255) % 255}.{i % 255 + 1}"
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((spec['address'], 0))
+            spec['port'] = listener.getsockname()[1]
+            if spec['mode'] == 'down':
+                # 端口保留但不监听，连接会被拒绝
+                self._listeners.append(listener)
+                continue
+            listener.listen(64)
+            bound.append((spec, listener))
+
+        for i in range(self.processes):
+            ready = multiprocessing.Event()
+            proc = multiprocessing.Process(target=_serve_nodes, args=(bound[i::self.processes], host_key, self.stats, ready), daemon=True)
+            proc.start()
+            ready.wait(30)
+            self._procs.append(proc)
+        if self.bastion:
+            # 跳板机在独立进程中转发 direct-tcpip 通道，节点连接都经过它
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(64)
+            self.bastion_port = listener.getsockname()[1]
+            ready = multiprocessing.Event()
+            proc = multiprocessing.Process(target=_serve_bastion, args=(listener, host_key, self.stats, ready), daemon=True)
+            proc.start()
+            ready.wait(30)
+            self._procs.append(proc)
+            listener.close()
+        for _, listener in bound:
+            listener.close()
+        return self
+
+    def node_specs(self, username='root', password='fake'):
+        return [{
+            'host': spec['address'],
+            'hostname': f"fake{spec['index']:05d}",
+            'port': spec['port'],
+            'username': username,
+            'password': password,
+            **({'bastion': 'bench'} if self.bastion else {}),
+        } for spec in self.specs]
+
+    def bastion_config(self, max_channels=64):
+        return {'bench': {'host': '127.0.0.1', 'port': self.bastion_port, 'username': 'root', 'password': 'fake',
+                          'max_channels': max_channels}}
+
+    def stop(self):
+        for proc in self._procs:
+            proc.terminate()
+            proc.join(5)
+        for listener in self._listeners:
+            listener.close()
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import random
+import fnmatch
+import argparse
+import tracemalloc
+
+import logbook
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from core import config, runners, counters
+from checks import muxi_checks
+
+NODE_SPEC = {'host': 'bench-node', 'hostname': 'bench-node'}
+
+# 合成输出: 每个生成函数返回 [(场景, 输出, 预热输出)]。预热输出先解析一次并写回采样 (IB 计数器速率需要上一次采样)。
+# 规模超过线上命令实际返回的范围 (如 dmesg 经 tail -n 20 截断) 时，用于观察解析函数在大输入下的退化。
+IB_COUNTERS = ('excessive_buffer_overrun_errors', 'link_downed', 'link_error_recovery', 'local_link_integrity_errors',
+               'multicast_rcv_packets', 'multicast_xmit_packets', 'port_rcv_constraint_errors', 'port_rcv_data',
+               'port_rcv_errors', 'port_rcv_packets', 'port_rcv_remote_physical_errors', 'port_rcv_switch_relay_errors',
+               'port_xmit_constraint_errors', 'port_xmit_data', 'port_xmit_discards', 'port_xmit_packets', 'port_xmit_wait',
+               'symbol_error', 'unicast_rcv_packets', 'unicast_xmit_packets', 'VL15_dropped')
+IB_HW_COUNTERS = ('duplicate_request', 'implied_nak_seq_err', 'lifespan', 'local_ack_timeout_err', 'np_cnp_sent',
+                  'np_ecn_marked_roce_packets', 'out_of_buffer', 'out_of_sequence', 'packet_seq_err', 'req_cqe_error',
+                  'req_cqe_flush_error', 'req_remote_access_errors', 'req_remote_invalid_request', 'resp_cqe_error',
+                  'resp_cqe_flush_error', 'resp_local_length_error', 'resp_remote_access_errors', 'rnr_nak_retry_err',
+                  'rp_cnp_handled', 'rp_cnp_ignored', 'rx_atomic_requests', 'rx_read_requests', 'rx_write_requests')
+
+def _lines(items):
+    return "\n".join(items)
+
+def _dmesg(count, rng, text):
+    return _lines(f"[Mon Oct 19 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} 2026] {text(i, rng)}" for i in range(count))
+
+def _xid_line(i, rng):
+    return f"NVRM: Xid (PCI:0000:{rng.randint(0, 255):02x}:00): 13, pid={rng.randint(1000, 99999)}, name=python, Graphics SM Warp Exception"
+
+def _hw_error_line(i, rng):
+    return f"mce: [Hardware Error]: Machine check events logged, CPU {rng.randint(0, 255)} bank {rng.randint(0, 31)}"
+
+def _ib_counters(args, rng, seconds, errors):
+    lines = ["c0ffee00-0000-4000-8000-000000000001", f"{1760860800 + seconds:.6f}"]
+    for port in range(args.ib_ports):
+        device = f"mlx5_{port}"
+        for name in IB_COUNTERS:
+            value = seconds * 4_000_000_000 if name.endswith('_data') else (errors * (port % 3) if 'error' in name else seconds * 1000)
+            lines.append(f"{device}/ports/1/counters/{name}:{value}")
+        for name in IB_HW_COUNTERS:
+            lines.append(f"{device}/ports/1/hw_counters/{name}:{errors if 'err' in name else seconds * 10}")
+    return _lines(lines)
+
+def _muxi_snapshot(args, rng, faulty):
+    mark = muxi_checks.SNAPSHOT_MARK
+    temperature = [str(rng.randint(90, 95) if faulty and i % 7 == 0 else rng.randint(55, 65)) for i in range(args.gpus)]
+    pcie = [f"{4 if faulty and i % 5 == 0 else 5}, 5, 16, 16" for i in range(args.gpus)]
+    ecc = [line for i in range(args.gpus) for line in (f"GPU {i:08x}", f"    ECC Errors : {1 if faulty and i % 9 == 0 else 0}")]
+    performance = [line for i in range(args.gpus)
+                   for line in (f"GPU {i:08x}", f"    Thermal Slowdown : {'Active' if faulty and i % 11 == 0 else 'Not Active'}")]
+    metaxlink = [f"Link {i}: {'DOWN' if faulty and i % 13 == 0 else 'UP'}" for i in range(args.gpus * 7)]
+    sections = []
+    listing = [f"GPU#{i} MXC500 (UUID: GPU-{i:08x})" for i in range(args.gpus)]
+    for name, lines in (('list', listing), ('temperature', temperature), ('pcie', pcie), ('ecc', ecc), ('performance', performance),
+                        ('metaxlink', metaxlink)):
+        sections.extend([f"{mark}{name}", *lines, f"{mark}rc=0"])
+    return _lines(sections)
+
+def _muxi(args, rng):
+    return [('ok', _muxi_snapshot(args, rng, False), None), ('faulty', _muxi_snapshot(args, rng, True), None)]
+
+GENERATORS = {
+    "gpu.count": lambda args, rng: [('ok', str(args.gpus), None)],
+    "gpu.temperature": lambda args, rng: [
+        ('ok', _lines(str(rng.randint(55, 70)) for _ in range(args.gpus)), None),
+        ('hot', _lines(str(rng.randint(81, 95) if i % 4 == 0 else rng.randint(55, 70)) for i in range(args.gpus)), None)],
+    "gpu.thermal_slowdown": lambda args, rng: [
+        ('ok', _lines("        Thermal Slowdown                  : Not Active" for _ in range(args.gpus)), None),
+        ('active', _lines(f"        Thermal Slowdown                  : {'Active' if i % 3 == 0 else 'Not Active'}"
+                          for i in range(args.gpus)), None)],
+    "gpu.ecc_soft_error": lambda args, rng: [
+        ('ok', _lines("0" for _ in range(args.gpus)), None),
+        ('errors', _lines(str(rng.randint(1, 100) if i % 5 == 0 else 0) for i in range(args.gpus)), None)],
+    "gpu.xid_error": lambda args, rng: [
+        ('info', _dmesg(args.dmesg_lines, rng, _xid_line), None),
+        ('critical', _dmesg(args.dmesg_lines, rng, _xid_line) + "\nNVRM: Xid: 79, GPU has fallen off the bus.", None)],
+    "gpu.nvlink_status": lambda args, rng: [('ok', "4", None)],
+    "gpu.pcie_status": lambda args, rng: [
+        ('ok', "", None),
+        ('degraded', _lines(f"DEGRADED: Device 0000:{i:02x}:00.0. Capability:[LnkCap: Port #0, Speed 32GT/s, Width x16], "
+                            f"Current Status:[LnkSta: Speed 16GT/s (downgraded), Width x16]" for i in range(args.ib_ports)), None)],
+    "gpu.gdr_status": lambda args, rng: [('ok', "1", None)],
+    "gpu.acs_status": lambda args, rng: [
+        ('ok', "", None),
+        ('enabled', _lines("\t\tACSCtl:\tSrcValid+ TransBlk- ReqRedir+ CmpltRedir+ UpstreamFwd+ EgressCtrl- DirectTrans-"
+                           for _ in range(args.gpus * 4)), None)],
+    "gpu.fabric_manager_status": lambda args, rng: [('ok', "active", None)],
+    "system.disk_usage": lambda args, rng: [('ok', "/dev/sda1       100G   40G   60G  40% /", None)],
+    "system.memory_usage": lambda args, rng: [('ok', "35", None)],
+    "system.hw_error": lambda args, rng: [('ok', "", None), ('errors', _dmesg(args.dmesg_lines, rng, _hw_error_line), None)],
+    "network.route": lambda args, rng: [('ok', "", None), ('empty_tables', _lines(str(100 + i) for i in range(args.route_tables)), None)],
+    "network.ib_device_status": lambda args, rng: [
+        ('ok', "", None),
+        ('down', _lines(f"0000:{i:02x}:00.0 mlx5_{i} (MT4129 - MCX75310AAS-NEAT) ConnectX-7 fw 28.39.1002 port 1 (DOWN  ) ==> ib{i} (Down)"
+                        f" link_state: down" for i in range(args.ib_ports)), None)],
+    "network.ib_device_count": lambda args, rng: [('ok', str(args.ib_ports), None)],
+    "network.ip_rule": lambda args, rng: [('ok', "19", None)],
+    "network.traffic": lambda args, rng: [('ok', _ib_counters(args, rng, 60, 0), _ib_counters(args, rng, 0, 0))],
+    "network.ib_link_errors": lambda args, rng: [('errors', _ib_counters(args, rng, 60, 500), _ib_counters(args, rng, 0, 0))],
+    "network.ib_port_errors": lambda args, rng: [('errors', _ib_counters(args, rng, 60, 500), _ib_counters(args, rng, 0, 0))],
+    "storage.gpfs": lambda args, rng: [('ok', "mounted", None)],
+    **{name: _muxi for name, (module_name, _, _) in runners.CHECK_REGISTRY.items() if module_name == "muxi_checks"},
+}
+
+def _payload(output):
+    # 每次调用使用新的 payload: 解析函数会在 payload 上缓存共享的中间结果 (沐曦快照表、IB 计数器速率)
+    return {'success': True, 'output': output}
+
+_REFERENCE_TEXT = _lines(f"GPU {i}: {i * 7 % 100}, 5, 5, 16, 16" for i in range(256))
+
+def _reference_parse(result_payload, node_spec, thresholds):
+    # 固定的参考负载 (逐行切分与整数转换)，用于折算不同机器与不同时刻的 CPU 速度
+    return [int(part) for line in result_payload['output'].splitlines() for part in line.split(':')[1].split(',')]
+
+def calibrate(min_time, repeat):
+    return measure(_reference_parse, _REFERENCE_TEXT, {}, min_time, repeat, allocations=False)['calls_per_sec']
+
+def measure(parse, output, thresholds, min_time, repeat, allocations=True):
+    # 1. 吞吐: 按 timeit 的方式逐步加倍调用次数，直到单批耗时超过 min_time；再重复 repeat 批取最快的一批，减少调度噪声
+    def run_batch(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            parse(_payload(output), NODE_SPEC, thresholds)
+        return time.perf_counter() - start
+
+    number = 1
+    while run_batch(number) < min_time:
+        number *= 2
+    per_call = min(run_batch(number) for _ in range(repeat)) / number
+    if not allocations:
+        return {'calls_per_sec': round(1 / per_call, 1)}
+
+    # 2. 内存分配: 单次调用的分配峰值与调用结束后仍被持有的内存 (含返回结果与缓存在 payload 上的中间结果)
+    tracemalloc.start()
+    payload = _payload(output)
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = parse(payload, NODE_SPEC, thresholds)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'calls_per_sec': round(1 / per_call, 1),
+        'us_per_call': round(per_call * 1e6, 2),
+        'mb_per_sec': round(len(output) / per_call / 1e6, 2),
+        'alloc_peak_kib': round((peak - before) / 1024, 1),
+        'retained_kib': round((after - before) / 1024, 1),
+        'success': result.success,
+    }
+
+def _compare(rows, baseline, tolerance, alloc_tolerance, speed_factor):
+    # 与基线比较: 吞吐 (按参考负载折算机器速度差异) 下降超过 tolerance、分配峰值增长超过 alloc_tolerance
+    # (另有 4 KiB 的绝对余量) 视为回归。分配量不受机器负载影响，可以使用更严格的比例
+    regressions = []
+    for row in rows:
+        base = baseline.get(row['key'])
+        if base is None:
+            row['vs_baseline'] = 'new'
+            continue
+        speed = row['calls_per_sec'] / base['calls_per_sec'] / speed_factor if base['calls_per_sec'] else 1.0
+        row['vs_baseline'] = f"{speed:.2f}x"
+        if speed < 1 - tolerance:
+            regressions.append(f"{row['key']}: 吞吐 {row['calls_per_sec']} calls/s，基线 {base['calls_per_sec']} ({speed:.2f}x)")
+        if row['alloc_peak_kib'] > base['alloc_peak_kib'] * (1 + alloc_tolerance) + 4:
+            regressions.append(f"{row['key']}: 分配峰值 {row['alloc_peak_kib']} KiB，基线 {base['alloc_peak_kib']} KiB")
+        if row['success'] != base['success']:
+            regressions.append(f"{row['key']}: 解析结果由 success={base['success']} 变为 {row['success']}")
+    return regressions
+
+def _print_table(rows):
+    columns = [c for c in ('check', 'case', 'input_kib', 'calls_per_sec', 'us_per_call', 'mb_per_sec', 'alloc_peak_kib',
+                           'retained_kib', 'success', 'vs_baseline') if any(c in r for r in rows)]
+    widths = [max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(c, '')).rjust(w) for c, w in zip(columns, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="以大规模合成输出测量各检查项解析函数的吞吐与内存分配，并与保存的基线比较")
+    parser.add_argument('--gpus', type=int, default=64, help="每节点 GPU 数量")
+    parser.add_argument('--dmesg-lines', type=int, default=10000, help="dmesg 类输出的行数")
+    parser.add_argument('--route-tables', type=int, default=200, help="策略路由表数量")
+    parser.add_argument('--ib-ports', type=int, default=32, help="IB 端口数量")
+    parser.add_argument('--checks', default='*', help="只测量匹配的检查项，逗号分隔的通配符，如 'gpu.*,network.traffic'")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每个解析函数的最短计时 (秒)")
+    parser.add_argument('--repeat', type=int, default=5, help="计时重复批数，取最快的一批")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help="将结果保存为基线 JSON 文件")
+    parser.add_argument('--baseline', help="与该基线 JSON 文件比较，出现回归时以非零状态退出")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="允许的吞吐下降比例")
+    parser.add_argument('--alloc-tolerance', type=float, default=0.1, help="允许的分配峰值增长比例")
+    parser.add_argument('--json', help="将本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    logbook.NullHandler().push_application()
+    # 数量类阈值与合成规模一致，ok 场景应解析为成功
+    thresholds = {**(config.load_all_configs() or {}).get('thresholds', {}),
+                  'gpu_count': args.gpus, 'muxi_gpu_count': args.gpus, 'expected_ibdev_count': args.ib_ports}
+    patterns = [p.strip() for p in args.checks.split(',') if p.strip()]
+    rng = random.Random(args.seed)
+
+    reference = calibrate(args.min_time, args.repeat)
+    rows = []
+    for check_name in sorted(runners.CHECK_REGISTRY):
+        if not any(fnmatch.fnmatchcase(check_name, p) for p in patterns):
+            continue
+        generate = GENERATORS.get(check_name)
+        if generate is None:
+            print(f"检查项 {check_name} 没有合成输出生成函数，跳过。")
+            continue
+        _, parse = runners.resolve_check(check_name)
+        for case, output, prime in generate(args, rng):
+            if prime is not None:
+                parse(_payload(prime), NODE_SPEC, thresholds)
+                counters.merge(counters.drain())
+            row = {'key': f"{check_name}:{case}", 'check': check_name, 'case': case, 'input_kib': round(len(output) / 1024, 1),
+                   **measure(parse, output, thresholds, args.min_time, args.repeat)}
+            counters.drain()
+            rows.append(row)
+
+    if not rows:
+        print(f"没有匹配 '{args.checks}' 的检查项。")
+        sys.exit(1)
+
+    # 计时前后各测一次参考负载取平均，抵消运行期间 CPU 频率的变化
+    reference = round((reference + calibrate(args.min_time, args.repeat)) / 2, 1)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != {'gpus': args.gpus, 'dmesg_lines': args.dmesg_lines, 'route_tables': args.route_tables,
+                                     'ib_ports': args.ib_ports}:
+            print(f"警告: 基线的合成规模 {baseline.get('scale')} 与本次不同，比较结果仅供参考。")
+        speed_factor = reference / baseline['reference_calls_per_sec'] if baseline.get('reference_calls_per_sec') else 1.0
+        print(f"参考负载: 本次 {reference} calls/s，基线 {baseline.get('reference_calls_per_sec')} calls/s，吞吐按 {speed_factor:.2f}x 折算")
+        regressions = _compare(rows, {r['key']: r for r in baseline['results']}, args.tolerance, args.alloc_tolerance, speed_factor)
+
+    _print_table(rows)
+    report = {'scale': {'gpus': args.gpus, 'dmesg_lines': args.dmesg_lines, 'route_tables': args.route_tables, 'ib_ports': args.ib_ports},
+              'python': sys.version.split()[0], 'reference_calls_per_sec': reference, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': rows}
+    for path in (args.save, args.json):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    if regressions:
+        print(f"\n相对基线 {args.baseline} 的回归 ({len(regressions)} 项):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
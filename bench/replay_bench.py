@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import argparse
+import cProfile
+import pstats
+
+import logbook
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from core import config, database, replay
+from core.models import TABLE_NAME, FINGERPRINT_TABLE
+
+def open_state_db(path):
+    # 每轮从空状态库开始: 沿用上一轮的记录时第 2 轮起所有故障都走 DUPLICATE 分支，测到的不是同一条决策路径
+    conn = database.init_sqlite(path)
+    if conn and path != ':memory:':
+        with conn:
+            conn.execute(f"DELETE FROM {TABLE_NAME}")
+            conn.execute(f"DELETE FROM {FINGERPRINT_TABLE}")
+    return conn
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放录制的 SSH 命令输出，测量解析与告警决策路径的吞吐")
+    parser.add_argument('corpus', help="录制目录 (app_config.yaml 中的 SSH_RECORD_DIR)")
+    parser.add_argument('--repeat', type=int, default=1, help="语料重复回放次数")
+    parser.add_argument('--no-report', action='store_true', help="只回放 run_specific_checks，不执行 process_results")
+    parser.add_argument('--sqlite', default=':memory:', help="回放使用的 SQLite 路径，默认内存库；每轮回放前清空状态表")
+    parser.add_argument('--profile', help="将 cProfile 结果写入该文件，并打印耗时最多的函数")
+    parser.add_argument('--min-checks-per-sec', type=float, help="吞吐低于该值时以非零状态退出，用于回归检测")
+    parser.add_argument('--json', help="将统计结果写入 JSON 文件")
+    parser.add_argument('--verbose', action='store_true', help="输出巡检程序日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logbook.NullHandler().push_application()
+
+    all_configs = config.load_all_configs() or {}
+    # 回放时不发送任何通知
+    app_config = {**all_configs, 'FEISHU_WEBHOOKS': {}, 'MYSQL': None}
+    thresholds = all_configs.get('thresholds', {})
+    sessions = replay.load_corpus(args.corpus)
+    if not sessions:
+        print(f"录制目录 {args.corpus} 中没有可回放的数据。")
+        sys.exit(1)
+
+    profiler = cProfile.Profile() if args.profile else None
+    recorded_thresholds = replay.load_thresholds(args.corpus)
+    totals = {'sessions': 0, 'checks': 0, 'parse_seconds': 0.0, 'report_seconds': 0.0, 'mismatched': 0}
+    if profiler:
+        profiler.enable()
+    for _ in range(args.repeat):
+        # ReplayClient 会消费样本，每轮重新构造
+        sqlite_conn = open_state_db(args.sqlite)
+        try:
+            stats = replay.replay_sessions([list(s) for s in sessions], thresholds, app_config, sqlite_conn,
+                                           with_report=not args.no_report, recorded_thresholds=recorded_thresholds)
+        finally:
+            if sqlite_conn: sqlite_conn.close()
+        for key in totals:
+            totals[key] += stats[key]
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    elapsed = totals['parse_seconds'] + totals['report_seconds']
+    totals['checks_per_sec'] = round(totals['checks'] / elapsed, 1) if elapsed else 0.0
+    totals['sessions_per_sec'] = round(totals['sessions'] / elapsed, 1) if elapsed else 0.0
+    totals['parse_seconds'] = round(totals['parse_seconds'], 4)
+    totals['report_seconds'] = round(totals['report_seconds'], 4)
+    for key, value in totals.items():
+        print(f"{key:>18}: {value}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(totals, f, indent=2)
+    if args.min_checks_per_sec and totals['checks_per_sec'] < args.min_checks_per_sec:
+        print(f"吞吐 {totals['checks_per_sec']} checks/s 低于阈值 {args.min_checks_per_sec}")
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import multiprocessing
+
+import logbook
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from core import sharding, inventory
+
+def _instance(instance_id, instances, lease_path, lease_seconds, specs, assignments, crash_after, stop_event):
+    logbook.NullHandler().push_application()
+    shard = sharding.ShardCoordinator({'instance_id': instance_id, 'instances': instances,
+                                       'lease_path': lease_path, 'lease_seconds': lease_seconds}).start()
+    start = time.monotonic()
+    while not stop_event.is_set():
+        if crash_after and time.monotonic() - start >= crash_after:
+            # 模拟进程被强制结束: 不释放租约，由其他实例等待租约过期后接管
+            assignments[instance_id] = []
+            os._exit(1)
+        assignments[instance_id] = [spec['host'] for spec in shard.select(specs)]
+        time.sleep(0.5)
+    shard.stop()
+    assignments[instance_id] = []
+
+def main():
+    parser = argparse.ArgumentParser(description="本地多进程模拟分片实例，观察节点覆盖、重复与租约过期后的重新分配")
+    parser.add_argument('--instances', type=int, default=3)
+    parser.add_argument('--nodes', type=int, default=500)
+    parser.add_argument('--lease-seconds', type=float, default=3.0)
+    parser.add_argument('--crash-after', type=float, default=4.0, help="第一个实例在该秒数后异常退出，0 表示不退出")
+    parser.add_argument('--duration', type=float, default=12.0)
+    args = parser.parse_args()
+
+    instances = [f"inspector-{i}" for i in range(args.instances)]
+    specs = inventory.from_specs({'host': f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"} for i in range(args.nodes))
+    lease_path = os.path.join(tempfile.mkdtemp(prefix="gpu-shard-"), "leases.db")
+
+    manager = multiprocessing.Manager()
+    assignments = manager.dict()
+    stop_event = multiprocessing.Event()
+    procs = []
+    for i, instance_id in enumerate(instances):
+        proc = multiprocessing.Process(target=_instance, args=(
+            instance_id, instances, lease_path, args.lease_seconds, specs, assignments,
+            args.crash_after if i == 0 else 0, stop_event))
+        proc.start()
+        procs.append(proc)
+
+    print(f"{'t':>5}  {'covered':>8}  {'duplicated':>10}  per-instance")
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < args.duration:
+            time.sleep(1)
+            snapshot = dict(assignments)
+            owned = [host for hosts in snapshot.values() for host in hosts]
+            per_instance = ' '.join(f"{k.split('-')[-1]}:{len(v)}" for k, v in sorted(snapshot.items()))
+            print(f"{time.monotonic() - start:5.1f}  {len(set(owned)):>8}  {len(owned) - len(set(owned)):>10}  {per_instance}")
+    finally:
+        stop_event.set()
+        for proc in procs:
+            proc.join(timeout=5)
+
+if __name__ == '__main__':
+    main()
@@ -4,16 +4,10 @@ from core.models import *
 LOG = logbook.Logger(__name__)
 
 def _create_failure(node_spec, type, extra):
-    return {
-        KEY_HOST: node_spec.get('host'), 
-        KEY_HOSTNAME: node_spec.get('hostname'),
-        KEY_TYPE: type, 
-        KEY_EXTRA: extra, 
-        KEY_SUCCESS: False
-    }
+    return CheckResult.failure(node_spec, type, extra)
 
 def _create_success(types):
-    return {KEY_TYPES: types, KEY_SUCCESS: True}
+    return CheckResult.ok(types)
 
 def _parse_numeric_list(result_payload, node_spec, issue_type, threshold, check_name):
     if not result_payload['success']:
@@ -71,12 +65,14 @@ def parse_gpu_temp(result_payload, node_spec, thresholds):
     output = result_payload['output']
     high_temp_gpus = [] # > 85C (P1)
     warn_temp_gpus = [] # 80-85C (P2)
+    temps = [] # 原始读数，供集群级离群分析使用
     
     try:
         lines = output.strip().splitlines()
         for i, line in enumerate(lines):
             if not line: continue
             temp = int(line.strip())
+            temps.append(temp)
             if temp > high_temp_threshold:
                 high_temp_gpus.append(f"GPU-{i} at {temp}C")
             elif temp > temp_threshold:
@@ -84,15 +80,18 @@ def parse_gpu_temp(result_payload, node_spec, thresholds):
 
         if high_temp_gpus:
             extra = f"Critical temperature detected: {'; '.join(high_temp_gpus)}"
-            return _create_failure(node_spec, TYPE_GPU_HIGH_TEMP, extra)
-        if warn_temp_gpus:
+            result = _create_failure(node_spec, TYPE_GPU_HIGH_TEMP, extra)
+        elif warn_temp_gpus:
             extra = f"Warning temperature detected: {'; '.join(warn_temp_gpus)}"
-            return _create_failure(node_spec, TYPE_GPU_TEMP, extra)
+            result = _create_failure(node_spec, TYPE_GPU_TEMP, extra)
+        else:
+            result = _create_success([TYPE_GPU_HIGH_TEMP, TYPE_GPU_TEMP, TYPE_SMI_CMD_ERROR])
             
     except (ValueError, IndexError) as e:
         return _create_failure(node_spec, TYPE_UNK, f"Failed to parse GPU temperature output. Error: {e}. Output: '{output[:100]}'")
 
-    return _create_success([TYPE_GPU_HIGH_TEMP, TYPE_GPU_TEMP, TYPE_SMI_CMD_ERROR])
+    result.metrics = {'gpu_temp': temps}
+    return result
 
 # --- 3. XID Errors ---
 def get_xid_command():
@@ -1,134 +1,228 @@
+import re
+
 import logbook
 from core.models import *
 
 LOG = logbook.Logger(__name__)
 
 def _create_failure(node_spec, type, extra):
-    return {
-        KEY_HOST: node_spec.get('host'), 
-        KEY_HOSTNAME: node_spec.get('hostname'),
-        KEY_TYPE: type, 
-        KEY_EXTRA: extra, 
-        KEY_SUCCESS: False
-    }
+    return CheckResult.failure(node_spec, type, extra)
 
 def _create_success(types):
-    return {KEY_TYPES: types, KEY_SUCCESS: True}
+    return CheckResult.ok(types)
+
+# --- 0. Muxi 快照 ---
+# 所有 gpu.muxi.* 与 network.muxi.metaxlink_status 检查共用同一条命令: 一次 SSH 执行中依次调用 mxgpu-smi，
+# 每段输出前后加分隔标记并记录退出码。run_plan 对同一节点上相同的命令只执行一次，各检查项从同一份快照表中读取。
+# 单段失败或不被支持 (如宁夏 muxi 不支持部分子命令) 只影响依赖该段的检查项。
+# list 与 temperature 是数量与温度检查的必需数据，这两段被拒绝时按 mxgpu-smi 故障上报；
+# PCIe 字段单独成段，旧驱动不支持 pci.link.* 时只跳过 PCIe 检查。
+SNAPSHOT_MARK = "@@mxgpu-smi:"
+SNAPSHOT_SECTION_TIMEOUT = 10
+
+# (段名, 命令)。GPU 数量仍按 -L 的 GPU 行数统计，不依赖 query 字段
+SNAPSHOT_SECTIONS = (
+    ('list', "mxgpu-smi -L"),
+    ('temperature', "mxgpu-smi --query-gpu=temperature.gpu --format=csv,noheader"),
+    ('pcie', "mxgpu-smi --query-gpu=pci.link.gen.current,pci.link.gen.max,pci.link.width.current,pci.link.width.max "
+             "--format=csv,noheader"),
+    ('ecc', "mxgpu-smi -q -d ECC"),
+    ('performance', "mxgpu-smi -q -d PERFORMANCE"),
+    ('metaxlink', "mxgpu-smi metaxlink -s"),
+)
+
+# 子命令不被当前驱动版本支持时的典型输出，此时对应检查项跳过而不是报 mxgpu-smi 故障
+UNSUPPORTED_MARKERS = ("not supported", "unknown option", "unrecognized", "invalid option", "invalid argument")
+REQUIRED_SECTIONS = ('list', 'temperature')
+
+# -L 每块 GPU 一行 (如 "GPU#0 MXC500 (UUID: ...)")，段内合并了 stderr，驱动告警等其他行不计入数量
+GPU_LIST_LINE = re.compile(r'^GPU\s*#?\s*\d+')
+# 单个 GPU 不支持的字段以 N/A 输出，只跳过该字段的比较
+NOT_AVAILABLE = ("N/A", "[N/A]", "[Not Supported]")
+
+def get_muxi_snapshot_command():
+    parts = []
+    for name, command in SNAPSHOT_SECTIONS:
+        parts.append(f"echo '{SNAPSHOT_MARK}{name}'; timeout {SNAPSHOT_SECTION_TIMEOUT} {command} 2>&1; echo \"{SNAPSHOT_MARK}rc=$?\"")
+    return "; ".join(parts)
+
+def _split_sections(output):
+    sections, name, lines = {}, None, []
+    for line in output.splitlines():
+        if line.startswith(SNAPSHOT_MARK):
+            tag = line[len(SNAPSHOT_MARK):].strip()
+            if tag.startswith('rc='):
+                if name is not None:
+                    rc = tag[3:]
+                    sections[name] = (int(rc) if rc.lstrip('-').isdigit() else None, lines)
+                name, lines = None, []
+            else:
+                name, lines = tag, []
+        elif name is not None:
+            lines.append(line)
+    # 没有结束标记的段视为被中断
+    if name is not None:
+        sections[name] = (None, lines)
+    return sections
+
+def _gpu_blocks(lines):
+    # -q 输出按 "GPU ..." 开头的行分块，块序号即 GPU 序号
+    gpu_index = -1
+    for line in lines:
+        if line.startswith("GPU"):
+            gpu_index += 1
+        yield max(gpu_index, 0), line
+
+def _query_fields(line, count):
+    # csv 行按字段解析: N/A 记为 None，其他非整数值抛 ValueError
+    fields = [p.strip() for p in line.split(',')]
+    if len(fields) != count:
+        raise ValueError(f"expected {count} fields, got {len(fields)}")
+    return tuple(None if f in NOT_AVAILABLE else int(f) for f in fields)
+
+def parse_muxi_snapshot(output):
+    table = {'gpu_count': 0, 'temperature': [], 'pcie': [], 'ecc': [], 'performance': [], 'metaxlink': [], 'failed': {},
+             'unsupported': set(), 'parse_error': {}}
+    sections = _split_sections(output)
+
+    for name, _ in SNAPSHOT_SECTIONS:
+        if name not in sections:
+            table['failed'][name] = "section missing from snapshot output"
+            continue
+        rc, lines = sections[name]
+        if rc != 0:
+            text = "\n".join(lines).strip()
+            if (name not in REQUIRED_SECTIONS and rc not in (None, 124)
+                    and any(marker in text.lower() for marker in UNSUPPORTED_MARKERS)):
+                table['unsupported'].add(name)
+            else:
+                table['failed'][name] = f"ExitCode:{rc}, Output:'{text[:200]}'"
+            continue
+
+        if name == 'list':
+            table['gpu_count'] = sum(1 for line in lines if GPU_LIST_LINE.match(line.strip()))
+        elif name in ('temperature', 'pcie'):
+            count = 1 if name == 'temperature' else 4
+            try:
+                for i, line in enumerate(l for l in lines if l.strip()):
+                    fields = _query_fields(line, count)
+                    table[name].append((i, fields[0] if count == 1 else fields))
+            except ValueError as e:
+                table[name] = []
+                table['parse_error'][name] = f"Error: {e}. Output: '{chr(10).join(lines)[:100]}'"
+        elif name in ('ecc', 'performance'):
+            table[name] = [(i, line.strip()) for i, line in _gpu_blocks(lines) if line.strip()]
+        else:
+            table[name] = [line.strip() for line in lines if line.strip()]
+    return table
+
+def _snapshot_table(result_payload):
+    # 同一节点的多个检查项共享同一个 payload，快照只解析一次
+    table = result_payload.get('muxi_table')
+    if table is None:
+        table = result_payload['muxi_table'] = parse_muxi_snapshot(result_payload['output'])
+    return table
+
+def _section_failure(result_payload, node_spec, section, label):
+    # 返回依赖 section 的检查项应上报的失败；段不被支持时返回 None 表示跳过
+    if not result_payload['success']:
+        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"[{label}] Command execution failed: {result_payload['error']}")
+    table = _snapshot_table(result_payload)
+    if section in table['failed']:
+        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"[{label}] mxgpu-smi failed: {table['failed'][section]}")
+    if section in table['parse_error']:
+        return _create_failure(node_spec, TYPE_UNK, f"[{label}] Failed to parse Muxi GPU query. {table['parse_error'][section]}")
+    return None
+
+def _unsupported(result_payload, node_spec, section):
+    if section in _snapshot_table(result_payload)['unsupported']:
+        hostname = node_spec.get('hostname', node_spec.get('host'))
+        LOG.debug(f"[{hostname}] mxgpu-smi 不支持快照段 '{section}'，跳过相关检查。")
+        return True
+    return False
 
 # --- 1. Muxi GPU Count ---
-def get_muxi_gpu_count_command():
-    return "mxgpu-smi -L | wc -l"
-
 def parse_muxi_gpu_count(result_payload, node_spec, thresholds):
     expected_count = thresholds.get("muxi_gpu_count", 8)
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"Command to get Muxi GPU count failed: {result_payload['error']}")
-
-    output = result_payload['output']
-    try:
-        gpu_count = int(output.strip())
-        if gpu_count != expected_count:
-            return _create_failure(node_spec, TYPE_MUXI_GPU_CNT, f'Expected {expected_count} Muxi GPUs, but found {gpu_count}.')
-    except ValueError:
-        return _create_failure(node_spec, TYPE_UNK, f"Could not parse Muxi GPU count from output: '{output}'")
-        
+    failure = _section_failure(result_payload, node_spec, 'list', "Count")
+    if failure:
+        return failure
+
+    gpu_count = _snapshot_table(result_payload)['gpu_count']
+    if gpu_count != expected_count:
+        return _create_failure(node_spec, TYPE_MUXI_GPU_CNT, f'Expected {expected_count} Muxi GPUs, but found {gpu_count}.')
     return _create_success([TYPE_MUXI_GPU_CNT, TYPE_MUXI_SMI_CMD_ERROR])
 
 # --- 2. Muxi GPU Temperature ---
-def get_muxi_gpu_temp_command():
-    
-    return "mxgpu-smi --query-gpu=temperature.gpu --format=csv,noheader"
-
 def parse_muxi_gpu_temp(result_payload, node_spec, thresholds):
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"Command to get Muxi GPU temperature failed: {result_payload['error']}")
+    failure = _section_failure(result_payload, node_spec, 'temperature', "Temperature")
+    if failure:
+        return failure
 
-    output = result_payload['output']
-    problematic_gpus = []
     threshold = thresholds.get("muxi_gpu_temp", 85)
-    
-    try:
-        lines = output.strip().splitlines()
-        for i, line in enumerate(lines):
-            if not line: continue
-            temp = int(line.strip())
-            if temp > threshold:
-                problematic_gpus.append(f"GPU-{i} at {temp}C")
-
-        if problematic_gpus:
-            extra = f"Muxi GPU temperature over {threshold}C: {'; '.join(problematic_gpus)}"
-            return _create_failure(node_spec, TYPE_MUXI_GPU_TEMP, extra)
-            
-    except (ValueError, IndexError) as e:
-        return _create_failure(node_spec, TYPE_UNK, f"Failed to parse Muxi GPU temperature. Error: {e}. Output: '{output[:100]}'")
-
-    return _create_success([TYPE_MUXI_GPU_TEMP, TYPE_MUXI_SMI_CMD_ERROR])
+    readings = [(i, temp) for i, temp in _snapshot_table(result_payload)['temperature'] if temp is not None]
+    temps = [temp for _, temp in readings]
+    problematic_gpus = [f"GPU-{i} at {temp}C" for i, temp in readings if temp > threshold]
 
-# --- 3. Muxi ECC State ---
-def get_muxi_ecc_state_command():
-    return "mxgpu-smi -q -d ECC"
-
-def parse_muxi_ecc_state(result_payload, node_spec, thresholds):
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"Command for Muxi ECC state failed: {result_payload['error']}")
-    
-    output = result_payload['output']
-    errors_found = []
+    if problematic_gpus:
+        extra = f"Muxi GPU temperature over {threshold}C: {'; '.join(problematic_gpus)}"
+        result = _create_failure(node_spec, TYPE_MUXI_GPU_TEMP, extra)
+    else:
+        result = _create_success([TYPE_MUXI_GPU_TEMP, TYPE_MUXI_SMI_CMD_ERROR])
 
-    for line in output.strip().splitlines():
-        if "Errors" in line and " 0" not in line:
-             errors_found.append(line.strip())
+    result.metrics = {'gpu_temp': temps}
+    return result
 
+# --- 3. Muxi ECC State ---
+def parse_muxi_ecc_state(result_payload, node_spec, thresholds):
+    failure = _section_failure(result_payload, node_spec, 'ecc', "ECC")
+    if failure:
+        return failure
+    if _unsupported(result_payload, node_spec, 'ecc'):
+        return _create_success([TYPE_MUXI_ECC_STATE])
+
+    errors_found = [f"GPU-{i}: {line}" for i, line in _snapshot_table(result_payload)['ecc']
+                    if "Errors" in line and " 0" not in line]
     if errors_found:
         return _create_failure(node_spec, TYPE_MUXI_ECC_STATE, f"Muxi ECC errors detected: {'; '.join(errors_found)}")
 
     return _create_success([TYPE_MUXI_ECC_STATE])
 
 # --- 4. Muxi PCIe Link Status ---
-def get_muxi_pcie_status_command():
-    return "mxgpu-smi --query-gpu=pci.link.gen.current,pci.link.gen.max,pci.link.width.current,pci.link.width.max --format=csv,noheader"
-
 def parse_muxi_pcie_status(result_payload, node_spec, thresholds):
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"[PCIe] Command execution failed: {result_payload['error']}")
-    
-    output = result_payload['output']
-    degraded_gpus = []
-
-    try:
-        lines = output.strip().splitlines()
-        for i, line in enumerate(lines):
-            if not line: continue
-            parts = [p.strip() for p in line.split(',')]
-            gen_curr, gen_max, width_curr, width_max = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])
-            
-            if gen_curr < gen_max or width_curr < width_max:
-                degraded_gpus.append(f"GPU-{i} degraded (Gen:{gen_curr}/{gen_max}, Width:x{width_curr}/x{width_max})")
+    failure = _section_failure(result_payload, node_spec, 'pcie', "PCIe")
+    if failure:
+        return failure
+    if _unsupported(result_payload, node_spec, 'pcie'):
+        return _create_success([TYPE_MUXI_PCIE_STATUS])
 
-        if degraded_gpus:
-            return _create_failure(node_spec, TYPE_MUXI_PCIE_STATUS, f"Muxi PCIe link degradation detected: {'; '.join(degraded_gpus)}")
+    degraded_gpus = []
+    for i, (gen_curr, gen_max, width_curr, width_max) in _snapshot_table(result_payload)['pcie']:
+        # 任一侧为 N/A 时该项不比较
+        gen_degraded = None not in (gen_curr, gen_max) and gen_curr < gen_max
+        width_degraded = None not in (width_curr, width_max) and width_curr < width_max
+        if gen_degraded or width_degraded:
+            degraded_gpus.append(f"GPU-{i} degraded (Gen:{gen_curr}/{gen_max}, Width:x{width_curr}/x{width_max})")
 
-    except (ValueError, IndexError) as e:
-        return _create_failure(node_spec, TYPE_UNK, f"[PCIe] Failed to parse Muxi PCIe status. Error: {e}. Output: '{output[:100]}'")
+    if degraded_gpus:
+        return _create_failure(node_spec, TYPE_MUXI_PCIE_STATUS, f"Muxi PCIe link degradation detected: {'; '.join(degraded_gpus)}")
 
     return _create_success([TYPE_MUXI_PCIE_STATUS])
 
 # --- 5. Muxi Thermal Status (Throttling) ---
-def get_muxi_thermal_status_command():
-    return "mxgpu-smi -q -d PERFORMANCE"
-
 def parse_muxi_thermal_status(result_payload, node_spec, thresholds):
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"[Thermal] Command execution failed: {result_payload['error']}")
-    
-    output = result_payload['output']
+    failure = _section_failure(result_payload, node_spec, 'performance', "Thermal")
+    if failure:
+        return failure
+    if _unsupported(result_payload, node_spec, 'performance'):
+        return _create_success([TYPE_MUXI_THERMAL_STATUS])
+
     throttling_lines = []
-    
-    for line in output.strip().split('\n'):
+    for i, line in _snapshot_table(result_payload)['performance']:
         if "Throttle" in line or "Slowdown" in line:
             if "Not Active" not in line and "None" not in line:
-                throttling_lines.append(line.strip())
-            
+                throttling_lines.append(f"GPU-{i}: {line}")
+
     if throttling_lines:
         extra = f"Muxi GPU Thermal Slowdown detected: {'; '.join(throttling_lines)}"
         return _create_failure(node_spec, TYPE_MUXI_THERMAL_STATUS, extra)
@@ -136,20 +230,15 @@ def parse_muxi_thermal_status(result_payload, node_spec, thresholds):
     return _create_success([TYPE_MUXI_THERMAL_STATUS])
 
 # --- 6. Muxi MetaXLink Status ---
-def get_muxi_metaxlink_status_command():
-    return "mxgpu-smi metaxlink -s"
-
 def parse_muxi_metaxlink_status(result_payload, node_spec, thresholds):
-    if not result_payload['success']:
-        return _create_failure(node_spec, TYPE_MUXI_SMI_CMD_ERROR, f"[MetaXLink] Command execution failed: {result_payload['error']}")
-
-    output = result_payload['output']
-    inactive_links = []
-    
-    for line in output.strip().splitlines():
-        if "Link" in line and "Active" not in line and "UP" not in line:
-            inactive_links.append(line.strip())
-
+    failure = _section_failure(result_payload, node_spec, 'metaxlink', "MetaXLink")
+    if failure:
+        return failure
+    if _unsupported(result_payload, node_spec, 'metaxlink'):
+        return _create_success([TYPE_MUXI_METAXLINK_STATUS])
+
+    inactive_links = [line for line in _snapshot_table(result_payload)['metaxlink']
+                      if "Link" in line and "Active" not in line and "UP" not in line]
     if inactive_links:
         return _create_failure(node_spec, TYPE_MUXI_METAXLINK_STATUS, f"Muxi MetaXLink inactive links found: {'; '.join(inactive_links)}")
 
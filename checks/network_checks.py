@@ -1,19 +1,14 @@
 import logbook
 from core.models import *
+from core import counters
 
 LOG = logbook.Logger(__name__)
 
 def _create_failure(node_spec, type, extra):
-    return {
-        KEY_HOST: node_spec.get('host'), 
-        KEY_HOSTNAME: node_spec.get('hostname'),
-        KEY_TYPE: type, 
-        KEY_EXTRA: extra, 
-        KEY_SUCCESS: False
-    }
+    return CheckResult.failure(node_spec, type, extra)
 
 def _create_success(types):
-    return {KEY_TYPES: types, KEY_SUCCESS: True}
+    return CheckResult.ok(types)
 
 
 # --- 1. Route Status (N+1 query problem solved) ---
@@ -95,4 +90,126 @@ def parse_ip_rule_count(result_payload, node_spec, thresholds):
     except (ValueError, IndexError):
         return _create_failure(node_spec, TYPE_UNK, f"[IP Rule] Failed to parse count from output: '{output}'")
     
-    return _create_success([TYPE_IP_RULE, TYPE_SHUTDOWN])
\ No newline at end of file
+    return _create_success([TYPE_IP_RULE, TYPE_SHUTDOWN])
+
+# --- 5. InfiniBand Port Counters (流量与错误计数速率) ---
+# 三个检查项共用同一条命令，每个节点只读取一次 sysfs；速率由 core/counters.py 与上一轮采样比较得到
+IB_DATA_COUNTERS = ('port_rcv_data', 'port_xmit_data')   # 单位为 4 字节
+
+# counters/ 下 IB 规范 PortCounters 错误计数的位宽，到达上限后停止计数 (不回绕)。数据计数 (*_data、*_packets) 在支持
+# PortCountersExtended 的 HCA 上为 64 位，hw_counters 也为 64 位，按 counters.DEFAULT_WIDTH 处理
+IB_COUNTER_BITS = {
+    'symbol_error': 16, 'link_error_recovery': 8, 'link_downed': 8, 'port_rcv_errors': 16,
+    'port_rcv_remote_physical_errors': 16, 'port_rcv_switch_relay_errors': 16, 'port_xmit_discards': 16,
+    'port_xmit_constraint_errors': 8, 'port_rcv_constraint_errors': 8, 'local_link_integrity_errors': 4,
+    'excessive_buffer_overrun_errors': 4, 'VL15_dropped': 16,
+}
+
+DEFAULT_IB_LINK_ERROR_PER_MIN = {'symbol_error': 10, 'link_error_recovery': 0, 'link_downed': 0, 'local_link_integrity_errors': 0}
+DEFAULT_IB_PORT_ERROR_PER_MIN = {'port_rcv_errors': 10, 'port_rcv_remote_physical_errors': 10, 'port_xmit_discards': 100,
+                                 'excessive_buffer_overrun_errors': 0, 'out_of_buffer': 1000, 'local_ack_timeout_err': 10}
+
+def get_ib_counters_command():
+    # 第一行 boot_id (节点重启后重新建立基线)，第二行节点时间戳，之后每行 "设备/ports/端口/counters|hw_counters/计数器:值"
+    return ("cat /proc/sys/kernel/random/boot_id; date +%s.%N; "
+            "cd /sys/class/infiniband 2>/dev/null && grep -H . */ports/*/counters/* */ports/*/hw_counters/* 2>/dev/null; true")
+
+def _ib_counter_rates(result_payload, node_spec, thresholds):
+    # 返回 (速率, 失败结果)；速率为 None 表示本轮只建立基线。同一节点的多个检查项共享同一个 payload，只计算一次
+    if not result_payload['success']:
+        return None, _create_failure(node_spec, TYPE_UNK, f"[IB Counters] Command execution failed: {result_payload['error']}")
+    if 'ib_counter_rates' in result_payload:
+        return result_payload['ib_counter_rates'], None
+
+    output = result_payload['output']
+    lines = output.splitlines()
+    try:
+        boot_id = lines[0].strip()
+        timestamp = float(lines[1])
+    except (IndexError, ValueError):
+        return None, _create_failure(node_spec, TYPE_UNK, f"[IB Counters] Failed to parse output: '{output[:100]}'")
+
+    wanted = {*IB_DATA_COUNTERS, *thresholds.get("ib_link_error_per_min", DEFAULT_IB_LINK_ERROR_PER_MIN),
+              *thresholds.get("ib_port_error_per_min", DEFAULT_IB_PORT_ERROR_PER_MIN)}
+    values, widths = {}, {}
+    for line in lines[2:]:
+        path, _, value = line.rpartition(':')
+        parts = path.split('/')
+        if len(parts) != 5 or parts[4] not in wanted:
+            continue
+        key = f"{parts[0]}/{parts[2]}/{parts[4]}"
+        try:
+            values[key] = int(value)
+        except ValueError:
+            continue
+        if parts[3] == 'counters' and parts[4] in IB_COUNTER_BITS:
+            widths[key] = (IB_COUNTER_BITS[parts[4]], True)
+
+    rates = counters.observe(node_spec['host'], timestamp, boot_id, values, widths)
+    if rates and rates['saturated']:
+        LOG.debug(f"[{node_spec.get('hostname', node_spec.get('host'))}] IB 计数器已到达上限，无法计算增量: {', '.join(rates['saturated'])}")
+    result_payload['ib_counter_rates'] = rates
+    return rates, None
+
+def _port_rates(rates, names):
+    # {"设备/端口": {计数器: 每秒速率}}
+    ports = {}
+    for key, rate in rates['rates'].items():
+        port, _, name = key.rpartition('/')
+        if name in names:
+            ports.setdefault(port, {})[name] = rate
+    return ports
+
+def parse_ib_traffic(result_payload, node_spec, thresholds):
+    threshold = thresholds.get("ib_traffic_gbps", 360)
+    rates, failure = _ib_counter_rates(result_payload, node_spec, thresholds)
+    if failure:
+        return failure
+    if rates is None:
+        return _create_success([TYPE_TRAFFIC])
+
+    # extra 只列出端口，速率每轮都在变化，放在 metrics 中 (否则持续的告警每轮都被当作变化的故障重新完整告警)
+    busy, gbps = [], {}
+    for port, port_rates in sorted(_port_rates(rates, IB_DATA_COUNTERS).items()):
+        rx = port_rates.get('port_rcv_data', 0) * 32 / 1e9
+        tx = port_rates.get('port_xmit_data', 0) * 32 / 1e9
+        if max(rx, tx) > threshold:
+            busy.append(port)
+            gbps[port] = {'rx': round(rx, 1), 'tx': round(tx, 1)}
+    if busy:
+        extra = f"[IB Traffic] {len(busy)} port(s) averaged over {threshold} Gbps: {', '.join(busy)}"
+        result = _create_failure(node_spec, TYPE_TRAFFIC, extra)
+        result.metrics = {'ib_traffic_gbps': gbps, 'interval': round(rates['interval'])}
+        return result
+    return _create_success([TYPE_TRAFFIC])
+
+def _parse_ib_error_rates(result_payload, node_spec, thresholds, issue_type, threshold_key, defaults, label):
+    limits = thresholds.get(threshold_key, defaults)
+    rates, failure = _ib_counter_rates(result_payload, node_spec, thresholds)
+    if failure:
+        return failure
+    if rates is None:
+        return _create_success([issue_type])
+
+    # extra 只列出端口与计数器名，增量与速率放在 metrics 中
+    growing, per_min = [], {}
+    for port, port_rates in sorted(_port_rates(rates, limits).items()):
+        for name, rate in sorted(port_rates.items()):
+            per_minute = rate * 60
+            if per_minute > limits[name]:
+                growing.append(f"{port} {name}")
+                per_min[f"{port}/{name}"] = {'delta': rates['deltas'][f'{port}/{name}'], 'per_min': round(per_minute, 1)}
+    if growing:
+        extra = f"[{label}] {len(growing)} counter(s) growing over the limit: {'; '.join(growing)}"
+        result = _create_failure(node_spec, issue_type, extra)
+        result.metrics = {'ib_counter_growth': per_min, 'interval': round(rates['interval'])}
+        return result
+    return _create_success([issue_type])
+
+def parse_ib_link_errors(result_payload, node_spec, thresholds):
+    return _parse_ib_error_rates(result_payload, node_spec, thresholds, TYPE_IB_LINK_ERROR,
+                                 "ib_link_error_per_min", DEFAULT_IB_LINK_ERROR_PER_MIN, "IB Link Errors")
+
+def parse_ib_port_errors(result_payload, node_spec, thresholds):
+    return _parse_ib_error_rates(result_payload, node_spec, thresholds, TYPE_IB_PORT_ERROR,
+                                 "ib_port_error_per_min", DEFAULT_IB_PORT_ERROR_PER_MIN, "IB Port Errors")
@@ -4,16 +4,10 @@ from core.models import *
 LOG = logbook.Logger(__name__)
 
 def _create_failure(node_spec, type, extra):
-    return {
-        KEY_HOST: node_spec.get('host'), 
-        KEY_HOSTNAME: node_spec.get('hostname'),
-        KEY_TYPE: type, 
-        KEY_EXTRA: extra, 
-        KEY_SUCCESS: False
-    }
+    return CheckResult.failure(node_spec, type, extra)
 
 def _create_success(types):
-    return {KEY_TYPES: types, KEY_SUCCESS: True}
+    return CheckResult.ok(types)
 
 
 def get_gpfs_status_command(thresholds):
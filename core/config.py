@@ -1,6 +1,9 @@
 import yaml
 import logbook
 import os
+import time
+
+from core import inventory
 
 LOG = logbook.Logger("ConfigLoader")
 
@@ -34,13 +37,140 @@ def load_all_configs():
     nodes_config = _load_yaml_file(NODES_CONFIG_PATH, default_value={'nodes': []})
     profiles_config = _load_yaml_file(PROFILES_CONFIG_PATH, default_value={'profiles': {}})
     thresholds_config = _load_yaml_file(THRESHOLDS_CONFIG_PATH, default_value={'thresholds': {}})
+    if nodes_config is None or profiles_config is None or thresholds_config is None:
+        LOG.critical("节点、Profile 或阈值配置文件解析失败，无法继续。")
+        return None
 
     all_configs = {**app_config}
-    all_configs['nodes'] = nodes_config.get('nodes', [])
+    # 节点清单只建立紧凑索引，分组公共字段在 app_config.yaml 的 ssh_defaults 之上继承
+    start = time.perf_counter()
+    all_configs['nodes'] = inventory.load_inventory(nodes_config, app_config.get('ssh_defaults'), os.path.dirname(NODES_CONFIG_PATH))
+    inventory_ms = (time.perf_counter() - start) * 1000
     all_configs['profiles'] = profiles_config.get('profiles', {})
     all_configs['thresholds'] = thresholds_config.get('thresholds', {})
 
     LOG.info(f"所有配置加载完成。应用配置键: {list(all_configs.keys())}")
-    LOG.info(f"加载了 {len(all_configs['nodes'])} 个节点, {len(all_configs['profiles'])} 个profile。")
+    LOG.info(f"加载了 {len(all_configs['nodes'])} 个节点 (分组: {all_configs['nodes'].group_counts()}，耗时 {inventory_ms:.1f} ms), "
+             f"{len(all_configs['profiles'])} 个profile。")
              
-    return all_configs
\ No newline at end of file
+    return all_configs
+
+CONFIG_PATHS = (APP_CONFIG_PATH, NODES_CONFIG_PATH, PROFILES_CONFIG_PATH, THRESHOLDS_CONFIG_PATH)
+
+# 修改后需要重启才能生效的应用配置键 (连接、监听端口等在启动时建立)
+RESTART_REQUIRED_KEYS = ('SQLITE_DB_PATH', 'MYSQL', 'MYSQL_SPOOL_PATH', 'MYSQL_BATCH_SIZE', 'METRICS_LISTEN', 'SHARDING', 'LOGGING', 'BASTIONS')
+
+def config_fingerprint(paths=CONFIG_PATHS):
+    fingerprint = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fingerprint[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            fingerprint[path] = None
+    return fingerprint
+
+def validate_configs(all_configs, known_checks=None):
+    # 返回错误列表，为空表示配置可用
+    errors = []
+    nodes = all_configs.get('nodes')
+    if not isinstance(nodes, inventory.Inventory) or not len(nodes):
+        errors.append("nodes.yaml 中没有任何节点")
+    else:
+        # 缺少 host、重复节点、范围或清单文件格式错误在加载时记录
+        errors.extend(nodes.errors)
+        bastions = all_configs.get('BASTIONS') or {}
+        for name in sorted(nodes.field_values('bastion')):
+            if name not in bastions:
+                errors.append(f"节点引用了未定义的跳板机 '{name}' (BASTIONS)")
+            elif not (bastions[name] or {}).get('host'):
+                errors.append(f"跳板机 '{name}' 缺少 host")
+
+    profiles = all_configs.get('profiles')
+    if not isinstance(profiles, dict) or not profiles:
+        errors.append("profiles.yaml 中没有任何 Profile")
+        profiles = {}
+    for name, profile in profiles.items():
+        checks = (profile or {}).get('checks')
+        if not isinstance(checks, dict):
+            errors.append(f"Profile '{name}' 缺少 checks 配置")
+            continue
+        for runner_type, check_names in checks.items():
+            if not isinstance(check_names, list):
+                errors.append(f"Profile '{name}' 的 {runner_type} 检查项不是列表")
+                continue
+            if known_checks is not None:
+                for check_name in check_names:
+                    if check_name not in known_checks:
+                        errors.append(f"Profile '{name}' 引用了未注册的检查项 '{check_name}'")
+
+    thresholds = all_configs.get('thresholds')
+    if not isinstance(thresholds, dict):
+        errors.append("thresholds.yaml 格式错误")
+    else:
+        for key, value in thresholds.items():
+            # 标量，或按计数器名分别配置的数值上限 (如 ib_link_error_per_min)
+            if isinstance(value, dict):
+                for name, limit in value.items():
+                    if isinstance(limit, bool) or not isinstance(limit, (int, float)):
+                        errors.append(f"阈值 '{key}.{name}' 不是数值")
+            elif isinstance(value, list):
+                errors.append(f"阈值 '{key}' 不是标量")
+    return errors
+
+def _changed_keys(old, new):
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
+def diff_configs(old, new):
+    old_nodes = {n['host']: n for n in old.get('nodes', [])}
+    new_nodes = {n['host']: n for n in new.get('nodes', [])}
+    nested = ('nodes', 'profiles', 'thresholds')
+    return {
+        'nodes_added': sorted(set(new_nodes) - set(old_nodes)),
+        'nodes_removed': sorted(set(old_nodes) - set(new_nodes)),
+        'nodes_changed': sorted(h for h in set(old_nodes) & set(new_nodes) if old_nodes[h] != new_nodes[h]),
+        'profiles_changed': _changed_keys(old.get('profiles', {}), new.get('profiles', {})),
+        'thresholds_changed': _changed_keys(old.get('thresholds', {}), new.get('thresholds', {})),
+        'app_changed': _changed_keys({k: v for k, v in old.items() if k not in nested},
+                                     {k: v for k, v in new.items() if k not in nested}),
+    }
+
+def describe_diff(diff):
+    parts = [f"{key}={','.join(map(str, values))}" for key, values in diff.items() if values]
+    return '; '.join(parts) or '无变化'
+
+class ConfigWatcher:
+    # 轮询配置文件的 mtime/size，变化后重新加载并校验；校验失败的版本会被记住，文件再次变化前不重复加载
+    def __init__(self, current_configs, known_checks=None):
+        self.current = current_configs
+        self.known_checks = known_checks
+        self._fingerprint = config_fingerprint(self._paths())
+
+    def _paths(self):
+        # 节点清单引用的 CSV/文本文件也参与变化检测
+        return CONFIG_PATHS + tuple(self.current['nodes'].sources)
+
+    def poll(self):
+        # 返回 (新配置, diff)；无变化或新配置不可用时返回 (None, None)
+        fingerprint = config_fingerprint(self._paths())
+        if fingerprint == self._fingerprint:
+            return None, None
+        self._fingerprint = fingerprint
+
+        LOG.info("检测到配置文件变化，重新加载...")
+        new_configs = load_all_configs()
+        if new_configs is None:
+            LOG.error("新配置加载失败，继续使用当前配置。")
+            return None, None
+        errors = validate_configs(new_configs, self.known_checks)
+        if errors:
+            LOG.error(f"新配置校验失败，继续使用当前配置: {'; '.join(errors)}")
+            return None, None
+
+        diff = diff_configs(self.current, new_configs)
+        if not any(diff.values()):
+            LOG.info("配置文件内容未发生实质变化。")
+            return None, None
+        self.current = new_configs
+        self._fingerprint = config_fingerprint(self._paths())
+        return new_configs, diff
@@ -0,0 +1,87 @@
+from array import array
+import logbook
+
+from core import metrics
+
+LOG = logbook.Logger(__name__)
+
+# 单调计数器的速率引擎 (IB 端口流量与错误计数等)。主进程按节点在内存中保存上一次采样，worker 通过 fork 继承；
+# 检查项解析时与上一次采样比较得到增量与每秒速率，新的采样随节点报告 (drain) 返回主进程 (merge)。
+# 程序重启或节点重启后第一次采样只建立基线，不产生速率。
+#
+# 一次采样: (节点时间戳, 节点 boot_id, 计数器名元组, array('Q') 计数值)。相同的计数器名元组在主进程中只保留一份，
+# 数万节点每节点上百个计数器时也只占用数十 MB。
+MAX_INTERVAL_SECONDS = 24 * 3600   # 两次采样间隔超过该值时重新建立基线
+DEFAULT_WIDTH = (64, False)         # 未指定位宽的计数器: (位宽, 是否饱和型)
+
+_SAMPLES = {}      # host -> 上一次采样 (主进程)
+_PENDING = {}      # host -> 本进程新产生、尚未返回主进程的采样 (worker)
+_LAYOUTS = {}      # 计数器名元组去重
+
+def _layout(names):
+    names = tuple(names)
+    return _LAYOUTS.setdefault(names, names)
+
+def counter_delta(previous, current, bits=64, saturating=False):
+    # 返回 (增量, 状态)。bits 为计数器位宽: 回绕型计数器只有在上一次的值接近上限 (回绕后的增量不超过半个量程) 时
+    # 才按回绕 (wrap) 计算，其余的下降都是清零或驱动重载 (reset)，增量按从零开始计；
+    # saturating 为 IB 规范中 4/8/16/32 位的 PortCounters，到达上限后停止计数 (saturated)，无法得到增量
+    limit = 1 << bits
+    if saturating and current >= limit - 1:
+        return None, 'saturated'
+    if current >= previous:
+        return current - previous, 'ok'
+    if not saturating and previous < limit and current + limit - previous <= limit // 2:
+        return current + limit - previous, 'wrap'
+    return current, 'reset'
+
+def observe(host, timestamp, boot_id, values, widths=None):
+    # values: {计数器名: 计数值}；widths: {计数器名: (位宽, 是否饱和型)}，未列出的按 64 位回绕型处理。返回 None 表示本次只建立基线，否则返回
+    # {'interval': 秒, 'deltas': {计数器名: 增量}, 'rates': {计数器名: 每秒速率}, 'resets': [...], 'wraps': [...], 'saturated': [...]}
+    names = _layout(sorted(values))
+    sample = (timestamp, boot_id, names, array('Q', [values[name] for name in names]))
+    _PENDING[host] = sample
+    return _compare(_SAMPLES.get(host), sample, widths or {})
+
+def _compare(previous, sample, widths):
+    if previous is None:
+        return None
+    timestamp, boot_id, names, values = sample
+    prev_timestamp, prev_boot_id, prev_names, prev_values = previous
+    interval = timestamp - prev_timestamp
+    # 节点重启后计数清零，启动过程中的链路训练也会计入错误计数，重新建立基线
+    if interval <= 0 or interval > MAX_INTERVAL_SECONDS or boot_id != prev_boot_id:
+        return None
+    previous_values = dict(zip(prev_names, prev_values))
+    result = {'interval': interval, 'deltas': {}, 'rates': {}, 'resets': [], 'wraps': [], 'saturated': []}
+    for name, value in zip(names, values):
+        prev_value = previous_values.get(name)
+        if prev_value is None:
+            continue
+        delta, state = counter_delta(prev_value, value, *widths.get(name, DEFAULT_WIDTH))
+        if state == 'saturated':
+            result['saturated'].append(name)
+            continue
+        if state != 'ok':
+            result[state + 's'].append(name)
+            metrics.inc(f'inspector_counter_{state}s_total')
+        result['deltas'][name] = delta
+        result['rates'][name] = delta / interval
+    return result
+
+def drain():
+    pending = dict(_PENDING)
+    _PENDING.clear()
+    return pending
+
+def merge(samples):
+    # 主进程汇总 worker 返回的新采样
+    if not samples:
+        return
+    for host, (timestamp, boot_id, names, values) in samples.items():
+        _SAMPLES[host] = (timestamp, boot_id, _layout(names), values)
+
+def retain_hosts(hosts):
+    # 分片重新分配后丢弃不再由本实例巡检的节点
+    for host in [host for host in _SAMPLES if host not in hosts]:
+        del _SAMPLES[host]
@@ -1,24 +1,40 @@
+import os
+import json
+import shutil
 import sqlite3
 import time
 from datetime import datetime, timezone, timedelta
-import pymysql
-from pymysql import connect
-from pymysql.err import Error as mysql_error
 import logbook
 
 from .models import (
-    TABLE_NAME, MAX_RETRIES, RETRY_INTERVAL, KEY_HOST, KEY_HOSTNAME, 
-    KEY_TYPE, KEY_EXTRA, EVENTS_ALARMS, TABLE_CREATE_SQL
+    TABLE_NAME, FINGERPRINT_TABLE, MAX_RETRIES, RETRY_INTERVAL, KEY_HOST, KEY_HOSTNAME, 
+    KEY_TYPE, KEY_EXTRA, EVENTS_ALARMS, TABLE_CREATE_SQL, EVENTS_ALARMS_CREATE_SQL,
+    IssueEvent, as_dict
 )
+from .transitions import ACTIVE_STATUSES
+from . import metrics, logpipe
 
 LOG = logbook.Logger(__name__)
 
+# pymysql 只在配置了 MySQL 时才需要，首次使用时导入，避免拖慢单节点 CLI 等不写 MySQL 的场景
+pymysql = None
+mysql_error = ()
+
+def _load_pymysql():
+    global pymysql, mysql_error
+    if pymysql is None:
+        import pymysql
+        import pymysql.cursors
+        mysql_error = pymysql.err.Error
+    return pymysql
+
 def init_sqlite(db_path="venus_checker.db"):
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
+        # 多个 worker (及分片模式下的多个实例) 并发写同一状态库，等待锁而不是立即报错
+        conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
         conn.row_factory = sqlite3.Row  
         _ensure_sqlite_table(conn)
-        LOG.info(f"成功初始化并连接到 SQLite 数据库: {db_path}")
+        LOG.info(f"成功初始化并连接到 SQLite 数据库: {db_path}", extra=logpipe.ROUTINE)
         return conn
     except sqlite3.Error as e:
         LOG.critical(f'SQLite 初始化失败，程序可能无法正常记录状态: {e}')
@@ -29,17 +45,34 @@ def _ensure_sqlite_table(conn):
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
             host TEXT, hostname TEXT, type TEXT, extra TEXT,
             status TEXT, priority TEXT, create_at TEXT, update_at TEXT,
+            history TEXT, flips TEXT,
             PRIMARY KEY (host, type)
         )
     '''
     try:
         cursor = conn.cursor()
         cursor.execute(create_table_sql)
+        # 兼容旧库: 补齐状态机使用的列
+        existing_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")}
+        for column in ('history', 'flips'):
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {column} TEXT")
+        # 按类型查询活动故障 (P3 汇总等) 与按更新时间归档已恢复故障使用的索引
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_type_status ON {TABLE_NAME} (type, status)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_status_update ON {TABLE_NAME} (status, update_at)")
+        # 检查项输出指纹，只保存处于稳定状态的 (节点, 检查项)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (
+                host TEXT, check_name TEXT, digest TEXT, updated_at REAL,
+                PRIMARY KEY (host, check_name)
+            ) WITHOUT ROWID
+        ''')
         conn.commit()
     except sqlite3.Error as e:
         LOG.error(f"创建 SQLite 表 '{TABLE_NAME}' 失败: {e}")
         raise
 
+@metrics.timed('inspector_sqlite_seconds', op='query_record')
 def query_sqlite_record(conn, host, issue_type):
     if not conn:
         LOG.warning("SQLite连接无效，无法查询记录。")
@@ -57,6 +90,7 @@ def query_sqlite_record(conn, host, issue_type):
         LOG.error(f"查询 SQLite 记录失败 (host={host}, type={issue_type}): {e}")
         return None
 
+@metrics.timed('inspector_sqlite_seconds', op='upsert_record')
 def upsert_sqlite_record(conn, record_data):
     if not conn:
         LOG.warning("SQLite连接无效，无法更新/插入记录。")
@@ -78,18 +112,22 @@ def upsert_sqlite_record(conn, record_data):
         'status': record_data.get('status'),
         'priority': record_data.get('priority', 'N/A'),
         'create_at': record_data.get('create_at', bj_time),
-        'update_at': bj_time
+        'update_at': bj_time,
+        'history': record_data.get('history'),
+        'flips': record_data.get('flips')
     }
 
     sql = f'''
-        INSERT INTO {TABLE_NAME} (host, hostname, type, extra, status, priority, create_at, update_at)
-        VALUES (:host, :hostname, :type, :extra, :status, :priority, :create_at, :update_at)
+        INSERT INTO {TABLE_NAME} (host, hostname, type, extra, status, priority, create_at, update_at, history, flips)
+        VALUES (:host, :hostname, :type, :extra, :status, :priority, :create_at, :update_at, :history, :flips)
         ON CONFLICT(host, type) DO UPDATE SET
             hostname=excluded.hostname,
             extra=excluded.extra,
             status=excluded.status,
             priority=excluded.priority,
-            update_at=excluded.update_at
+            update_at=excluded.update_at,
+            history=excluded.history,
+            flips=excluded.flips
     '''
     try:
         cursor = conn.cursor()
@@ -103,6 +141,7 @@ def upsert_sqlite_record(conn, record_data):
         if conn: conn.rollback()
 
 
+@metrics.timed('inspector_sqlite_seconds', op='update_status')
 def update_issue_status(conn, host, issue_type, status):
     if not conn:
         LOG.warning("SQLite连接无效，无法更新状态。")
@@ -124,38 +163,105 @@ def update_issue_status(conn, host, issue_type, status):
         LOG.warning(f'更新状态失败 (host={host}, type={issue_type}): {e}')
         if conn: conn.rollback()
 
+@metrics.timed('inspector_sqlite_seconds', op='update_tracking')
+def update_issue_tracking(conn, host, issue_type, status, history, flips):
+    if not conn:
+        LOG.warning("SQLite连接无效，无法更新状态跟踪信息。")
+        return
+
+    bj_time = datetime.now(timezone(timedelta(hours=8))).isoformat()
+    sql = f'''
+        UPDATE {TABLE_NAME}
+        SET status = ?, history = ?, flips = ?, update_at = ?
+        WHERE host = ? AND type = ?
+    '''
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, (status, history, flips, bj_time, host, issue_type))
+        conn.commit()
+    except sqlite3.Error as e:
+        LOG.warning(f'更新状态跟踪信息失败 (host={host}, type={issue_type}): {e}')
+        if conn: conn.rollback()
+
+@metrics.timed('inspector_sqlite_seconds', op='load_fingerprints')
+def load_fingerprints(conn, host, max_age_seconds):
+    # 返回 {检查项: 指纹}，超过 max_age_seconds 的指纹视为不存在
+    if not conn:
+        return {}
+    try:
+        rows = conn.execute(f"SELECT check_name, digest FROM {FINGERPRINT_TABLE} WHERE host = ? AND updated_at >= ?",
+                            (host, time.time() - max_age_seconds)).fetchall()
+        return {row[0]: row[1] for row in rows}
+    except sqlite3.Error as e:
+        LOG.warning(f"读取输出指纹失败 (host={host}): {e}")
+        return {}
+
+@metrics.timed('inspector_sqlite_seconds', op='save_fingerprints')
+def save_fingerprints(conn, host, digests, removed=()):
+    # digests: 需要写入 (新增、变化或过期) 的 {检查项: 指纹}；removed: 不再稳定的检查项
+    if not conn or not (digests or removed):
+        return
+    now = time.time()
+    try:
+        conn.executemany(f'''
+            INSERT INTO {FINGERPRINT_TABLE} (host, check_name, digest, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(host, check_name) DO UPDATE SET digest=excluded.digest, updated_at=excluded.updated_at
+        ''', [(host, check_name, digest, now) for check_name, digest in digests.items()])
+        conn.executemany(f"DELETE FROM {FINGERPRINT_TABLE} WHERE host = ? AND check_name = ?",
+                         [(host, check_name) for check_name in removed])
+        conn.commit()
+    except sqlite3.Error as e:
+        LOG.warning(f"保存输出指纹失败 (host={host}): {e}")
+        conn.rollback()
+
+@metrics.timed('inspector_sqlite_seconds', op='query_active_by_types')
 def query_active_issues_by_types(conn, issue_types):
     if not conn or not issue_types:
         return []
     try:
         placeholders = ', '.join('?' for _ in issue_types)
-        sql = f"SELECT * FROM {TABLE_NAME} WHERE status != 'resolved' AND type IN ({placeholders})"
+        status_placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        sql = f"SELECT * FROM {TABLE_NAME} WHERE status IN ({status_placeholders}) AND type IN ({placeholders})"
         cursor = conn.cursor()
-        rows = cursor.execute(sql, tuple(issue_types)).fetchall()
+        rows = cursor.execute(sql, tuple(ACTIVE_STATUSES) + tuple(issue_types)).fetchall()
         return [dict(row) for row in rows]
     except sqlite3.Error as e:
         LOG.error(f"按类型查询活动故障失败: {e}")
         return []
 
+@metrics.timed('inspector_sqlite_seconds', op='query_active')
+def query_active_issues(conn):
+    if not conn:
+        return []
+    try:
+        status_placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        sql = f"SELECT * FROM {TABLE_NAME} WHERE status IN ({status_placeholders})"
+        rows = conn.cursor().execute(sql, tuple(ACTIVE_STATUSES)).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        LOG.error(f"查询活动故障失败: {e}")
+        return []
+
 def init_mysql(db_config):
     if not db_config or not all([db_config.get(k) for k in ['host', 'port', 'user', 'password', 'db_name']]):
         LOG.warning("MySQL 配置不完整，将跳过 MySQL 功能。")
         return False
+    _load_pymysql()
 
     retries = MAX_RETRIES
     while retries > 0:
         try:
-            conn = connect(
+            conn = pymysql.connect(
                 host=db_config['host'], port=db_config['port'], user=db_config['user'],
-                password=db_config['password'], database=None, connection_timeout=10,
+                password=db_config['password'], database=None, connect_timeout=10,
                 charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor
             )
             
             with conn.cursor() as cursor:
                 cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_config['db_name']}`")
                 conn.select_db(db_config['db_name'])
-                if EVENTS_ALARMS in TABLE_CREATE_SQL:
-                    cursor.execute(TABLE_CREATE_SQL[EVENTS_ALARMS])
+                cursor.execute(TABLE_CREATE_SQL)
+                cursor.execute(EVENTS_ALARMS_CREATE_SQL)
             conn.commit()
             conn.close()
             LOG.info(f"成功初始化 MySQL 数据库和表: {db_config['db_name']}")
@@ -174,10 +280,11 @@ def init_mysql(db_config):
 def get_mysql_connection(db_config):
     if not db_config:
         return None
+    _load_pymysql()
     try:
-        conn = connect(
+        conn = pymysql.connect(
             host=db_config['host'], port=db_config['port'], user=db_config['user'],
-            password=db_config['password'], database=db_config['db_name'],
+            password=db_config['password'], database=db_config['db_name'], connect_timeout=10,
             charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor
         )
         return conn
@@ -185,41 +292,193 @@ def get_mysql_connection(db_config):
         LOG.error(f"获取新的 MySQL 连接失败: {e}")
         return None
 
-def write_to_mysql(conn, event_data):
-    if not conn:
-        LOG.debug("MySQL connection is not available, skipping write.")
-        return
+def make_mysql_event(record, status):
+    return IssueEvent(
+        record.get(KEY_HOST),
+        record.get(KEY_HOSTNAME) or record.get(KEY_HOST),
+        record.get(KEY_TYPE),
+        record.get('priority', 'N/A'),
+        status,
+        str(record.get(KEY_EXTRA, '')),
+        datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'),
+    )
 
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        sql = """
-        INSERT INTO your_alert_table (
-            hostname, check_name, status, value, message, 
-            check_time, profile
-        ) VALUES (
-            %(host)s, %(check_name)s, %(status)s, %(value)s, %(message)s, 
-            %(check_time)s, %(profile)s
-        )
-        """
-        data_to_insert = {
-            'host': event_data.get('host'),
-            'check_name': event_data.get('check_name'),
-            'status': event_data.get('status'),
-            'value': str(event_data.get('value', '')),
-            'message': event_data.get('message'),
-            'check_time': event_data.get('check_time'),
-            'profile': event_data.get('profile')
-        }
-        
-        cursor.execute(sql, data_to_insert)
-        conn.commit()
-        LOG.info(f"Successfully wrote alert for {event_data.get('host')} to MySQL.")
-        
-    except Exception as e:
-        LOG.error(f"Failed to write to MySQL: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cursor:
-            cursor.close()
+_INSERT_EVENT_SQL = f"""
+    INSERT INTO {EVENTS_ALARMS} (host, hostname, type, priority, status, extra, event_time)
+    VALUES (%(host)s, %(hostname)s, %(type)s, %(priority)s, %(status)s, %(extra)s, %(event_time)s)
+"""
+
+# 暂存文件中每行事件必须包含的字段 (上面两条 SQL 的参数)
+SPOOL_EVENT_FIELDS = frozenset(('host', 'hostname', 'type', 'priority', 'status', 'extra', 'event_time'))
+
+_UPSERT_STATUS_SQL = f"""
+    INSERT INTO {TABLE_NAME} (hostname, check_id, status, message, first_occurrence)
+    VALUES (%(hostname)s, %(type)s, %(status)s, %(extra)s, %(event_time)s)
+    ON DUPLICATE KEY UPDATE
+        first_occurrence = IF(status = 'resolved' AND VALUES(status) != 'resolved', VALUES(first_occurrence), first_occurrence),
+        status = VALUES(status),
+        message = VALUES(message)
+"""
+
+# 汇总所有 worker 上报的事件，复用长连接批量写入 MySQL；MySQL 不可用时落盘，恢复后补写
+class MySQLEventSink:
+    def __init__(self, db_config, spool_path="data/mysql_spool.jsonl", batch_size=500, retry_interval=RETRY_INTERVAL * 6):
+        self.db_config = db_config
+        self.enabled = bool(db_config) and all(db_config.get(k) for k in ['host', 'port', 'user', 'password', 'db_name'])
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._conn = None
+        self._last_failure = 0
+        self._buffer = []
+
+    def append(self, event):
+        if self.enabled:
+            self._buffer.append(event)
+
+    def extend(self, events):
+        if self.enabled:
+            self._buffer.extend(events)
+
+    def _get_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.ping(reconnect=True)
+                return self._conn
+            except mysql_error as e:
+                LOG.warning(f"MySQL 长连接失效，重新连接: {e}")
+                self._close_connection()
+        if time.time() - self._last_failure < self.retry_interval:
+            return None
+        self._conn = get_mysql_connection(self.db_config)
+        if self._conn is None:
+            self._last_failure = time.time()
+        return self._conn
+
+    def _close_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _write_batches(self, conn, events):
+        for i in range(0, len(events), self.batch_size):
+            batch = [as_dict(event) for event in events[i:i + self.batch_size]]
+            try:
+                with conn.cursor() as cursor:
+                    cursor.executemany(_INSERT_EVENT_SQL, batch)
+                    cursor.executemany(_UPSERT_STATUS_SQL, batch)
+                conn.commit()
+            except mysql_error:
+                # 已提交的批次不再重复暂存，只暂存未写入的部分
+                self._spool(events[i:])
+                raise
+
+    def _spool(self, events):
+        try:
+            spool_dir = os.path.dirname(self.spool_path)
+            if spool_dir:
+                os.makedirs(spool_dir, exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(as_dict(event), ensure_ascii=False) + '\n')
+            LOG.warning(f"MySQL 不可用，{len(events)} 条事件已暂存到本地: {self.spool_path}")
+        except OSError as e:
+            LOG.error(f"写入 MySQL 本地暂存文件失败，丢弃 {len(events)} 条事件: {e}")
+
+    def _read_spool(self, path):
+        # 返回 (事件, 无法使用的行)；进程在写入中途退出留下的截断行或损坏行不影响其余事件
+        events, bad_lines = [], []
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    bad_lines.append(line)
+                    continue
+                if not isinstance(event, dict) or not SPOOL_EVENT_FIELDS <= event.keys():
+                    bad_lines.append(line)
+                    continue
+                events.append(event)
+        return events, bad_lines
+
+    def _quarantine(self, bad_lines):
+        bad_path = self.spool_path + '.bad'
+        try:
+            with open(bad_path, 'a', encoding='utf-8') as f:
+                f.writelines(line if line.endswith('\n') else line + '\n' for line in bad_lines)
+            LOG.error(f"MySQL 本地暂存文件中有 {len(bad_lines)} 行无法解析，已移到 {bad_path}")
+        except OSError as e:
+            LOG.error(f"写入 {bad_path} 失败，丢弃 {len(bad_lines)} 行无法解析的暂存数据: {e}")
+
+    def _replay_spool(self, conn):
+        # 暂存文件改名为 .replay 后补写，补写中失败的事件由 _write_batches 重新暂存；
+        # 上次未能删除的 .replay 文件与新的暂存合并后一起补写，不会被覆盖
+        replay_path = self.spool_path + '.replay'
+        try:
+            if os.path.exists(self.spool_path):
+                if os.path.exists(replay_path):
+                    with open(self.spool_path, 'rb') as src, open(replay_path, 'ab') as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.remove(self.spool_path)
+                else:
+                    os.replace(self.spool_path, replay_path)
+            if not os.path.exists(replay_path):
+                return
+            events, bad_lines = self._read_spool(replay_path)
+        except OSError as e:
+            LOG.error(f"读取 MySQL 本地暂存文件失败，下次写入时重试: {e}")
+            return
+        if bad_lines:
+            self._quarantine(bad_lines)
+        try:
+            self._write_batches(conn, events)
+        finally:
+            try:
+                os.remove(replay_path)
+            except OSError as e:
+                LOG.error(f"删除 MySQL 补写文件失败: {replay_path}, 错误: {e}")
+        if events:
+            LOG.info(f"已补写 {len(events)} 条本地暂存的 MySQL 事件。")
+
+    @metrics.timed('inspector_mysql_flush_seconds')
+    def _has_spool(self):
+        return os.path.exists(self.spool_path) or os.path.exists(self.spool_path + '.replay')
+
+    def flush(self):
+        # 本轮没有新事件时仍要补写暂存文件，否则故障恢复后集群平稳期间暂存的事件一直留在本地
+        if not self.enabled or not (self._buffer or self._has_spool()):
+            return
+        events, self._buffer = self._buffer, []
+
+        conn = self._get_connection()
+        if conn is None:
+            if events:
+                self._spool(events)
+            return
+        try:
+            try:
+                self._replay_spool(conn)
+            except mysql_error:
+                if events:
+                    self._spool(events)
+                raise
+            if events:
+                self._write_batches(conn, events)
+                LOG.info(f"批量写入 MySQL 成功: {len(events)} 条事件。")
+        except mysql_error as e:
+            LOG.error(f"批量写入 MySQL 失败: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._close_connection()
+            self._last_failure = time.time()
+
+    def close(self):
+        self.flush()
+        self._close_connection()
@@ -0,0 +1,134 @@
+import os
+import time
+import sqlite3
+from datetime import datetime, timezone, timedelta
+import logbook
+
+from core.models import TABLE_NAME, FINGERPRINT_TABLE, TYPE_XID_INFO, TYPE_GPU_THERMAL_SLOWDOWN
+from core import database, metrics, transitions
+
+LOG = logbook.Logger(__name__)
+
+# SQLite 状态库维护: 归档过期的已恢复故障、增量回收空闲页、更新查询统计信息，并上报库大小与查询耗时。
+# 由主进程在巡检周期之间定时执行，本实例此时没有 worker 在写状态库；但分片模式下其他实例共享同一个状态库，
+# 仍在巡检与写入。每一步都是短事务，其他实例的写入最多等待 busy timeout (init_sqlite 中为 30 秒)；
+# 旧库首次维护时的完整 VACUUM 可能超过该时间，期间其他实例的部分写入会因 "database is locked" 失败。
+HISTORY_TABLE = f"{TABLE_NAME}_history"
+
+DEFAULT_MAINTENANCE_CONFIG = {
+    'retention_days': 30,     # 已恢复超过该天数的故障移入历史表
+    'history_days': 365,      # 历史表中保留的天数，0 表示永久保留
+    'fingerprint_days': 1,    # 超过该天数未更新的输出指纹 (如已下线节点) 被删除
+    'vacuum_pages': 0,        # 每次增量回收的页数，0 表示回收全部空闲页
+    'at': '04:30',            # 每日执行时间
+}
+
+HISTORY_CREATE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+        host TEXT, hostname TEXT, type TEXT, extra TEXT,
+        status TEXT, priority TEXT, create_at TEXT, update_at TEXT,
+        history TEXT, flips TEXT, archived_at TEXT
+    )
+'''
+
+_COLUMNS = "host, hostname, type, extra, status, priority, create_at, update_at, history, flips"
+
+def _cutoff(days):
+    return (datetime.now(timezone(timedelta(hours=8))) - timedelta(days=days)).isoformat()
+
+def _ensure_incremental_vacuum(conn):
+    # auto_vacuum 只能在 VACUUM 时切换；旧库首次维护时做一次完整 VACUUM，之后只做增量回收
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        LOG.info("状态库未开启增量回收，执行一次完整 VACUUM 以切换 auto_vacuum=INCREMENTAL...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def archive_resolved(conn, retention_days, history_days):
+    archived_at = datetime.now(timezone(timedelta(hours=8))).isoformat()
+    cutoff = _cutoff(retention_days)
+    with conn:
+        conn.execute(HISTORY_CREATE_SQL)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{HISTORY_TABLE}_host_type ON {HISTORY_TABLE} (host, type)")
+        cursor = conn.execute(
+            f"INSERT INTO {HISTORY_TABLE} ({_COLUMNS}, archived_at) "
+            f"SELECT {_COLUMNS}, ? FROM {TABLE_NAME} WHERE status = ? AND update_at < ?",
+            (archived_at, transitions.STATUS_RESOLVED, cutoff))
+        archived = cursor.rowcount
+        conn.execute(f"DELETE FROM {TABLE_NAME} WHERE status = ? AND update_at < ?",
+                     (transitions.STATUS_RESOLVED, cutoff))
+        purged = 0
+        if history_days:
+            purged = conn.execute(f"DELETE FROM {HISTORY_TABLE} WHERE archived_at < ?", (_cutoff(history_days),)).rowcount
+    return archived, purged
+
+def collect_stats(conn, db_path):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    stats = {
+        'db_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        'freelist_bytes': conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        'status_rows': conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0],
+        'fingerprint_rows': conn.execute(f"SELECT COUNT(*) FROM {FINGERPRINT_TABLE}").fetchone()[0],
+        'active_rows': conn.execute(
+            f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE status IN ({', '.join('?' for _ in transitions.ACTIVE_STATUSES)})",
+            tuple(transitions.ACTIVE_STATUSES)).fetchone()[0],
+    }
+    try:
+        stats['history_rows'] = conn.execute(f"SELECT COUNT(*) FROM {HISTORY_TABLE}").fetchone()[0]
+    except sqlite3.Error:
+        stats['history_rows'] = 0
+
+    # 用 P3 汇总同款查询测一次耗时，并确认走了索引
+    start = time.perf_counter()
+    database.query_active_issues_by_types(conn, [TYPE_XID_INFO, TYPE_GPU_THERMAL_SLOWDOWN])
+    stats['active_by_types_query_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    plan = conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM {TABLE_NAME} WHERE status IN (?, ?) AND type IN (?)",
+        (*transitions.ACTIVE_STATUSES, TYPE_XID_INFO)).fetchall()
+    stats['active_query_uses_index'] = any('USING INDEX' in str(row[-1]) for row in plan)
+
+    metrics.set_gauge('inspector_sqlite_db_bytes', stats['db_bytes'])
+    metrics.set_gauge('inspector_sqlite_freelist_bytes', stats['freelist_bytes'])
+    metrics.set_gauge('inspector_sqlite_rows', stats['status_rows'], table=TABLE_NAME)
+    metrics.set_gauge('inspector_sqlite_rows', stats['history_rows'], table=HISTORY_TABLE)
+    metrics.set_gauge('inspector_sqlite_rows', stats['fingerprint_rows'], table=FINGERPRINT_TABLE)
+    return stats
+
+def run_maintenance(db_path, maintenance_config=None):
+    options = {**DEFAULT_MAINTENANCE_CONFIG, **(maintenance_config or {})}
+    conn = database.init_sqlite(db_path)
+    if not conn:
+        LOG.error("无法连接状态库，跳过本次维护。")
+        return None
+
+    stats = {}
+    try:
+        # 1. 归档过期的已恢复故障
+        with metrics.timer('inspector_sqlite_maintenance_seconds', step='archive'):
+            stats['archived'], stats['history_purged'] = archive_resolved(conn, options['retention_days'], options['history_days'])
+            with conn:
+                stats['fingerprints_purged'] = conn.execute(f"DELETE FROM {FINGERPRINT_TABLE} WHERE updated_at < ?",
+                                                            (time.time() - float(options['fingerprint_days']) * 86400,)).rowcount
+
+        # 2. 增量回收空闲页
+        with metrics.timer('inspector_sqlite_maintenance_seconds', step='vacuum'):
+            _ensure_incremental_vacuum(conn)
+            pages = int(options['vacuum_pages'] or 0)
+            conn.execute(f"PRAGMA incremental_vacuum({pages})" if pages else "PRAGMA incremental_vacuum")
+
+        # 3. 更新查询优化器统计信息
+        with metrics.timer('inspector_sqlite_maintenance_seconds', step='analyze'):
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+
+        stats.update(collect_stats(conn, db_path))
+    except sqlite3.Error as e:
+        LOG.error(f"状态库维护失败: {e}", exc_info=True)
+        return None
+    finally:
+        conn.close()
+
+    LOG.info(f"状态库维护完成: 归档 {stats['archived']} 条已恢复故障, 清理历史 {stats['history_purged']} 条, 过期指纹 {stats['fingerprints_purged']} 条; "
+             f"库大小 {stats['db_bytes'] / 1024 / 1024:.1f} MB (空闲 {stats['freelist_bytes'] / 1024:.0f} KB), "
+             f"状态表 {stats['status_rows']} 行 (活动 {stats['active_rows']}), 历史表 {stats['history_rows']} 行; "
+             f"活动故障查询 {stats['active_by_types_query_ms']} ms, 使用索引: {stats['active_query_uses_index']}")
+    return stats
@@ -1,6 +1,8 @@
 import paramiko
 import logbook
 
+from core import metrics, logpipe
+
 LOG = logbook.Logger(__name__)
 
 def _execute_simple_command(client: paramiko.SSHClient, command: str) -> str:
@@ -12,11 +14,12 @@ def _execute_simple_command(client: paramiko.SSHClient, command: str) -> str:
         pass
     return ""
 
+@metrics.timed('inspector_discover_seconds')
 def discover_node_profile(client: paramiko.SSHClient, hostname: str) -> str:
     # 1. 尝试识别沐曦 GPU
     muxi_output = _execute_simple_command(client, "which mxgpu-smi")
     if "/bin/mxgpu-smi" in muxi_output:
-        LOG.info(f"[{hostname}] Discovered Muxi GPU. Assigning profile: 'gpu_muxi_c100'")
+        LOG.info(f"[{hostname}] Discovered Muxi GPU. Assigning profile: 'gpu_muxi_c100'", extra=logpipe.ROUTINE)
         return "gpu_muxi_c100"
 
     # 2. 尝试识别 NVIDIA GPU
@@ -24,11 +27,11 @@ def discover_node_profile(client: paramiko.SSHClient, hostname: str) -> str:
     if nvidia_output:
         # 新增逻辑: 识别 4090
         if "GeForce RTX 4090" in nvidia_output:
-            LOG.info(f"[{hostname}] Discovered NVIDIA 4090 GPU. Assigning profile: 'gpu_nvidia_4090'")
+            LOG.info(f"[{hostname}] Discovered NVIDIA 4090 GPU. Assigning profile: 'gpu_nvidia_4090'", extra=logpipe.ROUTINE)
             return "gpu_nvidia_4090"
         # 默认是数据中心卡
         else:
-            LOG.info(f"[{hostname}] Discovered NVIDIA Datacenter GPU. Assigning profile: 'nvidia'")
+            LOG.info(f"[{hostname}] Discovered NVIDIA Datacenter GPU. Assigning profile: 'nvidia'", extra=logpipe.ROUTINE)
             return "nvidia"
 
     # 3. 如果都无法识别，则为未知
@@ -0,0 +1,92 @@
+import logbook
+
+from core.models import *
+from core import metrics
+
+LOG = logbook.Logger(__name__)
+
+FLEET_CHECK_NAME = "fleet.gpu_temperature_outlier"
+
+# 告警 extra 只包含稳定信息 (GPU 序号、温度区间、Profile、离群原因)，均值/标准差/z 值每轮都会变化，只写日志，
+# 否则持续存在的离群每轮都会被当作变化的故障重新完整告警
+TEMP_BUCKET = 5
+
+def _collect_gpu_temps(node_reports):
+    import numpy as np
+    # 把所有节点的 GPU 读数拼接成扁平数组，节点内的 GPU 保持连续，便于 reduceat
+    reports, temps, offsets, profiles = [], [], [], []
+    for report in node_reports:
+        if not report:
+            continue
+        node_temps = []
+        for metrics in report.get(KEY_METRICS, {}).values():
+            node_temps.extend(metrics.get('gpu_temp', []))
+        if not node_temps:
+            continue
+        offsets.append(len(temps))
+        temps.extend(node_temps)
+        profiles.append(report.get('profile', 'unknown'))
+        reports.append(report)
+    return reports, np.asarray(temps, dtype=np.float64), np.asarray(offsets, dtype=np.intp), profiles
+
+@metrics.timed('inspector_fleet_analysis_seconds')
+def analyze_gpu_temperatures(node_reports, thresholds):
+    # NumPy 只在主进程做集群分析时导入，单节点 CLI 与 worker 无需加载
+    import numpy as np
+    zscore_limit = thresholds.get("fleet_temp_zscore", 3.0)
+    spread_limit = thresholds.get("fleet_temp_node_spread", 15)
+    min_profile_gpus = thresholds.get("fleet_min_profile_gpus", 16)
+
+    reports, temps, offsets, profiles = _collect_gpu_temps(node_reports)
+    if temps.size == 0:
+        return []
+
+    counts = np.diff(np.append(offsets, temps.size))
+    node_idx = np.repeat(np.arange(len(reports)), counts)
+
+    # 1. 按 Profile 计算 z-score (同型号、同任务类型的 GPU 作为基线)
+    profile_names, node_profile_idx = np.unique(np.asarray(profiles), return_inverse=True)
+    gpu_profile_idx = node_profile_idx[node_idx]
+    n = np.bincount(gpu_profile_idx, minlength=len(profile_names)).astype(np.float64)
+    mean = np.bincount(gpu_profile_idx, weights=temps, minlength=len(profile_names)) / n
+    sq_mean = np.bincount(gpu_profile_idx, weights=temps * temps, minlength=len(profile_names)) / n
+    std = np.sqrt(np.maximum(sq_mean - mean * mean, 0.0))
+    usable = (n >= min_profile_gpus) & (std > 0)
+    safe_std = np.where(usable, std, 1.0)
+    z = (temps - mean[gpu_profile_idx]) / safe_std[gpu_profile_idx]
+    z_outlier = usable[gpu_profile_idx] & (z > zscore_limit)
+
+    # 2. 节点内 GPU 温差 (最热卡与最冷卡之差)
+    node_max = np.maximum.reduceat(temps, offsets)
+    node_min = np.minimum.reduceat(temps, offsets)
+    spread = node_max - node_min
+    spread_outlier = (spread > spread_limit)[node_idx] & (temps == node_max[node_idx])
+
+    outlier = z_outlier | spread_outlier
+    flagged_nodes = np.zeros(len(reports), dtype=bool)
+    flagged_nodes[node_idx[outlier]] = True
+
+    results = []
+    gpu_local_idx = np.arange(temps.size) - offsets[node_idx]
+    for i, report in enumerate(reports):
+        if not flagged_nodes[i]:
+            results.append((report, CheckResult.ok([TYPE_GPU_TEMP_OUTLIER])))
+            continue
+        start, end = offsets[i], offsets[i] + counts[i]
+        p = node_profile_idx[i]
+        details, readings = [], []
+        for j in np.nonzero(outlier[start:end])[0] + start:
+            reasons = [name for name, flagged in (("z-score", z_outlier[j]), ("node spread", spread_outlier[j])) if flagged]
+            low = int(temps[j] // TEMP_BUCKET * TEMP_BUCKET)
+            details.append(f"GPU-{gpu_local_idx[j]} at {low}-{low + TEMP_BUCKET - 1}C ({', '.join(reasons)})")
+            # std 不可用时 z 是按 1.0 兜底算出的，没有意义
+            readings.append(f"GPU-{gpu_local_idx[j]} {temps[j]:.0f}C" + (f" z={z[j]:.1f}" if usable[p] else ""))
+        extra = f"GPU temperature deviates from fleet baseline in profile '{profile_names[p]}': {'; '.join(details)}."
+        baseline = f"均值 {mean[p]:.1f}C, 标准差 {std[p]:.1f}C" if usable[p] else "样本不足, 未计算 z-score"
+        LOG.info(f"[{report.get(KEY_HOSTNAME, report.get(KEY_HOST))}] GPU 温度离群: {', '.join(readings)}; "
+                 f"Profile '{profile_names[p]}' {baseline}; 节点内温差 {spread[i]:.0f}C (阈值 {spread_limit}C)。")
+        results.append((report, CheckResult.failure(report, TYPE_GPU_TEMP_OUTLIER, extra)))
+
+    LOG.info(f"集群 GPU 温度离群分析完成: {len(reports)} 个节点, {temps.size} 块 GPU, "
+             f"{int(flagged_nodes.sum())} 个节点存在离群 GPU。")
+    return results
@@ -0,0 +1,52 @@
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import logbook
+
+LOG = logbook.Logger(__name__)
+
+# path -> handler(query) -> (status, content_type, body)
+ROUTES = {}
+
+def route(path):
+    def decorator(func):
+        ROUTES[path] = func
+        return func
+    return decorator
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        handler = ROUTES.get(parsed.path)
+        if handler is None:
+            status, content_type, body = 404, 'text/plain; charset=utf-8', 'not found\n'
+        else:
+            try:
+                status, content_type, body = handler(parse_qs(parsed.query))
+            except Exception as e:
+                LOG.error(f"处理 HTTP 请求 {self.path} 失败: {e}", exc_info=True)
+                status, content_type, body = 500, 'text/plain; charset=utf-8', 'internal error\n'
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(listen):
+    # listen 形如 "127.0.0.1:9109"；为空时不启动
+    if not listen:
+        return None
+    host, _, port = str(listen).rpartition(':')
+    try:
+        server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), _Handler)
+    except (OSError, ValueError) as e:
+        LOG.error(f"本地 HTTP 服务启动失败 ({listen}): {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="inspector-httpd", daemon=True).start()
+    LOG.info(f"本地 HTTP 服务已启动: http://{host or '127.0.0.1'}:{port} (路径: {', '.join(sorted(ROUTES))})")
+    return server
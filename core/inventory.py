@@ -0,0 +1,264 @@
+import os
+import re
+import csv
+from array import array
+import logbook
+
+LOG = logbook.Logger(__name__)
+
+# 节点清单。nodes.yaml 支持三部分，可以混用:
+#   defaults: 所有节点的公共字段 (port/username/password/timeout)，覆盖 app_config.yaml 中的 ssh_defaults
+#   groups:   分组，每组可以有自己的 defaults；hosts 支持范围写法 (gpu[001-512]、10.1.3.[1-20,31])，
+#             sources 引用 CSV (表头需包含 host) 或纯文本 (每行 "host [hostname]") 文件，逐行读取
+#   nodes:    原有的逐节点列表，可带 group 字段，不带则属于 default 组
+# 清单只保存 host/hostname/分组序号，以及与所属分组不同的少量逐节点字段；完整的节点字典在迭代时按需生成。
+DEFAULT_GROUP = 'default'
+NODE_ID_FIELDS = ('host', 'hostname', 'group')
+INT_FIELDS = ('port',)
+FLOAT_FIELDS = ('timeout',)
+
+_RANGE = re.compile(r'\[([^\[\]]+)\]')
+
+def expand_hosts(pattern):
+    # gpu[001-003] -> gpu001, gpu002, gpu003；前导零位数按范围起点保留，可以有多个范围
+    match = _RANGE.search(pattern)
+    if not match:
+        return [pattern]
+    head = pattern[:match.start()]
+    tails = expand_hosts(pattern[match.end():])
+    hosts = []
+    for item in match.group(1).split(','):
+        item = item.strip()
+        if '-' in item:
+            start, end = item.split('-', 1)
+            if int(end) < int(start):
+                raise ValueError(f"范围 {item} 的终点小于起点")
+            width = len(start)
+            values = [str(n).zfill(width) for n in range(int(start), int(end) + 1)]
+        else:
+            values = [item]
+        if tails == ['']:
+            hosts.extend([head + value for value in values])
+        else:
+            hosts.extend(head + value + tail for value in values for tail in tails)
+    return hosts
+
+def _coerce(field, value):
+    if field in INT_FIELDS:
+        return int(value)
+    if field in FLOAT_FIELDS:
+        return float(value)
+    return value
+
+class Inventory:
+    def __init__(self):
+        self.group_names = []     # 分组序号 -> 组名
+        self.group_specs = []     # 分组序号 -> 合并后的公共字段
+        self.sources = []         # 引用的清单文件，热加载时一并检测变化
+        self.errors = []
+        self._group_index = {}
+        self._hosts = []
+        self._hostnames = []      # 与 host 相同时为 None
+        self._groups = array('H')
+        self._overrides = {}      # 节点序号 -> 与所属分组不同的字段
+        self._index = {}          # host -> 节点序号
+        self._by_hostname = None
+        self._order = None        # select() 得到的子集: 节点序号列表；None 表示全部节点
+        self._members = None
+
+    def add_group(self, name, spec):
+        if name in self._group_index:
+            self.group_specs[self._group_index[name]] = spec
+        else:
+            self._group_index[name] = len(self.group_names)
+            self.group_names.append(name)
+            self.group_specs.append(spec)
+        return self._group_index[name]
+
+    def group_id(self, name):
+        if name not in self._group_index:
+            return self.add_group(name, dict(self.group_specs[self._group_index[DEFAULT_GROUP]]))
+        return self._group_index[name]
+
+    def add(self, host, hostname=None, group_id=0, fields=None, origin=''):
+        if not host:
+            self.errors.append(f"{origin}节点缺少 host")
+            return
+        if host in self._index:
+            self.errors.append(f"{origin}节点 {host} 重复")
+            return
+        i = len(self._hosts)
+        self._index[host] = i
+        self._hosts.append(host)
+        self._hostnames.append(hostname if hostname and hostname != host else None)
+        self._groups.append(group_id)
+        if fields:
+            group_spec = self.group_specs[group_id]
+            # 与分组相同的字段 (如逐节点重复的账号密码) 不单独保存
+            overrides = {k: v for k, v in fields.items() if group_spec.get(k) != v}
+            if overrides:
+                self._overrides[i] = overrides
+        self._by_hostname = None
+
+    def add_hosts(self, hosts, group_id=0, origin=''):
+        # 范围展开后的批量添加，节点没有逐节点字段
+        fresh = dict.fromkeys(hosts)
+        duplicated = fresh.keys() & self._index.keys()
+        if duplicated or len(fresh) < len(hosts):
+            self.errors.append(f"{origin}节点重复: {', '.join(sorted(duplicated)[:10]) or hosts[0]}")
+            fresh = [host for host in fresh if host not in duplicated]
+        start = len(self._hosts)
+        self._index.update(zip(fresh, range(start, start + len(fresh))))
+        self._hosts.extend(fresh)
+        self._hostnames.extend([None] * len(fresh))
+        self._groups.extend(array('H', [group_id]) * len(fresh))
+        self._by_hostname = None
+
+    def _spec(self, i):
+        group_id = self._groups[i]
+        spec = dict(self.group_specs[group_id])
+        spec['host'] = self._hosts[i]
+        spec['hostname'] = self._hostnames[i] or self._hosts[i]
+        spec['group'] = self.group_names[group_id]
+        overrides = self._overrides.get(i)
+        if overrides:
+            spec.update(overrides)
+        return spec
+
+    def _ids(self):
+        return range(len(self._hosts)) if self._order is None else self._order
+
+    def __len__(self):
+        return len(self._hosts) if self._order is None else len(self._order)
+
+    def __iter__(self):
+        return (self._spec(i) for i in self._ids())
+
+    def hosts(self):
+        hosts = self._hosts
+        return (hosts[i] for i in self._ids())
+
+    def iter_specs(self, group=None):
+        if group is None:
+            return iter(self)
+        group_id = self._group_index.get(group)
+        return (self._spec(i) for i in self._ids() if self._groups[i] == group_id)
+
+    def group_counts(self):
+        counts = [0] * len(self.group_names)
+        for i in self._ids():
+            counts[self._groups[i]] += 1
+        return {name: count for name, count in zip(self.group_names, counts) if count}
+
+    def find(self, name):
+        # 按 host 或 hostname 查找，不在当前清单 (或子集) 中时返回 None
+        i = self._index.get(name)
+        if i is None:
+            if self._by_hostname is None:
+                self._by_hostname = {hostname: j for j, hostname in enumerate(self._hostnames) if hostname}
+            i = self._by_hostname.get(name)
+        if i is None:
+            return None
+        if self._order is not None:
+            if self._members is None:
+                self._members = set(self._order)
+            if i not in self._members:
+                return None
+        return self._spec(i)
+
+    def field_values(self, field):
+        # 分组与逐节点字段中出现过的取值 (如引用的跳板机)
+        values = {spec.get(field) for spec in self.group_specs}
+        values.update(overrides.get(field) for overrides in self._overrides.values())
+        values.discard(None)
+        return values
+
+    def default_spec(self, host):
+        # 清单外的节点使用 default 组的公共字段
+        return {**self.group_specs[self._group_index[DEFAULT_GROUP]], 'host': host, 'hostname': host, 'group': DEFAULT_GROUP}
+
+    def select(self, groups=None, hosts=None, predicate=None):
+        # 返回共享索引的子集: groups 为组名集合，hosts 为 host/hostname 集合，predicate 接收 host
+        group_ids = {self._group_index[g] for g in groups if g in self._group_index} if groups is not None else None
+        selected = array('I')
+        for i in self._ids():
+            if group_ids is not None and self._groups[i] not in group_ids:
+                continue
+            if hosts is not None and self._hosts[i] not in hosts and self._hostnames[i] not in hosts:
+                continue
+            if predicate is not None and not predicate(self._hosts[i]):
+                continue
+            selected.append(i)
+        subset = object.__new__(Inventory)
+        subset.__dict__.update(self.__dict__)
+        subset._order = selected
+        subset._members = None
+        return subset
+
+def _load_source(inventory, path, group_id):
+    origin = f"{path}: "
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.endswith('.csv'):
+                for line_no, row in enumerate(csv.DictReader(f), start=2):
+                    fields = {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+                    host = fields.pop('host', None)
+                    hostname = fields.pop('hostname', None)
+                    row_group = inventory.group_id(fields.pop('group')) if 'group' in fields else group_id
+                    try:
+                        fields = {k: _coerce(k, v) for k, v in fields.items()}
+                    except ValueError as e:
+                        inventory.errors.append(f"{origin}第 {line_no} 行字段格式错误: {e}")
+                        continue
+                    inventory.add(host, hostname, row_group, fields, origin=f"{origin}第 {line_no} 行")
+            else:
+                for line_no, line in enumerate(f, start=1):
+                    parts = line.split('#', 1)[0].split()
+                    if not parts:
+                        continue
+                    try:
+                        hosts = expand_hosts(parts[0])
+                    except ValueError as e:
+                        inventory.errors.append(f"{origin}第 {line_no} 行主机范围 '{parts[0]}' 无效: {e}")
+                        continue
+                    for host in hosts:
+                        inventory.add(host, parts[1] if len(parts) > 1 else None, group_id, origin=f"{origin}第 {line_no} 行")
+    except OSError as e:
+        inventory.errors.append(f"读取节点清单文件失败: {path}, 错误: {e}")
+    except (ValueError, csv.Error) as e:
+        inventory.errors.append(f"解析节点清单文件失败: {path}, 错误: {e}")
+
+def load_inventory(nodes_config, ssh_defaults=None, base_dir='.'):
+    inventory = Inventory()
+    base_spec = {**(ssh_defaults or {}), **(nodes_config.get('defaults') or {})}
+    inventory.add_group(DEFAULT_GROUP, base_spec)
+
+    # 1. 分组: 组内 defaults 覆盖全局 defaults，hosts 展开范围，sources 逐行读取
+    for name, group in (nodes_config.get('groups') or {}).items():
+        group = group or {}
+        group_id = inventory.add_group(name, {**base_spec, **(group.get('defaults') or {})})
+        for pattern in group.get('hosts') or []:
+            try:
+                hosts = expand_hosts(str(pattern))
+            except ValueError as e:
+                inventory.errors.append(f"分组 '{name}' 的主机范围 '{pattern}' 无效: {e}")
+                continue
+            inventory.add_hosts(hosts, group_id, origin=f"分组 '{name}': ")
+        for source in group.get('sources') or []:
+            path = source if os.path.isabs(source) else os.path.join(base_dir, source)
+            inventory.sources.append(path)
+            _load_source(inventory, path, group_id)
+
+    # 2. 逐节点列表 (原有格式)
+    for i, node in enumerate(nodes_config.get('nodes') or []):
+        if not isinstance(node, dict):
+            inventory.errors.append(f"nodes.yaml 第 {i + 1} 个节点格式错误")
+            continue
+        fields = {k: v for k, v in node.items() if k not in NODE_ID_FIELDS}
+        group_id = inventory.group_id(node['group']) if node.get('group') else 0
+        inventory.add(node.get('host'), node.get('hostname'), group_id, fields, origin=f"nodes.yaml 第 {i + 1} 个")
+    return inventory
+
+def from_specs(node_specs, ssh_defaults=None):
+    # 由节点字典列表构造清单 (压测与模拟工具使用)
+    return load_inventory({'nodes': list(node_specs)}, ssh_defaults)
@@ -0,0 +1,149 @@
+import json
+import threading
+import logbook
+
+from core import httpd, transitions
+
+LOG = logbook.Logger(__name__)
+
+# 主进程内的当前故障视图: 启动时从 SQLite 加载一次活动故障，之后由 worker 随节点报告返回的状态变更增量维护。
+# 按 host / type / 优先级建立倒排索引，供本地 HTTP 接口查询，不再直接读取正在被写入的状态库。
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_LOCK = threading.Lock()
+_ISSUES = {}          # (host, type) -> issue
+_BY_HOST = {}         # host 与 hostname -> {(host, type)}
+_BY_TYPE = {}         # type -> {(host, type)}
+_BY_PRIORITY = {}     # P0/P1/P2/P3 -> {(host, type)}
+
+def _priority_code(priority):
+    return str(priority or 'N/A').split(' ')[0]
+
+def _index_add(index, value, key):
+    index.setdefault(value, set()).add(key)
+
+def _index_remove(index, value, key):
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+def _remove(key):
+    issue = _ISSUES.pop(key, None)
+    if issue is None:
+        return
+    for name in {issue['host'], issue['hostname']}:
+        _index_remove(_BY_HOST, name, key)
+    _index_remove(_BY_TYPE, issue['type'], key)
+    _index_remove(_BY_PRIORITY, _priority_code(issue['priority']), key)
+
+def _upsert(issue):
+    key = (issue['host'], issue['type'])
+    _remove(key)
+    _ISSUES[key] = issue
+    for name in {issue['host'], issue['hostname']}:
+        _index_add(_BY_HOST, name, key)
+    _index_add(_BY_TYPE, issue['type'], key)
+    _index_add(_BY_PRIORITY, _priority_code(issue['priority']), key)
+
+def _normalize(record):
+    return {
+        'host': record.get('host'),
+        'hostname': record.get('hostname') or record.get('host'),
+        'type': record.get('type'),
+        'priority': record.get('priority', 'N/A'),
+        'status': record.get('status'),
+        'extra': record.get('extra'),
+        'update_at': record.get('update_at'),
+    }
+
+def load(records):
+    # records 为状态库中的活动故障 (database.query_active_issues)，替换当前视图
+    with _LOCK:
+        for index in (_ISSUES, _BY_HOST, _BY_TYPE, _BY_PRIORITY):
+            index.clear()
+        for record in records:
+            _upsert(_normalize(record))
+    LOG.info(f"内存故障视图已加载 {len(_ISSUES)} 条活动故障。")
+
+def apply(changes):
+    # changes 为 worker 上报的状态变更；只有活动状态 (已上报/抖动中) 才出现在视图中
+    if not changes:
+        return
+    with _LOCK:
+        for change in changes:
+            if change.get('status') in transitions.ACTIVE_STATUSES:
+                _upsert(_normalize(change))
+            else:
+                _remove((change.get('host'), change.get('type')))
+
+def retain_hosts(hosts):
+    # 分片模式下只保留本实例负责的节点，其他实例的故障由各自的视图提供
+    with _LOCK:
+        for key in [key for key in _ISSUES if key[0] not in hosts]:
+            _remove(key)
+
+def _select(index, values):
+    selected = set()
+    for value in values:
+        selected |= index.get(value, set())
+    return selected
+
+def query(hosts=None, types=None, priorities=None, statuses=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+    with _LOCK:
+        candidates = None
+        # 从最小的候选集合开始求交集
+        filters = []
+        if hosts:
+            filters.append(_select(_BY_HOST, hosts))
+        if types:
+            filters.append(_select(_BY_TYPE, types))
+        if priorities:
+            filters.append(_select(_BY_PRIORITY, [_priority_code(p) for p in priorities]))
+        for keys in sorted(filters, key=len):
+            candidates = keys if candidates is None else candidates & keys
+        if candidates is None:
+            candidates = _ISSUES.keys()
+        issues = [_ISSUES[key] for key in sorted(candidates)]
+    if statuses:
+        issues = [issue for issue in issues if issue['status'] in statuses]
+    return len(issues), [dict(issue) for issue in issues[offset:offset + limit]]
+
+def summary():
+    with _LOCK:
+        return {
+            'total': len(_ISSUES),
+            'hosts': len({host for host, _ in _ISSUES}),
+            'by_priority': {p: len(keys) for p, keys in sorted(_BY_PRIORITY.items())},
+            'by_type': {t: len(keys) for t, keys in sorted(_BY_TYPE.items())},
+        }
+
+def _list_param(params, name):
+    values = []
+    for raw in params.get(name, []):
+        values.extend(v.strip() for v in raw.split(',') if v.strip())
+    return values
+
+def _int_param(params, name, default):
+    try:
+        return int(params.get(name, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+def _json_response(payload, status=200):
+    return status, 'application/json; charset=utf-8', json.dumps(payload, ensure_ascii=False)
+
+@httpd.route('/api/issues')
+def _issues_endpoint(params):
+    # 过滤参数可重复或逗号分隔: host (host 或 hostname 均可), type, priority (P0-P3), status
+    offset = max(_int_param(params, 'offset', 0), 0)
+    limit = min(max(_int_param(params, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    total, items = query(hosts=_list_param(params, 'host'), types=_list_param(params, 'type'), priorities=_list_param(params, 'priority'),
+                         statuses=_list_param(params, 'status'), offset=offset, limit=limit)
+    return _json_response({'total': total, 'offset': offset, 'limit': limit, 'items': items})
+
+@httpd.route('/api/summary')
+def _summary_endpoint(params):
+    return _json_response(summary())
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import time
+import random
+import multiprocessing
+from contextlib import contextmanager
+import logbook
+from logbook.handlers import StreamHandler
+from logbook.queues import MultiProcessingHandler, MultiProcessingSubscriber
+
+from core import metrics
+
+# 非阻塞日志管道: 主进程与 worker 只把日志记录放入队列，由主进程中的单个写线程输出到控制台与按大小轮转的 JSON 行文件。
+# worker 内每个节点的例行 INFO 日志 (开始/发现/完成/重复告警等，以 extra={'routine': True} 标记) 按节点采样，
+# 未被采样的节点只计数，由主进程在每轮结束时输出一行汇总；WARNING 及以上总是保留。
+DEFAULT_LOGGING_CONFIG = {
+    'file': None,                   # JSON 行日志文件，留空则只输出到控制台
+    'max_bytes': 50 * 1024 * 1024,  # 单个日志文件大小上限，超过后轮转
+    'backup_count': 10,             # 保留的轮转文件数
+    'level': 'INFO',                # 进入队列与写入文件的最低级别
+    'console_level': 'INFO',
+    'routine_sample_rate': 1.0,     # 每轮输出例行日志的节点比例
+    'queue_size': 100000,           # 队列上限，写线程跟不上时丢弃新记录而不是阻塞巡检
+}
+
+CONSOLE_FORMAT = ('[{record.time:%Y-%m-%d %H:%M:%S.%f%z}] {record.level_name}: {record.channel}: '
+                  '[{record.process_name}] {record.message}')
+
+ROUTINE = {'routine': True}
+
+_STATE = {'queue': None, 'controller': None, 'handler': None, 'config': dict(DEFAULT_LOGGING_CONFIG), 'sampled': True, 'suppressed': 0}
+
+def _json_formatter(record, handler):
+    entry = {
+        'ts': record.time.isoformat(),
+        'level': record.level_name,
+        'channel': record.channel,
+        'process': record.process_name,
+        'message': record.message,
+    }
+    if record.extra:
+        entry.update(record.extra)
+    if record.formatted_exception:
+        entry['exception'] = record.formatted_exception
+    return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _QueueHandler(MultiProcessingHandler):
+    def emit(self, record):
+        try:
+            super().emit(record)
+        except queue.Full:
+            metrics.inc('inspector_log_records_dropped_total')
+
+class _WorkerQueueHandler(_QueueHandler):
+    # 未被采样节点的例行日志在此处理掉 (只计数)，不能用 filter: 被过滤的记录会继续交给下层处理器
+    def emit(self, record):
+        if record.extra.get('routine') and record.level < logbook.WARNING and not _STATE['sampled']:
+            _STATE['suppressed'] += 1
+            return
+        super().emit(record)
+
+def start(logging_config):
+    # 主进程在创建进程池之前调用一次；worker 通过 fork 继承队列
+    config = {**DEFAULT_LOGGING_CONFIG, **(logging_config or {})}
+    handlers = [logbook.NullHandler()]
+    if config['file']:
+        log_dir = os.path.dirname(config['file'])
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = logbook.RotatingFileHandler(config['file'], level=config['level'], max_size=int(config['max_bytes']),
+                                                   backup_count=int(config['backup_count']), bubble=True)
+        file_handler.formatter = _json_formatter
+        handlers.append(file_handler)
+    handlers.append(StreamHandler(sys.stdout, level=config['console_level'], format_string=CONSOLE_FORMAT, bubble=True))
+
+    log_queue = multiprocessing.Queue(int(config['queue_size']))
+    # NullHandler 位于写线程处理器栈底部，记录不会再回到队列处理器
+    _STATE['controller'] = MultiProcessingSubscriber(log_queue).dispatch_in_background(logbook.NestedSetup(handlers))
+    _STATE['queue'] = log_queue
+    _STATE['config'] = config
+    _STATE['handler'] = _QueueHandler(log_queue, level=config['level'])
+    _STATE['handler'].push_application()
+    # 进程退出 (包括启动阶段的 sys.exit) 前写完队列中的日志；fork 出的 worker 以 os._exit 退出，不会执行
+    atexit.register(stop)
+
+def stop():
+    controller = _STATE['controller']
+    if controller is None:
+        return
+    # 之后的日志回到继承的处理器；先停止写线程，再在当前线程写完队列中剩余的记录。
+    # Queue.empty() 只是近似值，按它等待会在记录仍在管道中时停止写线程，丢失最后的日志
+    _STATE['handler'].pop_application()
+    controller.stop()
+    deadline = time.monotonic() + 5
+    with controller.setup:
+        # 队列静默 0.1 秒视为写完 (本进程的记录由 feeder 线程异步写入管道)
+        while controller.subscriber.dispatch_once(timeout=0.1) and time.monotonic() < deadline:
+            pass
+    _STATE['controller'] = _STATE['queue'] = _STATE['handler'] = None
+
+def attach_worker():
+    # 在 worker 初始化时调用；返回 False 表示管道未启用 (如单节点 CLI)，由调用方自行配置日志
+    if _STATE['queue'] is None:
+        return False
+    _STATE['suppressed'] = 0
+    _WorkerQueueHandler(_STATE['queue'], level=_STATE['config']['level']).push_application()
+    return True
+
+@contextmanager
+def node_context(hostname):
+    # 每个节点每轮独立决定是否输出例行日志，所有记录附带 node 字段便于在 JSON 日志中过滤
+    rate = _STATE['config']['routine_sample_rate']
+    _STATE['sampled'] = rate >= 1 or random.random() < rate
+
+    def inject(record):
+        record.extra['node'] = hostname
+
+    with logbook.Processor(inject).applicationbound():
+        yield
+
+def drain_suppressed():
+    suppressed, _STATE['suppressed'] = _STATE['suppressed'], 0
+    return suppressed
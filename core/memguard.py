@@ -0,0 +1,187 @@
+import os
+import gc
+import time
+import tracemalloc
+import logbook
+
+from core import metrics, httpd
+
+LOG = logbook.Logger(__name__)
+
+# 常驻进程内存守护: 每轮巡检结束时采样主进程与 worker 的 RSS 并上报；可选 tracemalloc 在轮次之间比较快照，
+# 通过 /debug/memory 查看或写入 dump_dir。worker 超过 worker_rss_limit_mb 时，之后的进程池按越限时已处理的
+# 节点数回收 worker (maxtasksperchild)；主进程超过 parent_rss_limit_mb 时在两轮巡检之间重新执行自身，
+# 告警状态保存在状态库与 P3 摘要快照中，重启后继续。
+DEFAULT_MEMORY_GUARD_CONFIG = {
+    'worker_rss_limit_mb': 0,       # 0 表示不限制
+    'worker_max_tasks': 0,          # 每个 worker 最多处理的节点数，0 表示整轮巡检内不回收
+    'parent_rss_limit_mb': 0,       # 0 表示不限制
+    'tracemalloc_frames': 0,        # 大于 0 时启用 tracemalloc 并保留该数量的调用栈帧 (有额外 CPU 与内存开销)
+    'top': 15,                      # 快照比较输出的条目数
+    'dump_dir': 'data/memdumps',
+}
+
+MB = 1024 * 1024
+
+_STATE = {
+    'config': dict(DEFAULT_MEMORY_GUARD_CONFIG),
+    'recycle_tasks': None,          # worker 越限后采用的 maxtasksperchild
+    'restart_requested': False,
+    'tasks_done': 0,                # worker 内已处理的节点数
+    'snapshot': None,               # 上一轮按行汇总的 tracemalloc 内存占用
+    'growth': [],
+    'last': {},
+}
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def configure(guard_config):
+    config = {**DEFAULT_MEMORY_GUARD_CONFIG, **(guard_config or {})}
+    _STATE['config'] = config
+    frames = int(config['tracemalloc_frames'] or 0)
+    if frames > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        LOG.info(f"已启用 tracemalloc ({frames} 帧)，每轮巡检结束时比较内存快照。")
+    elif frames <= 0 and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _STATE['snapshot'] = None
+        LOG.info("已停止 tracemalloc。")
+
+def worker_sample():
+    # worker 每处理完一个节点调用一次，返回 (RSS, 本 worker 已处理的节点数)，随节点报告返回主进程
+    _STATE['tasks_done'] += 1
+    return rss_bytes(), _STATE['tasks_done']
+
+def init_worker():
+    # tracemalloc 只在主进程中比较快照；worker 继承的跟踪状态会拖慢每次内存分配，fork 后立即停止
+    _STATE['tasks_done'] = 0
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def max_tasks_per_child():
+    return _STATE['recycle_tasks'] or int(_STATE['config']['worker_max_tasks'] or 0) or None
+
+def before_fork():
+    # 创建进程池前冻结主进程现有对象: worker 中的 GC 不再遍历这些对象，继承的内存页保持共享，
+    # 主进程堆变大时 fork 与 worker 的 RSS 不随之增长
+    gc.collect()
+    gc.freeze()
+
+def after_pool():
+    gc.unfreeze()
+
+_IGNORED_FILES = (tracemalloc.__file__, '<frozen importlib._bootstrap>', '<unknown>')
+
+def _statistics():
+    # 按行汇总后再排除 tracemalloc 自身等位置；逐条 trace 的 filter_traces 在十万级 trace 时需要数秒
+    stats = tracemalloc.take_snapshot().statistics('lineno')
+    return [stat for stat in stats if stat.traceback[0].filename not in _IGNORED_FILES]
+
+def _line_sizes(stats):
+    return {str(stat.traceback[0]): (stat.size, stat.count) for stat in stats}
+
+def _growth(current, previous, top):
+    # 与上一轮的按行汇总比较，返回 (增长字节数, 描述) 中变化最大的 top 项
+    diffs = []
+    for line in current.keys() | previous.keys():
+        size, count = current.get(line, (0, 0))
+        old_size, old_count = previous.get(line, (0, 0))
+        if size != old_size:
+            diffs.append((size - old_size, f"{line}: size={size / 1024:.1f} KiB ({(size - old_size) / 1024:+.1f} KiB), "
+                                           f"count={count} ({count - old_count:+d})"))
+    diffs.sort(key=lambda d: abs(d[0]), reverse=True)
+    return diffs[:top]
+
+def observe_cycle(runner_type, worker_samples):
+    config = _STATE['config']
+    parent_rss = rss_bytes()
+    worker_peak = max((rss for rss, _ in worker_samples), default=0)
+    metrics.set_gauge('inspector_process_rss_bytes', parent_rss, process='parent')
+    if worker_samples:
+        metrics.set_gauge('inspector_process_rss_bytes', worker_peak, process='worker_max')
+    _STATE['last'] = {'runner': runner_type, 'time': time.time(), 'parent_rss': parent_rss, 'worker_rss_max': worker_peak,
+                      'gc_counts': gc.get_count()}
+
+    # 1. worker 越限: 以越限时已处理的节点数为上限回收 worker，只会收紧
+    worker_limit = float(config['worker_rss_limit_mb'] or 0) * MB
+    crossed = [tasks for rss, tasks in worker_samples if worker_limit and rss > worker_limit]
+    if crossed:
+        recycle_tasks = max(min(crossed) - 1, 1)
+        if _STATE['recycle_tasks'] is None or recycle_tasks < _STATE['recycle_tasks']:
+            _STATE['recycle_tasks'] = recycle_tasks
+            LOG.warning(f"worker RSS {worker_peak / MB:.0f} MB 超过上限 {worker_limit / MB:.0f} MB，"
+                        f"之后每个 worker 处理 {recycle_tasks} 个节点后回收。")
+        metrics.inc('inspector_worker_rss_limit_exceeded_total', len(crossed))
+    if _STATE['recycle_tasks']:
+        metrics.set_gauge('inspector_worker_max_tasks', _STATE['recycle_tasks'])
+
+    # 2. 主进程越限: 由主循环在两轮巡检之间重新执行
+    parent_limit = float(config['parent_rss_limit_mb'] or 0) * MB
+    if parent_limit and parent_rss > parent_limit and not _STATE['restart_requested']:
+        _STATE['restart_requested'] = True
+        LOG.warning(f"主进程 RSS {parent_rss / MB:.0f} MB 超过上限 {parent_limit / MB:.0f} MB，将在本轮结束后重启巡检引擎。")
+
+    # 3. tracemalloc: 与上一轮快照比较，记录增长最多的位置
+    if tracemalloc.is_tracing():
+        sizes = _line_sizes(_statistics())
+        if _STATE['snapshot'] is not None:
+            growth = _growth(sizes, _STATE['snapshot'], int(config['top']))
+            _STATE['growth'] = [line for _, line in growth]
+            total = sum(size_diff for size_diff, _ in growth)
+            LOG.info(f"tracemalloc: 相对上一轮增长最多的 {len(growth)} 处合计 {total / 1024:+.0f} KiB，"
+                     f"当前跟踪 {tracemalloc.get_traced_memory()[0] / MB:.1f} MB", extra={'memory_growth': _STATE['growth']})
+        _STATE['snapshot'] = sizes
+
+    LOG.info(f"内存: 主进程 RSS {parent_rss / MB:.0f} MB，worker 峰值 RSS {worker_peak / MB:.0f} MB")
+
+def restart_requested():
+    return _STATE['restart_requested']
+
+def dump(dump_dir=None):
+    # 写出当前 tracemalloc 快照 (可用 tracemalloc.Snapshot.load 离线比较)，未启用时返回 None
+    if not tracemalloc.is_tracing():
+        return None
+    dump_dir = dump_dir or _STATE['config']['dump_dir']
+    os.makedirs(dump_dir, exist_ok=True)
+    path = os.path.join(dump_dir, f"inspector-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.tracemalloc")
+    tracemalloc.take_snapshot().dump(path)
+    LOG.info(f"已写出 tracemalloc 快照: {path}")
+    return path
+
+def report():
+    last = _STATE['last']
+    lines = [
+        f"parent_rss_mb {rss_bytes() / MB:.1f}",
+        f"last_cycle {last.get('runner', '-')} parent_rss_mb {last.get('parent_rss', 0) / MB:.1f} "
+        f"worker_rss_max_mb {last.get('worker_rss_max', 0) / MB:.1f}",
+        f"worker_max_tasks {max_tasks_per_child() or 'unlimited'}",
+        f"restart_requested {_STATE['restart_requested']}",
+        f"gc_counts {gc.get_count()} gc_frozen {gc.get_freeze_count()}",
+    ]
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        top = int(_STATE['config']['top'])
+        lines.append(f"tracemalloc_current_mb {current / MB:.1f} peak_mb {peak / MB:.1f}")
+        lines.append(f"\n# 当前占用最多的 {top} 处")
+        lines.extend(str(stat) for stat in _statistics()[:top])
+        lines.append("\n# 相对上一轮增长最多的位置")
+        lines.extend(_STATE['growth'] or ["(尚无上一轮快照)"])
+    else:
+        lines.append("tracemalloc disabled (MEMORY_GUARD.tracemalloc_frames)")
+    return '\n'.join(lines) + '\n'
+
+@httpd.route('/debug/memory')
+def _memory_endpoint(query):
+    # ?dump=1 同时写出快照文件
+    text = report()
+    if query.get('dump', ['0'])[0] not in ('0', ''):
+        path = dump()
+        text += f"\ndump {path or '(tracemalloc disabled)'}\n"
+    return 200, 'text/plain; charset=utf-8', text
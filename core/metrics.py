@@ -0,0 +1,166 @@
+import os
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+
+from core import httpd
+
+# 进程内指标注册表。worker 在每个节点处理结束时 drain() 出增量，随节点报告返回主进程 merge()，
+# 主进程汇总后以 Prometheus 文本格式对外暴露。
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    'inspector_ssh_connect_seconds': "SSH 建连耗时 (含重试)",
+    'inspector_ssh_connect_failures_total': "SSH 建连失败次数",
+    'inspector_bastion_handshakes_total': "与跳板机建立连接 (完整 SSH 握手) 的次数",
+    'inspector_bastion_channel_wait_seconds': "等待跳板机通道配额的耗时",
+    'inspector_discover_seconds': "节点 Profile 探测耗时",
+    'inspector_check_command_seconds': "单个检查项远程命令耗时",
+    'inspector_check_parse_seconds': "单个检查项解析耗时",
+    'inspector_check_failures_total': "检查项返回失败结果的次数",
+    'inspector_fingerprint_hits_total': "输出与上一轮稳定状态相同、跳过解析与上报的检查项次数",
+    'inspector_fingerprint_misses_total': "输出指纹未命中、完整处理的检查项次数",
+    'inspector_counter_resets_total': "计数器比上一次采样小且判断为被清零的次数",
+    'inspector_counter_wraps_total': "计数器比上一次采样小且判断为回绕的次数",
+    'inspector_process_results_seconds': "单节点告警决策耗时",
+    'inspector_node_seconds': "单节点完整处理耗时",
+    'inspector_sqlite_seconds': "SQLite 操作耗时",
+    'inspector_sqlite_maintenance_seconds': "SQLite 状态库维护各步骤耗时",
+    'inspector_sqlite_db_bytes': "SQLite 状态库文件大小",
+    'inspector_sqlite_freelist_bytes': "SQLite 状态库空闲页大小",
+    'inspector_sqlite_rows': "SQLite 状态库各表行数",
+    'inspector_mysql_flush_seconds': "MySQL 批量写入耗时",
+    'inspector_webhook_seconds': "飞书 Webhook 调用耗时",
+    'inspector_webhook_failures_total': "飞书 Webhook 调用失败次数",
+    'inspector_fleet_analysis_seconds': "集群级离群分析耗时",
+    'inspector_cycle_seconds': "整轮巡检耗时",
+    'inspector_cycle_last_seconds': "最近一轮巡检耗时",
+    'inspector_cycle_lag_seconds': "定时任务实际启动时间相对计划时间的延迟",
+    'inspector_cycles_total': "已完成的巡检轮数",
+    'inspector_nodes_in_flight': "当前正在处理的节点数",
+    'inspector_nodes_processed_total': "已处理的节点数",
+    'inspector_process_rss_bytes': "主进程与 worker 峰值 RSS (每轮巡检结束时采样)",
+    'inspector_worker_rss_limit_exceeded_total': "worker RSS 超过上限的节点报告数",
+    'inspector_worker_max_tasks': "worker 越限后采用的每个 worker 最多处理节点数",
+    'inspector_pool_start_seconds': "创建进程池 (fork worker) 耗时",
+    'inspector_log_records_suppressed_total': "按节点采样省略的例行日志条数",
+    'inspector_log_records_dropped_total': "日志队列已满时丢弃的日志条数",
+}
+
+_LOCK = threading.Lock()
+_COUNTERS = {}
+_GAUGES = {}
+_HISTOGRAMS = {}
+
+def _reset_lock():
+    # 进程池回收 worker (maxtasksperchild) 时由池的后台线程 fork 新 worker，主线程可能正持有锁
+    global _LOCK
+    _LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with _LOCK:
+        _GAUGES[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _LOCK:
+        hist = _HISTOGRAMS.get(key)
+        if hist is None:
+            hist = _HISTOGRAMS[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect.bisect_left(DEFAULT_BUCKETS, value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def timed(name, **labels):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def counter_total(name):
+    # 同名计数器所有标签组合之和 (压测等场景读取)
+    with _LOCK:
+        return sum(value for (counter_name, _), value in _COUNTERS.items() if counter_name == name)
+
+def drain():
+    # 取出并清空计数器与直方图的增量，用于跨进程传递
+    global _COUNTERS, _HISTOGRAMS
+    with _LOCK:
+        snapshot = {'counters': _COUNTERS, 'histograms': _HISTOGRAMS}
+        _COUNTERS, _HISTOGRAMS = {}, {}
+    return snapshot
+
+def merge(snapshot):
+    if not snapshot:
+        return
+    with _LOCK:
+        for key, value in snapshot['counters'].items():
+            _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+        for key, (buckets, total, count) in snapshot['histograms'].items():
+            hist = _HISTOGRAMS.get(key)
+            if hist is None:
+                _HISTOGRAMS[key] = [list(buckets), total, count]
+                continue
+            hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+            hist[1] += total
+            hist[2] += count
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (extra or [])
+    if not items:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def render():
+    lines = []
+    with _LOCK:
+        series = {}
+        for kind, store in (('counter', _COUNTERS), ('gauge', _GAUGES), ('histogram', _HISTOGRAMS)):
+            for (name, labels), value in store.items():
+                series.setdefault((name, kind), []).append((labels, value))
+
+        for (name, kind), samples in sorted(series.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                buckets, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(DEFAULT_BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+@httpd.route('/metrics')
+def _metrics_endpoint(query):
+    return 200, 'text/plain; version=0.0.4; charset=utf-8', render()
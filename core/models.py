@@ -1,11 +1,115 @@
+from sys import intern as _intern
+from operator import attrgetter as _attrgetter
+
 KEY_HOST = 'host'
 KEY_HOSTNAME = 'hostname'
 KEY_TYPE = 'type'
 KEY_EXTRA = 'extra'
 KEY_SUCCESS = 'success'
 KEY_TYPES = 'types'
+KEY_METRICS = 'metrics'
+
+def intern_type(issue_type):
+    # 告警类型在每个节点、每轮都会重复出现；驻留后 worker 回传的结果在主进程中共享同一个字符串对象
+    return _intern(issue_type) if type(issue_type) is str else issue_type
+
+class _SlotRecord:
+    # 固定字段的轻量记录: 不为每个实例分配 __dict__，跨进程传输时按字段顺序序列化为元组 (不携带键名)。
+    # 保留 get / [] / in 的 dict 式访问，状态库行 (dict) 与记录对象可以走同一套处理逻辑
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELDS = frozenset(cls.__slots__)
+        cls._values = _attrgetter(*cls.__slots__)
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self._FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        # 与原来的 dict 一致: 字段存在但值为 None 时返回 None，只有不存在的字段名才抛出 KeyError
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def astuple(self):
+        return self._values(self)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __reduce__(self):
+        return (self.__class__, self._values(self))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.astuple() == other.astuple()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({', '.join(f'{k}={v!r}' for k, v in zip(self.__slots__, self.astuple()))})"
+
+class CheckResult(_SlotRecord):
+    # 检查项解析结果: 失败时 type/extra 描述故障，成功时 types 为本检查项负责 (需要清除) 的告警类型
+    __slots__ = (KEY_HOST, KEY_HOSTNAME, KEY_TYPE, KEY_EXTRA, KEY_SUCCESS, KEY_TYPES, KEY_METRICS)
+
+    def __init__(self, host=None, hostname=None, type=None, extra=None, success=False, types=None, metrics=None):
+        self.host = host
+        self.hostname = hostname
+        self.type = intern_type(type)
+        self.extra = extra
+        self.success = success
+        self.types = tuple(intern_type(t) for t in types) if types else None
+        self.metrics = metrics
+
+    @classmethod
+    def failure(cls, node_spec, issue_type, extra):
+        return cls(node_spec.get(KEY_HOST), node_spec.get(KEY_HOSTNAME), issue_type, extra, False)
+
+    @classmethod
+    def ok(cls, types):
+        return cls(success=True, types=types)
+
+class IssueEvent(_SlotRecord):
+    # 一次告警事件: 告警决策的输入，以及写入 MySQL events_alarms / gpu_monitoring_status 的行
+    __slots__ = (KEY_HOST, KEY_HOSTNAME, KEY_TYPE, 'priority', 'status', KEY_EXTRA, 'event_time')
+
+    def __init__(self, host=None, hostname=None, type=None, priority=None, status=None, extra=None, event_time=None):
+        self.host = host
+        self.hostname = hostname
+        self.type = intern_type(type)
+        self.priority = priority
+        self.status = status
+        self.extra = extra
+        self.event_time = event_time
+
+class IssueState(_SlotRecord):
+    # 故障状态变更: worker 随节点报告回传，用于维护主进程的内存故障视图
+    __slots__ = (KEY_HOST, KEY_HOSTNAME, KEY_TYPE, 'priority', 'status', KEY_EXTRA, 'update_at')
+
+    def __init__(self, host=None, hostname=None, type=None, priority=None, status=None, extra=None, update_at=None):
+        self.host = host
+        self.hostname = hostname
+        self.type = intern_type(type)
+        self.priority = priority
+        self.status = status
+        self.extra = extra
+        self.update_at = update_at
+
+def as_dict(record):
+    return record.to_dict() if isinstance(record, _SlotRecord) else record
 
 TABLE_NAME = 'gpu_monitoring_status'
+FINGERPRINT_TABLE = 'check_fingerprints'
 MAX_RETRIES = 3
 RETRY_INTERVAL = 5
 EVENTS_ALARMS = 'events_alarms'
@@ -22,7 +126,20 @@ CREATE TABLE IF NOT EXISTS `gpu_monitoring_status` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 """
 
-EVENTS_ALARMS_CREATE_SQL = ""
+EVENTS_ALARMS_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS `events_alarms` (
+  `id` BIGINT AUTO_INCREMENT PRIMARY KEY,
+  `host` VARCHAR(255) NOT NULL COMMENT '节点IP',
+  `hostname` VARCHAR(255) NOT NULL COMMENT '节点主机名',
+  `type` VARCHAR(255) NOT NULL COMMENT '告警类型, 例如: gpu.temperature',
+  `priority` VARCHAR(50) COMMENT '告警级别',
+  `status` VARCHAR(50) NOT NULL COMMENT '事件状态 (reported, flapping, resolved)',
+  `extra` TEXT COMMENT '告警或恢复的详细信息',
+  `event_time` DATETIME NOT NULL COMMENT '事件发生时间',
+  KEY `idx_hostname_time` (`hostname`, `event_time`),
+  KEY `idx_type_time` (`type`, `event_time`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
 
 TYPE_LINE_ERROR = 'gpu_error'
 TYPE_SMI_CMD = 'smi_cmd'
@@ -42,6 +159,8 @@ TYPE_IBDEV = "network.ib_device_status"
 TYPE_IBDEV_CNT = "network.ib_device_count"
 TYPE_IP_RULE = "network.ip_rule"
 TYPE_TRAFFIC = "network.traffic"
+TYPE_IB_LINK_ERROR = "network.ib_link_errors"
+TYPE_IB_PORT_ERROR = "network.ib_port_errors"
 
 # --- GPU ---
 TYPE_GPU_CNT = "gpu.count"
@@ -56,6 +175,7 @@ TYPE_GPU_THERMAL_SLOWDOWN = "gpu.thermal_slowdown"
 TYPE_XID_INFO = "gpu.xid_info"
 TYPE_XID_ERROR = "gpu.xid_error"
 TYPE_SMI_CMD_ERROR = "gpu.smi_cmd_error"
+TYPE_GPU_TEMP_OUTLIER = "gpu.temperature_outlier"
 
 # --- Storage ---
 TYPE_GPFS_STATUS = "storage.gpfs"
@@ -89,6 +209,7 @@ ALERT_METADATA = {
     TYPE_SHUTDOWN:  {'priority': P1, 'group': GROUP_HARDWARE, 'title': "节点实例失联 (无法Ping通)"},
     TYPE_HW_ERROR:  {'priority': P1, 'group': GROUP_HARDWARE, 'title': "节点发生硬件错误"},
     TYPE_NVLINK:        {'priority': P1, 'group': GROUP_HARDWARE, 'title': "节点NVLink链路状态异常"},
+    TYPE_IB_LINK_ERROR: {'priority': P1, 'group': GROUP_HARDWARE, 'title': "节点IB链路误码或闪断计数增长"},
     TYPE_MUXI_PCIE_STATUS:   {'priority': P1, 'group': GROUP_HARDWARE, 'title': "节点沐曦GPU的PCIE链路降级"}, 
 
     # P2
@@ -101,6 +222,7 @@ ALERT_METADATA = {
     TYPE_GDR:           {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点GPUDirect RDMA (GDR)异常"},
     TYPE_GPFS_STATUS:   {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点GPFS挂载状态异常"},
     TYPE_ROUTE:         {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点路由状态异常"},
+    TYPE_IB_PORT_ERROR: {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点IB端口收发错误计数增长"},
     TYPE_LINE_ERROR:    {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点检查命令返回行错误"},
     TYPE_UNK:           {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "发生未知检查错误"},
     TYPE_MUXI_SMI_CMD_ERROR: {'priority': P2, 'group': GROUP_SOFTWARE, 'title': "节点mxgpu-smi命令卡死或报错"},
@@ -115,4 +237,5 @@ ALERT_METADATA = {
     TYPE_XID_INFO:             {'priority': P3, 'group': GROUP_ANALYTICS, 'title': "节点出现非关键XID错误 (记录)"},
     TYPE_IP_RULE:              {'priority': P3, 'group': GROUP_ANALYTICS, 'title': "节点IP规则检查异常 (记录)"},
     TYPE_MUXI_THERMAL_STATUS:   {'priority': P3, 'group': GROUP_ANALYTICS, 'title': "节点沐曦GPU出现过热状态 (记录)"},
+    TYPE_GPU_TEMP_OUTLIER:      {'priority': P3, 'group': GROUP_ANALYTICS, 'title': "节点GPU温度偏离集群基线 (记录)"},
 }
\ No newline at end of file
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone, timedelta
+from urllib.parse import quote
+import logbook
+
+from core.models import ALERT_METADATA
+
+LOG = logbook.Logger(__name__)
+
+# P3 事件每日汇总的滚动摘要: worker 每次观测到 P3 故障时随节点报告上报一条精简记录，主进程按类型、节点累计次数、
+# 首次/最近出现时间与一条截断示例。每日汇总只从摘要渲染，按大小分页发送，完整信息通过状态接口或状态库查看。
+DEFAULT_P3_SUMMARY_CONFIG = {
+    'snapshot_path': 'data/p3_digest.json',   # 摘要快照，重启后继续累计
+    'max_message_bytes': 20000,               # 单条飞书消息内容的最大字节数，超出则分页
+    'hosts_per_type': 20,                     # 每种类型列出的节点数，其余只给出数量
+    'exemplar_chars': 160,                    # 示例 extra 截断长度
+}
+
+_LOCK = threading.Lock()
+_BY_TYPE = {}         # type -> {count, first_seen, last_seen, exemplar}
+_BY_HOST = {}         # (host, type) -> {host, hostname, type, count, first_seen, last_seen}
+_STATE = {'window_start': time.time(), 'snapshot_path': None, 'dirty': False}
+
+def get_config(app_config):
+    return {**DEFAULT_P3_SUMMARY_CONFIG, **(app_config.get('P3_SUMMARY') or {})}
+
+def make_observation(result, max_chars=DEFAULT_P3_SUMMARY_CONFIG['exemplar_chars']):
+    extra = str(result.get('extra', ''))
+    return {
+        'host': result.get('host'),
+        'hostname': result.get('hostname') or result.get('host'),
+        'type': result.get('type'),
+        'extra': extra if len(extra) <= max_chars else extra[:max_chars] + '...',
+        'ts': time.time(),
+    }
+
+def _add(obs):
+    ts = obs['ts']
+    entry = _BY_TYPE.get(obs['type'])
+    if entry is None:
+        entry = _BY_TYPE[obs['type']] = {'count': 0, 'first_seen': ts, 'last_seen': ts, 'exemplar': obs['extra']}
+    entry['count'] += 1
+    entry['last_seen'] = max(entry['last_seen'], ts)
+    entry['exemplar'] = obs['extra']
+
+    key = (obs['host'], obs['type'])
+    host_entry = _BY_HOST.get(key)
+    if host_entry is None:
+        host_entry = _BY_HOST[key] = {'host': obs['host'], 'hostname': obs['hostname'], 'type': obs['type'],
+                                      'count': 0, 'first_seen': ts, 'last_seen': ts}
+    host_entry['count'] += 1
+    host_entry['last_seen'] = max(host_entry['last_seen'], ts)
+
+def add(observations):
+    if not observations:
+        return
+    with _LOCK:
+        for obs in observations:
+            _add(obs)
+        _STATE['dirty'] = True
+
+def _clear():
+    _BY_TYPE.clear()
+    _BY_HOST.clear()
+    _STATE['window_start'] = time.time()
+    _STATE['dirty'] = True
+
+def reset():
+    with _LOCK:
+        _clear()
+
+def retain_hosts(hosts):
+    # 分片模式下每个实例只汇总自己负责的节点；类型计数按保留的节点重新累计
+    with _LOCK:
+        dropped = [key for key in _BY_HOST if key[0] not in hosts]
+        if not dropped:
+            return
+        for key in dropped:
+            del _BY_HOST[key]
+        for issue_type in list(_BY_TYPE):
+            remaining = [e for e in _BY_HOST.values() if e['type'] == issue_type]
+            if not remaining:
+                del _BY_TYPE[issue_type]
+                continue
+            _BY_TYPE[issue_type]['count'] = sum(e['count'] for e in remaining)
+            _BY_TYPE[issue_type]['first_seen'] = min(e['first_seen'] for e in remaining)
+            _BY_TYPE[issue_type]['last_seen'] = max(e['last_seen'] for e in remaining)
+        _STATE['dirty'] = True
+
+def load(app_config, active_p3_records=()):
+    # 启动时优先加载快照继续累计；没有快照 (首次启动) 时用状态库中的活动 P3 故障作为起点
+    snapshot_path = get_config(app_config)['snapshot_path']
+    with _LOCK:
+        _STATE['snapshot_path'] = snapshot_path
+        _clear()
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                _STATE['window_start'] = snapshot['window_start']
+                _BY_TYPE.update(snapshot['by_type'])
+                for entry in snapshot['by_host']:
+                    _BY_HOST[(entry['host'], entry['type'])] = entry
+                _STATE['dirty'] = False
+                LOG.info(f"已加载 P3 摘要快照: {len(_BY_TYPE)} 种类型, {len(_BY_HOST)} 个节点/类型组合。")
+                return
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                LOG.error(f"加载 P3 摘要快照失败，将重新累计: {e}")
+                _clear()
+        for record in active_p3_records:
+            _add(make_observation(record))
+    LOG.info(f"P3 摘要从状态库初始化: {len(_BY_TYPE)} 种类型, {len(_BY_HOST)} 个节点/类型组合。")
+
+def save():
+    snapshot_path = _STATE['snapshot_path']
+    if not snapshot_path or not _STATE['dirty']:
+        return
+    with _LOCK:
+        snapshot = {'window_start': _STATE['window_start'], 'by_type': _BY_TYPE, 'by_host': list(_BY_HOST.values())}
+        payload = json.dumps(snapshot, ensure_ascii=False)
+        _STATE['dirty'] = False
+    tmp_path = snapshot_path + '.tmp'
+    try:
+        snapshot_dir = os.path.dirname(snapshot_path)
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        _STATE['dirty'] = True
+        LOG.error(f"保存 P3 摘要快照失败: {snapshot_path}, 错误: {e}")
+
+def _fmt_time(ts):
+    return datetime.fromtimestamp(ts, timezone(timedelta(hours=8))).strftime('%m-%d %H:%M')
+
+def render_lines(status_api_base=None, hosts_per_type=DEFAULT_P3_SUMMARY_CONFIG['hosts_per_type']):
+    # 返回飞书 post 的行列表: 每种类型一个小节，节点按出现次数排序，超出部分只给出数量与详情链接
+    with _LOCK:
+        by_type = {t: dict(e) for t, e in _BY_TYPE.items()}
+        hosts_by_type = {}
+        for entry in _BY_HOST.values():
+            hosts_by_type.setdefault(entry['type'], []).append(dict(entry))
+        window_start = _STATE['window_start']
+    if not by_type:
+        return []
+
+    host_count = len({e['host'] for entries in hosts_by_type.values() for e in entries})
+    lines = [[{"tag": "text", "text": f"统计区间: {_fmt_time(window_start)} 至 {_fmt_time(time.time())}，"
+                                      f"共 {len(by_type)} 种 P3 事件，涉及 {host_count} 个节点。"}]]
+    for issue_type, entry in sorted(by_type.items(), key=lambda item: -item[1]['count']):
+        hosts = sorted(hosts_by_type.get(issue_type, []), key=lambda e: (-e['count'], e['hostname']))
+        title = ALERT_METADATA.get(issue_type, {}).get('title', issue_type)
+        lines.append([{"tag": "text", "text": f"【{title}】{issue_type}: {entry['count']} 次, {len(hosts)} 个节点, "
+                                              f"首次 {_fmt_time(entry['first_seen'])}, 最近 {_fmt_time(entry['last_seen'])}"}])
+        lines.append([{"tag": "text", "text": f"  示例: {entry['exemplar']}"}])
+        for host_entry in hosts[:hosts_per_type]:
+            lines.append([{"tag": "text", "text": f"  - {host_entry['hostname']}: {host_entry['count']} 次, "
+                                                  f"最近 {_fmt_time(host_entry['last_seen'])}"}])
+        remaining = len(hosts) - hosts_per_type
+        detail = []
+        if remaining > 0:
+            detail.append({"tag": "text", "text": f"  ... 其余 {remaining} 个节点"})
+        if status_api_base:
+            detail.append({"tag": "a", "text": "  查看当前详情", "href": f"{status_api_base.rstrip('/')}/api/issues?type={quote(issue_type)}"})
+        elif remaining > 0:
+            detail.append({"tag": "text", "text": f"，完整列表见状态库 type = '{issue_type}'"})
+        if detail:
+            lines.append(detail)
+    return lines
+
+def paginate(lines, max_bytes=DEFAULT_P3_SUMMARY_CONFIG['max_message_bytes']):
+    # 按序列化后的字节数切分，保证每条消息不超过飞书的大小限制
+    pages, current, size = [], [], 2
+    for line in lines:
+        line_size = len(json.dumps(line, ensure_ascii=False).encode('utf-8')) + 2
+        if current and size + line_size > max_bytes:
+            pages.append(current)
+            current, size = [], 2
+        current.append(line)
+        size += line_size
+    if current:
+        pages.append(current)
+    return pages
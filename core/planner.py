@@ -0,0 +1,278 @@
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import logbook
+
+from core import runners, discover, ssh_client
+from core.ssh_client import create_ssh_client
+
+LOG = logbook.Logger(__name__)
+
+# 容量规划: 按清单、Profile 与实测的每个检查项命令耗时，估算每种定时任务一轮巡检的耗时、满足间隔所需的
+# worker 数与分片实例数、每轮的 SSH 连接与并发会话峰值，不执行巡检、不写状态库。
+# 耗时来源: 命令录制语料 (SSH_RECORD_DIR，含每条命令的耗时) 与/或对少量节点的即时采样 (同时测得 SSH 连接与自动发现耗时)。
+# 估算模型: 每个节点耗时 = 连接 + 自动发现 + 计划中去重后每条命令的耗时；进程池按节点动态分配，
+# 一轮耗时 ≈ (节点数 - 1) × 平均节点耗时 / worker 数 + 慢节点耗时 (p90)。
+DEFAULT_HEADROOM = 0.8            # 一轮巡检最多占用间隔的比例，留出余量应对慢节点与抖动
+DEFAULT_CONNECT_SECONDS = 0.5     # 未采样时假设的 SSH 连接耗时
+DEFAULT_DISCOVER_SECONDS = 0.3    # 未采样时假设的自动发现耗时
+DEFAULT_COMMAND_SECONDS = 0.5     # 没有任何检查项耗时数据时假设的单条命令耗时
+DISCOVER_COMMANDS = 2             # 自动发现最多执行的命令数
+SAMPLE_CONCURRENCY = 8
+
+def runner_intervals(app_config):
+    # 与 schedule_jobs 一致: 只有 gpu 与 system 是周期任务，network 与 storage 只在启动时执行一次
+    return {
+        'gpu': float(app_config.get('GPU_CHECK_INTERVAL_SECONDS', 30)),
+        'system': float(app_config.get('SYSTEM_CHECK_INTERVAL_MINUTES', 10)) * 60,
+    }
+
+def new_observations():
+    return {'checks': {}, 'connect': [], 'discover': [], 'unreachable': [], 'profiles': Counter(), 'errors': [], 'sources': []}
+
+def _mean(values):
+    return sum(values) / len(values)
+
+def _p90(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(0.9 * len(ordered))) - 1)]
+
+def _plan_index(all_profiles, thresholds, runner_types):
+    # {检查项集合: profile}，用于从录制会话执行过的检查项推断节点的 Profile
+    index = {}
+    for runner_type in runner_types:
+        for profile_name, plan in runners.compile_plans(all_profiles, runner_type, thresholds).items():
+            if plan:
+                index.setdefault(frozenset(step.name for step in plan), profile_name)
+    return index
+
+def observe_corpus(observations, sessions, all_profiles, thresholds, runner_types):
+    # 每个会话是一个节点的一次巡检；同一会话中复用的命令 (录制耗时为 0) 只计第一次执行
+    index = _plan_index(all_profiles, thresholds, runner_types)
+    for records in sessions:
+        executed = set()
+        for record in records:
+            if record['command'] in executed:
+                continue
+            executed.add(record['command'])
+            observations['checks'].setdefault(record['check'], []).append(float(record['latency']))
+        profile_name = index.get(frozenset(record['check'] for record in records))
+        if profile_name:
+            observations['profiles'][profile_name] += 1
+    observations['sources'].append(f"录制语料 {len(sessions)} 个会话")
+    return observations
+
+def _sample_node(node_spec, all_profiles, thresholds, runner_types):
+    hostname = node_spec.get('hostname', node_spec['host'])
+    start = time.perf_counter()
+    client, ssh_error = create_ssh_client(host=node_spec['host'], port=node_spec.get('port', 22),
+                                          username=node_spec.get('username'), password=node_spec.get('password'),
+                                          timeout=node_spec.get('timeout', 10), bastion=node_spec.get('bastion'), retries=1)
+    connect = time.perf_counter() - start
+    if not client:
+        return {'host': node_spec['host'], 'error': ssh_error, 'connect': connect}
+    try:
+        start = time.perf_counter()
+        profile_name = discover.discover_node_profile(client, hostname)
+        sample = {'host': node_spec['host'], 'connect': connect, 'discover': time.perf_counter() - start,
+                  'profile': profile_name, 'checks': {}}
+        for runner_type in runner_types:
+            checks_to_run = all_profiles.get(profile_name, {}).get('checks', {}).get(runner_type, [])
+            plan = runners.get_plan(profile_name, runner_type, checks_to_run, thresholds)
+            sample['checks'].update(runners.time_plan(client, plan))
+        return sample
+    finally:
+        client.close()
+
+def observe_sample(observations, node_specs, all_profiles, thresholds, runner_types, count, seed=None):
+    # 随机抽取 count 个节点，连接、自动发现并执行各任务类型的检查命令 (不解析、不上报)，记录各阶段耗时
+    hosts = list(node_specs.hosts())
+    chosen = random.Random(seed).sample(hosts, min(count, len(hosts)))
+    specs = [node_specs.find(host) for host in chosen]
+    LOG.info(f"采样 {len(specs)} 个节点的连接、自动发现与检查命令耗时...")
+    with ThreadPoolExecutor(max_workers=min(SAMPLE_CONCURRENCY, len(specs)) or 1) as executor:
+        samples = list(executor.map(lambda spec: _sample_node(spec, all_profiles, thresholds, runner_types), specs))
+    for sample in samples:
+        if sample.get('error'):
+            observations['errors'].append(f"{sample['host']}: {sample['error']}")
+            observations['unreachable'].append(sample['connect'])
+            continue
+        observations['connect'].append(sample['connect'])
+        observations['discover'].append(sample['discover'])
+        observations['profiles'][sample['profile']] += 1
+        for check_name, seconds in sample['checks'].items():
+            observations['checks'].setdefault(check_name, []).append(seconds)
+    reachable = sum(1 for sample in samples if not sample.get('error'))
+    observations['sources'].append(f"采样 {reachable}/{len(samples)} 个节点")
+    return observations
+
+def _stage(values, default):
+    return (_mean(values), _p90(values)) if values else (default, default)
+
+def _node_cost(plan, check_stats, fallback):
+    # 返回 (平均耗时, p90 耗时, 命令数, 缺少耗时数据的检查项)；共用的命令只计一次，记在第一个检查项上
+    mean = p90 = 0.0
+    commands = 0
+    missing = []
+    executed = set()
+    for step in plan:
+        if step.command in executed:
+            continue
+        executed.add(step.command)
+        commands += 1
+        stats = check_stats.get(step.name)
+        if stats is None:
+            missing.append(step.name)
+            stats = fallback
+        mean += stats[0]
+        p90 += stats[1]
+    return mean, p90, commands, missing
+
+def _bastion_counts(node_specs):
+    if not node_specs.field_values('bastion'):
+        return {}
+    return dict(Counter(spec['bastion'] for spec in node_specs if spec.get('bastion')))
+
+def plan_capacity(node_specs, all_profiles, thresholds, app_config, observations, runner_types=None,
+                  max_workers=None, shards=None, headroom=DEFAULT_HEADROOM, extra_nodes=0):
+    intervals = runner_intervals(app_config)
+    runner_types = [r for r in (runner_types or intervals) if r in intervals]
+    max_workers = int(max_workers or app_config.get('MAX_WORKERS', 5))
+    shards = int(shards or len((app_config.get('SHARDING') or {}).get('instances') or []) or 1)
+    total_nodes = len(node_specs) + int(extra_nodes)
+    nodes = math.ceil(total_nodes / shards)
+    warnings = []
+
+    # 1. 各阶段耗时统计
+    check_stats = {name: (_mean(values), _p90(values)) for name, values in observations['checks'].items() if values}
+    connect = _stage(observations['connect'], DEFAULT_CONNECT_SECONDS)
+    discover_cost = _stage(observations['discover'], DEFAULT_DISCOVER_SECONDS)
+    if check_stats:
+        means = sorted(stats[0] for stats in check_stats.values())
+        p90s = sorted(stats[1] for stats in check_stats.values())
+        fallback = (means[len(means) // 2], p90s[len(p90s) // 2])
+    else:
+        fallback = (DEFAULT_COMMAND_SECONDS, DEFAULT_COMMAND_SECONDS)
+        warnings.append(f"没有任何检查项耗时数据，按每条命令 {DEFAULT_COMMAND_SECONDS}s 估算，请提供录制语料或采样节点。")
+    if not observations['connect']:
+        warnings.append(f"未采样节点，SSH 连接与自动发现耗时按 {DEFAULT_CONNECT_SECONDS}s / {DEFAULT_DISCOVER_SECONDS}s 估算。")
+
+    # 2. Profile 分布: 按观测到的节点比例；没有观测时按耗时最长的 Profile 保守估算
+    profile_mix = {name: count for name, count in observations['profiles'].items() if name in all_profiles}
+    total_observed = sum(profile_mix.values())
+    sampled = len(observations['connect']) + len(observations['unreachable'])
+    unreachable_ratio = len(observations['unreachable']) / sampled if sampled else 0.0
+    unreachable = _stage(observations['unreachable'], 0.0)
+
+    bastion_nodes = _bastion_counts(node_specs)
+    report = {'nodes': total_nodes, 'nodes_per_instance': nodes, 'shards': shards, 'max_workers': max_workers,
+              'headroom': headroom, 'sources': observations['sources'], 'profile_mix': profile_mix,
+              'connect_seconds': round(connect[0], 3), 'discover_seconds': round(discover_cost[0], 3),
+              'unreachable_ratio': round(unreachable_ratio, 3), 'sample_errors': observations['errors'],
+              'runners': {}, 'bastions': {}, 'warnings': warnings}
+
+    for runner_type in runner_types:
+        interval = intervals[runner_type]
+        costs = {}
+        missing = set()
+        for profile_name, plan in runners.compile_plans(all_profiles, runner_type, thresholds).items():
+            mean, p90, commands, profile_missing = _node_cost(plan, check_stats, fallback)
+            costs[profile_name] = (connect[0] + discover_cost[0] + mean, connect[1] + discover_cost[1] + p90, commands)
+            if not total_observed or profile_name in profile_mix:
+                missing.update(profile_missing)
+        if not costs:
+            continue
+        if total_observed:
+            weights = {name: count / total_observed for name, count in profile_mix.items()}
+        else:
+            worst = max(costs, key=lambda name: costs[name][0])
+            weights = {worst: 1.0}
+        node_mean = sum(costs[name][0] * weight for name, weight in weights.items())
+        if unreachable_ratio:
+            # 连不上的节点只花费连接 (超时) 时间
+            node_mean = node_mean * (1 - unreachable_ratio) + unreachable[0] * unreachable_ratio
+        node_p90 = max(costs[name][1] for name in weights)
+        commands = sum(costs[name][2] * weight for name, weight in weights.items())
+
+        # 3. 一轮耗时、满足间隔所需的 worker 数与分片数
+        cycle = (nodes - 1) * node_mean / max_workers + node_p90 if nodes else 0.0
+        budget = interval * headroom - node_p90
+        if budget > 0:
+            required_workers = max(1, math.ceil((nodes - 1) * node_mean / budget))
+            fleet_workers = max(1, math.ceil((total_nodes - 1) * node_mean / budget))
+            required_shards = math.ceil(fleet_workers / max_workers)
+        else:
+            required_workers = fleet_workers = required_shards = None
+        peak_sessions = min(max_workers, nodes)
+        entry = {
+            'interval_seconds': interval,
+            'node_seconds_mean': round(node_mean, 3),
+            'node_seconds_p90': round(node_p90, 3),
+            'predicted_cycle_seconds': round(cycle, 1),
+            'utilization': round(cycle / interval, 3),
+            'required_workers': required_workers,
+            'required_shards': required_shards,
+            'peak_ssh_sessions': peak_sessions,
+            'peak_ssh_sessions_fleet': peak_sessions * shards,
+            'ssh_connections_per_cycle': nodes,
+            'exec_channels_per_cycle': math.ceil(nodes * (commands + DISCOVER_COMMANDS)),
+            'checks_without_latency': sorted(missing),
+        }
+        report['runners'][runner_type] = entry
+
+        # 4. 告警
+        if required_workers is None:
+            warnings.append(f"[{runner_type}] 单节点巡检耗时 p90 {node_p90:.1f}s 已超过间隔 {interval:.0f}s 的 {headroom:.0%}，"
+                            f"增加 worker 或分片都无法满足，需要加大间隔或精简检查项。")
+        elif cycle > interval * headroom:
+            warnings.append(f"[{runner_type}] 预计一轮耗时 {cycle:.1f}s，超过间隔 {interval:.0f}s 的 {headroom:.0%}: "
+                            f"每个实例需要 {required_workers} 个 worker (当前 MAX_WORKERS={max_workers})，"
+                            f"或按当前 MAX_WORKERS 需要 {required_shards} 个分片实例 (当前 {shards})。")
+        if missing and check_stats:
+            warnings.append(f"[{runner_type}] 以下检查项没有耗时数据，按中位数估算: {', '.join(sorted(missing))}")
+
+    # 5. 各定时任务在同一调度线程中串行执行，合计占用超过余量时后续任务会持续延迟
+    utilization = sum(entry['predicted_cycle_seconds'] / entry['interval_seconds'] for entry in report['runners'].values())
+    report['total_utilization'] = round(utilization, 3)
+    if len(report['runners']) > 1 and utilization > headroom:
+        warnings.append(f"各定时任务在同一调度线程中串行执行，合计占用 {utilization:.0%} 的时间 (余量上限 {headroom:.0%})，"
+                        f"巡检会持续滞后 (inspector_cycle_lag_seconds)。")
+
+    # 6. 跳板机: 同时经跳板机连接的节点数受 max_channels 限制
+    for name, count in sorted(bastion_nodes.items()):
+        bastion_config = {**ssh_client.DEFAULT_BASTION_CONFIG, **((app_config.get('BASTIONS') or {}).get(name) or {})}
+        max_channels = int(bastion_config['max_channels'])
+        peak = min(max_workers, math.ceil(count / shards))
+        report['bastions'][name] = {'nodes': count, 'max_channels': max_channels, 'peak_channels': min(peak, max_channels),
+                                    'peak_channels_fleet': min(peak, max_channels) * shards}
+        if peak > max_channels:
+            warnings.append(f"跳板机 {name} 的 max_channels={max_channels} 小于可能的并发 {peak}，"
+                            f"经该跳板机的节点实际并发受限，巡检耗时会高于预测。")
+    return report
+
+def format_report(report):
+    lines = [f"节点 {report['nodes']} 个，分片实例 {report['shards']} 个 (每实例约 {report['nodes_per_instance']} 个)，"
+             f"MAX_WORKERS={report['max_workers']}，余量 {report['headroom']:.0%}",
+             f"耗时来源: {', '.join(report['sources']) or '无 (使用默认值)'}；"
+             f"连接 {report['connect_seconds']}s，自动发现 {report['discover_seconds']}s，"
+             f"采样中无法连接 {report['unreachable_ratio']:.0%}"]
+    if report['profile_mix']:
+        lines.append("Profile 分布: " + ', '.join(f"{name}={count}" for name, count in sorted(report['profile_mix'].items())))
+    lines.append("")
+    lines.append(f"{'runner':<8}{'interval_s':>11}{'node_mean_s':>12}{'node_p90_s':>11}{'cycle_s':>9}{'util':>7}"
+                 f"{'workers_req':>12}{'shards_req':>11}{'ssh_peak':>9}{'conns':>7}{'channels':>9}")
+    for runner_type, entry in report['runners'].items():
+        lines.append(f"{runner_type:<8}{entry['interval_seconds']:>11.0f}{entry['node_seconds_mean']:>12.2f}"
+                     f"{entry['node_seconds_p90']:>11.2f}{entry['predicted_cycle_seconds']:>9.1f}{entry['utilization']:>7.0%}"
+                     f"{entry['required_workers'] or '-':>12}{entry['required_shards'] or '-':>11}"
+                     f"{entry['peak_ssh_sessions']:>9}{entry['ssh_connections_per_cycle']:>7}{entry['exec_channels_per_cycle']:>9}")
+    lines.append(f"定时任务合计占用: {report['total_utilization']:.0%}")
+    for name, entry in report['bastions'].items():
+        lines.append(f"跳板机 {name}: 节点 {entry['nodes']}，max_channels {entry['max_channels']}，"
+                     f"每实例并发通道峰值 {entry['peak_channels']}")
+    if report['warnings']:
+        lines.append("")
+        lines.extend(f"[WARN] {warning}" for warning in report['warnings'])
+    return '\n'.join(lines)
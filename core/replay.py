@@ -0,0 +1,86 @@
+import os
+import glob
+import gzip
+import json
+import time
+import logbook
+
+from core import runners, reporter
+
+LOG = logbook.Logger(__name__)
+
+class ReplayClient:
+    # 代替 paramiko.SSHClient 传给 run_plan，按命令返回录制的原始结果
+    def __init__(self, records):
+        self._results = {}
+        for record in records:
+            self._results.setdefault(record['command'], []).append(record)
+
+    def replay_command(self, command):
+        samples = self._results.get(command)
+        if not samples:
+            raise RuntimeError(f"命令未在录制语料中找到: {command[:80]}")
+        record = samples.pop(0) if len(samples) > 1 else samples[0]
+        if record['exit_code'] is None:
+            raise RuntimeError(record['stderr'])
+        return record['exit_code'], record['stdout'], record['stderr']
+
+def load_corpus(record_dir):
+    sessions = {}
+    for path in sorted(glob.glob(os.path.join(record_dir, "ssh-*.jsonl.gz"))):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                sessions.setdefault(record['session'], []).append(record)
+    ordered = sorted(sessions.values(), key=lambda records: records[0].get('ts', 0))
+    LOG.info(f"从 {record_dir} 加载了 {len(ordered)} 个节点会话, {sum(len(r) for r in ordered)} 条命令记录。")
+    return ordered
+
+def load_thresholds(record_dir):
+    # {阈值摘要: 录制时的阈值}，由 runners 在录制时写入
+    recorded = {}
+    for path in glob.glob(os.path.join(record_dir, "thresholds-*.json")):
+        digest = os.path.basename(path)[len("thresholds-"):-len(".json")]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                recorded[digest] = json.load(f)
+        except (OSError, ValueError) as e:
+            LOG.error(f"读取录制阈值文件失败: {path}, 错误: {e}")
+    return recorded
+
+def replay_sessions(sessions, thresholds, app_config, sqlite_conn, with_report=True, recorded_thresholds=None):
+    # 以 CPU 全速离线执行解析与告警决策，返回耗时统计。会话优先使用录制时的阈值 (recorded_thresholds)；
+    # 没有录制阈值的旧语料使用 thresholds，计划中的命令与录制不一致的会话跳过并计入 mismatched
+    stats = {'sessions': 0, 'checks': 0, 'parse_seconds': 0.0, 'report_seconds': 0.0, 'mismatched': 0}
+    recorded_thresholds = recorded_thresholds or {}
+    mismatched_checks = set()
+    for records in sessions:
+        node_spec = {'host': records[0]['host'], 'hostname': records[0].get('hostname') or records[0]['host']}
+        checks_to_run = [r['check'] for r in records]
+        session_thresholds = recorded_thresholds.get(records[0].get('thresholds'), thresholds)
+
+        start = time.perf_counter()
+        plan = runners.get_plan('replay', None, checks_to_run, session_thresholds)
+        recorded_commands = {r['command'] for r in records}
+        missing = [step.name for step in plan if step.command not in recorded_commands]
+        if missing:
+            stats['mismatched'] += 1
+            mismatched_checks.update(missing)
+            continue
+        check_results = runners.run_plan(ReplayClient(records), node_spec, session_thresholds, plan)
+        stats['parse_seconds'] += time.perf_counter() - start
+
+        if with_report and check_results:
+            start = time.perf_counter()
+            db_connections = {'sqlite': sqlite_conn, 'outbox': reporter.new_outbox()}
+            reporter.process_results(node_spec, check_results, db_connections, app_config)
+            stats['report_seconds'] += time.perf_counter() - start
+
+        stats['sessions'] += 1
+        stats['checks'] += len(check_results)
+    if mismatched_checks:
+        LOG.warning(f"{stats['mismatched']} 个会话的命令与按当前阈值编译的计划不一致 (语料录制于阈值修改之前且未保存录制时的阈值)，"
+                    f"已跳过，涉及检查项: {', '.join(sorted(mismatched_checks))}")
+    return stats
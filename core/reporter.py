@@ -1,16 +1,94 @@
+import os
 import json
 import time
-import requests
+import multiprocessing
 import logbook
 from datetime import datetime, timezone, timedelta
-from . import database 
+from . import database, transitions, metrics, p3_digest, logpipe
 from .models import *
 
 LOG = logbook.Logger(__name__)
 HIGH_FREQ_DEBOUNCE_CACHE = {} 
 DEBOUNCE_WINDOW_SECONDS = 60 
 
-def _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=False):
+# 飞书自定义机器人限频: 每个 Webhook 100 次/分钟, 5 次/秒
+FEISHU_RATE_PER_MINUTE = 100
+FEISHU_BURST = 5
+
+_SESSIONS = {}
+_RATE_LIMITERS = {}
+_ENDPOINT_NAMES = {}
+
+class _TokenBucket:
+    # 令牌桶状态放在共享内存中，fork 出的 worker 进程共用同一个桶，限频对整个巡检程序生效
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self._state = multiprocessing.Array('d', [self.capacity, time.time()], lock=False)
+        self._lock = multiprocessing.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                if tokens >= 1:
+                    self._state[0], self._state[1] = tokens - 1, now
+                    return
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+def configure_webhooks(app_config):
+    # 必须在创建进程池之前于主进程调用，worker 通过 fork 继承限频器 (以及已导入的 requests)
+    _load_requests()
+    limits = app_config.get('FEISHU_RATE_LIMIT') or {}
+    per_minute = limits.get('per_minute', FEISHU_RATE_PER_MINUTE)
+    burst = limits.get('burst', FEISHU_BURST)
+    _RATE_LIMITERS.clear()
+    _ENDPOINT_NAMES.clear()
+    for name, url in (app_config.get('FEISHU_WEBHOOKS') or {}).items():
+        if url and url not in _RATE_LIMITERS:
+            _RATE_LIMITERS[url] = _TokenBucket(per_minute, burst)
+            _ENDPOINT_NAMES[url] = name
+
+# requests 在首次发送 Webhook 时导入，不发送通知的单节点 CLI 无需加载
+requests = None
+
+def _load_requests():
+    global requests
+    if requests is None:
+        import requests
+        import requests.adapters
+    return requests
+
+def _get_session(url):
+    # 按进程、按 Webhook 复用 keep-alive 连接；fork 后子进程不能复用父进程的 socket
+    key = (os.getpid(), url)
+    session = _SESSIONS.get(key)
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _SESSIONS[key] = session
+    return session
+
+def _post_webhook(url, payload, timeout=10):
+    _load_requests()
+    limiter = _RATE_LIMITERS.get(url)
+    if limiter:
+        limiter.acquire()
+    endpoint = _ENDPOINT_NAMES.get(url, 'unknown')
+    try:
+        with metrics.timer('inspector_webhook_seconds', endpoint=endpoint):
+            response = _get_session(url).post(url, json=payload, timeout=timeout)
+    except requests.RequestException:
+        metrics.inc('inspector_webhook_failures_total', endpoint=endpoint)
+        raise
+    if response.status_code >= 400:
+        metrics.inc('inspector_webhook_failures_total', endpoint=endpoint)
+    return response
+
+def _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=False, is_flapping=False):
     issue_type = result.get(KEY_TYPE)
     metadata = ALERT_METADATA.get(issue_type, {})
 
@@ -21,7 +99,7 @@ def _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=False
         return
 
     if not is_recovery and priority == P3:
-        LOG.info(f"检测到P3级别事件: [{issue_type}] on [{result.get(KEY_HOSTNAME)}]。仅记录，等待每日汇总。")
+        LOG.info(f"检测到P3级别事件: [{issue_type}] on [{result.get(KEY_HOSTNAME)}]。仅记录，等待每日汇总。", extra=logpipe.ROUTINE)
         return
     
     webhook_urls = app_config.get('FEISHU_WEBHOOKS', {})
@@ -43,6 +121,16 @@ def _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=False
             [{"tag": "text", "text": f"已恢复故障类型: {issue_type}"}],
             [{"tag": "text", "text": f"恢复时间: {datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')}"}]
         ]
+    elif is_flapping:
+        title = f"【状态抖动】{metadata.get('title', issue_type)} - {node}"
+        content = [
+            [{"tag": "text", "text": f"节点: {node}"}],
+            [{"tag": "text", "text": f"IP: {ip}"}],
+            [{"tag": "text", "text": f"优先级: {priority}"}],
+            [{"tag": "text", "text": f"类型: {issue_type} (状态抖动)"}],
+            [{"tag": "text", "text": f"说明: 该检查项在短时间内反复失败/恢复，抖动期间不再逐次发送告警与恢复通知。"}],
+            [{"tag": "text", "text": f"最近描述: {str(result.get(KEY_EXTRA, 'N/A'))}"}],
+        ]
     elif is_duplicate:
         title = f"【重复告警】{metadata.get('title', issue_type)} - {node}"
         content = [
@@ -70,20 +158,21 @@ def _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=False
     data = {"msg_type": "post", "content": {"post": {"zh_cn": {"title": title, "content": content}}}}
 
     try:
-        response = requests.post(target_url, json=data, timeout=10)
+        response = _post_webhook(target_url, data, timeout=10)
         response.raise_for_status()
-        LOG.info(f"成功发送通知到群组 '{target_group}': {title}")
+        LOG.info(f"成功发送通知到群组 '{target_group}': {title}", extra=logpipe.ROUTINE if is_duplicate else None)
     except requests.RequestException as e:
         LOG.error(f"发送飞书通知失败: {e}")
 
-def _send_to_feishu_table(app_config, alarm_data):
-    webhook_urls = app_config.get('FEISHU_WEBHOOKS', {})
-    table_webhook_url = webhook_urls.get('table_sync_webhook')
-    if not table_webhook_url:
-        LOG.debug("飞书表格同步Webhook (table_sync_webhook) 未配置，跳过写入。")
-        return
+def new_outbox():
+    # worker 内的待发送缓冲区: MySQL 事件、飞书表格行、故障状态变更与 P3 观测随节点报告返回主进程，
+    # 由主进程批量提交并维护内存故障视图与 P3 摘要
+    return {'events': [], 'table_rows': [], 'issues': [], 'digest': []}
 
-    payload = {
+def _queue_table_row(outbox, alarm_data):
+    if outbox is None:
+        return
+    outbox['table_rows'].append({
         'host': alarm_data.get(KEY_HOST),
         'hostname': alarm_data.get(KEY_HOSTNAME),
         'priority': alarm_data.get('priority', 'N/A'),
@@ -91,74 +180,167 @@ def _send_to_feishu_table(app_config, alarm_data):
         'extra': str(alarm_data.get(KEY_EXTRA)),
         'success': "False",
         'time': datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')
-    }
-    
-    try:
-        resp = requests.post(table_webhook_url, json=payload, timeout=15)
-        if resp.status_code == 200:
-            resp_json = resp.json()
-            if resp_json.get("code") == 0:
-                LOG.info(f"告警已同步到飞书表格: {payload['hostname']} - {payload['type']}")
+    })
+
+def _emit_event(outbox, record, status):
+    if outbox is not None:
+        outbox['events'].append(database.make_mysql_event(record, status))
+
+def _track_issue(outbox, record):
+    if outbox is not None:
+        outbox['issues'].append(IssueState(
+            record.get('host'), record.get('hostname'), record.get('type'), record.get('priority'),
+            record.get('status'), record.get('extra'), datetime.now(timezone(timedelta(hours=8))).isoformat()))
+
+def _save_issue(sqlite_conn, outbox, record):
+    database.upsert_sqlite_record(sqlite_conn, record)
+    _track_issue(outbox, record)
+
+def _update_tracking(sqlite_conn, outbox, old_record, tracking):
+    database.update_issue_tracking(sqlite_conn, old_record['host'], old_record['type'], **tracking)
+    _track_issue(outbox, {**old_record, **tracking})
+
+# 飞书多维表格同步: 按条数或等待时间批量提交
+class TableSyncBatcher:
+    def __init__(self, app_config):
+        self.url = (app_config.get('FEISHU_WEBHOOKS') or {}).get('table_sync_webhook')
+        self.batch_size = max(int(app_config.get('TABLE_SYNC_BATCH_SIZE', 1)), 1)
+        self.flush_interval = app_config.get('TABLE_SYNC_FLUSH_SECONDS', 10)
+        self._rows = []
+        self._oldest = None
+
+    def extend(self, rows):
+        if not rows:
+            return
+        if not self.url:
+            LOG.debug("飞书表格同步Webhook (table_sync_webhook) 未配置，跳过写入。")
+            return
+        if not self._rows:
+            self._oldest = time.time()
+        self._rows.extend(rows)
+        while len(self._rows) >= self.batch_size:
+            self._submit(self._rows[:self.batch_size])
+            self._rows = self._rows[self.batch_size:]
+        if not self._rows:
+            self._oldest = None
+
+    def flush_if_due(self):
+        if self._rows and time.time() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        rows, self._rows, self._oldest = self._rows, [], None
+        for i in range(0, len(rows), self.batch_size):
+            self._submit(rows[i:i + self.batch_size])
+
+    def _submit(self, rows):
+        # 批量大小为 1 时保持原有的单行格式，否则以 records 数组提交
+        payload = rows[0] if self.batch_size == 1 else {'records': rows}
+        try:
+            resp = _post_webhook(self.url, payload, timeout=15)
+            if resp.status_code == 200:
+                resp_json = resp.json()
+                if resp_json.get("code") == 0:
+                    LOG.info(f"告警已同步到飞书表格: {len(rows)} 条")
+                else:
+                    LOG.warning(f"同步飞书表格失败，飞书返回错误: {resp.text}")
             else:
-                LOG.warning(f"同步飞书表格失败，飞书返回错误: {resp.text}")
-        else:
-            LOG.warning(f"同步飞书表格HTTP响应异常: {resp.status_code} {resp.text}")
-    except Exception as e:
-        LOG.error(f"同步飞书表格到 {table_webhook_url} 异常: {e}")
-
-def handle_failed_issue(sqlite_conn, mysql_conn, app_config, result):
-    host = result.get(KEY_HOST)
-    issue_type = result.get(KEY_TYPE)
-    current_extra = str(result.get(KEY_EXTRA))
+                LOG.warning(f"同步飞书表格HTTP响应异常: {resp.status_code} {resp.text}")
+        except Exception as e:
+            LOG.error(f"同步飞书表格到 {self.url} 异常: {e}")
+
+def handle_failed_issue(sqlite_conn, outbox, app_config, result):
+    host = result.host
+    issue_type = result.type
+    current_extra = str(result.extra)
 
     metadata = ALERT_METADATA.get(issue_type, {})
     priority_code = metadata.get('priority', 'P3')
     priority_display = metadata.get('display', priority_code)
-    result['priority'] = priority_display
+    result.priority = priority_display
+    if priority_code == P3 and outbox is not None:
+        exemplar_chars = p3_digest.get_config(app_config)['exemplar_chars']
+        outbox['digest'].append(p3_digest.make_observation(result, exemplar_chars))
 
     old_record = database.query_sqlite_record(sqlite_conn, host, issue_type)
+    policy = transitions.get_policy(app_config, issue_type)
+    action, tracking = transitions.evaluate(old_record, True, policy, time.time())
 
-    if old_record and old_record.get('status') == 'reported' and old_record.get('extra') == current_extra:
-        LOG.info(f"检测到持续存在的相同故障: {host} - {issue_type}。将发送标记通知，不写入表格。")
-        _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=True)
-        return
-    
-    LOG.info(f"检测到新/复发/变化的故障，执行完整告警流程: {host} - {issue_type}")
-    _send_feishu_alert(app_config, result, is_recovery=False)
-    _send_to_feishu_table(app_config, result)
-    database.write_to_mysql(mysql_conn, result)
     record_to_save = {
         'host': host,
-        'hostname': result.get(KEY_HOSTNAME),
+        'hostname': result.hostname,
         'priority': priority_display,
         'type': issue_type,
         'extra': current_extra,
-        'status': 'reported'
+        **tracking
     }
-    database.upsert_sqlite_record(sqlite_conn, record_to_save)
 
+    if action == transitions.ACTION_PENDING:
+        LOG.info(f"检测到故障但尚未达到确认次数: {host} - {issue_type} (最近观测: {tracking['history']})。", extra=logpipe.ROUTINE)
+        _save_issue(sqlite_conn, outbox, record_to_save)
+        return
 
-def handle_resolved_issue(sqlite_conn, mysql_conn, app_config, host, issue_type):
-    old_record = database.query_sqlite_record(sqlite_conn, host, issue_type)
+    if action == transitions.ACTION_SUPPRESS:
+        LOG.debug(f"故障处于抖动状态，抑制通知: {host} - {issue_type}")
+        if transitions.is_changed(old_record, tracking):
+            _update_tracking(sqlite_conn, outbox, old_record, tracking)
+        return
+
+    if action == transitions.ACTION_FLAPPING:
+        LOG.warning(f"检测到故障状态抖动: {host} - {issue_type}。仅通知一次，抖动期间抑制后续告警。")
+        _send_feishu_alert(app_config, result, is_flapping=True)
+        _queue_table_row(outbox, result)
+        _emit_event(outbox, result, transitions.STATUS_FLAPPING)
+        _save_issue(sqlite_conn, outbox, record_to_save)
+        return
+
+    if action == transitions.ACTION_DUPLICATE and old_record.get('extra') == current_extra:
+        LOG.info(f"检测到持续存在的相同故障: {host} - {issue_type}。将发送标记通知，不写入表格。", extra=logpipe.ROUTINE)
+        _send_feishu_alert(app_config, result, is_recovery=False, is_duplicate=True)
+        if transitions.is_changed(old_record, tracking):
+            _update_tracking(sqlite_conn, outbox, old_record, tracking)
+        return
     
-    if old_record and old_record.get('status') == 'reported':
+    LOG.info(f"检测到新/复发/变化的故障，执行完整告警流程: {host} - {issue_type}")
+    _send_feishu_alert(app_config, result, is_recovery=False)
+    _queue_table_row(outbox, result)
+    _emit_event(outbox, result, transitions.STATUS_REPORTED)
+    _save_issue(sqlite_conn, outbox, record_to_save)
+
+
+def handle_resolved_issue(sqlite_conn, outbox, app_config, host, issue_type):
+    # 返回 True 表示状态已稳定: 没有记录，或记录无需任何更新且没有等待过期的抖动翻转
+    old_record = database.query_sqlite_record(sqlite_conn, host, issue_type)
+    if not old_record:
+        return True
+
+    policy = transitions.get_policy(app_config, issue_type)
+    action, tracking = transitions.evaluate(old_record, False, policy, time.time())
+
+    if action == transitions.ACTION_CLEAR:
         LOG.info(f"检测到故障已恢复: {host} - {issue_type}. 将更新数据库状态并发送恢复通知。")
-        database.update_issue_status(sqlite_conn, host, issue_type, "resolved")
+        _update_tracking(sqlite_conn, outbox, old_record, tracking)
         recovery_event = dict(old_record)
         recovery_event["extra"] = "ISSUE RESOLVED" 
-        database.write_to_mysql(mysql_conn, recovery_event)
+        _emit_event(outbox, recovery_event, transitions.STATUS_RESOLVED)
         _send_feishu_alert(app_config, dict(old_record), is_recovery=True)
+        return
 
-def send_daily_p3_summary(db_conn, app_config):
-    LOG.info("开始生成P3级别事件每日汇总报告...")
-    
-    p3_types = [issue_type for issue_type, meta in ALERT_METADATA.items() if meta['priority'] == P3]
-    if not p3_types:
-        LOG.info("系统中未定义P3级别告警，跳过汇总。")
+    if action == transitions.ACTION_FLAPPING:
+        LOG.warning(f"检测到故障状态抖动: {host} - {issue_type}。仅通知一次，抖动期间抑制后续告警。")
+        _update_tracking(sqlite_conn, outbox, old_record, tracking)
+        _emit_event(outbox, old_record, transitions.STATUS_FLAPPING)
+        _send_feishu_alert(app_config, dict(old_record), is_flapping=True)
         return
 
-    active_p3_events = database.query_active_issues_by_types(db_conn, p3_types)
-    
+    if transitions.is_changed(old_record, tracking):
+        _update_tracking(sqlite_conn, outbox, old_record, tracking)
+        return False
+    return action == transitions.ACTION_NONE and not tracking['flips']
+
+def send_daily_p3_summary(app_config, instance_label=None):
+    LOG.info("开始生成P3级别事件每日汇总报告...")
+
     webhook_urls = app_config.get('FEISHU_WEBHOOKS', {})
     target_group = "analytics_group"
     target_url = webhook_urls.get(target_group)
@@ -166,54 +348,56 @@ def send_daily_p3_summary(db_conn, app_config):
         LOG.error(f"未找到三线分析群 '{target_group}' 的Webhook URL，无法发送汇总报告。")
         return
 
-    title = f"P3级事件每日汇总报告 - {datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')}"
-    
-    if not active_p3_events:
-        content = [[{"tag": "text", "text": "过去24小时无新增或持续的P3级别事件。"}]]
-    else:
-        content = []
-        events_by_host = {}
-        for event in active_p3_events:
-            hostname = event.get('hostname', 'N/A')
-            if hostname not in events_by_host: events_by_host[hostname] = []
-            events_by_host[hostname].append(f"{event.get('type', 'N/A')}: {event.get('extra', 'N/A')}")
-
-        for hostname, details in events_by_host.items():
-            content.append([{"tag": "text", "text": f"节点: {hostname}"}])
-            for detail in details:
-                content.append([{"tag": "text", "text": f"  - {detail}"}])
+    # 从滚动摘要渲染，按大小分页；原始日志不再内联，详情链接指向状态接口
+    summary_config = p3_digest.get_config(app_config)
+    lines = p3_digest.render_lines(app_config.get('STATUS_API_BASE'), summary_config['hosts_per_type'])
+    if not lines:
+        lines = [[{"tag": "text", "text": "过去24小时无新增或持续的P3级别事件。"}]]
+    pages = p3_digest.paginate(lines, summary_config['max_message_bytes'])
 
-    data = {"msg_type": "post", "content": {"post": {"zh_cn": {"title": title, "content": content}}}}
+    title = f"P3级事件每日汇总报告 - {datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')}"
+    if instance_label:
+        title += f" [{instance_label}]"
+    sent = 0
+    for i, content in enumerate(pages, 1):
+        page_title = f"{title} ({i}/{len(pages)})" if len(pages) > 1 else title
+        data = {"msg_type": "post", "content": {"post": {"zh_cn": {"title": page_title, "content": content}}}}
+        try:
+            response = _post_webhook(target_url, data, timeout=10)
+            response.raise_for_status()
+            sent += 1
+        except requests.RequestException as e:
+            LOG.error(f"发送P3汇总报告第 {i}/{len(pages)} 页失败: {e}")
 
-    try:
-        response = requests.post(target_url, json=data, timeout=10)
-        response.raise_for_status()
-        LOG.info(f"成功发送P3汇总报告到群组 '{target_group}'")
-    except requests.RequestException as e:
-        LOG.error(f"发送P3汇总报告失败: {e}")
+    if sent == len(pages):
+        # 全部发送成功才开始新的统计区间，失败时保留摘要，下次汇总一并发送
+        p3_digest.reset()
+        p3_digest.save()
+        LOG.info(f"成功发送P3汇总报告到群组 '{target_group}'，共 {len(pages)} 页。")
 
 
+@metrics.timed('inspector_process_results_seconds')
 def process_results(node_spec, check_results, db_connections, app_config):
+    # 返回告警状态已稳定的检查项集合，供输出指纹判断下一轮能否跳过
     sqlite_conn = db_connections.get('sqlite')
-    mysql_conn = db_connections.get('mysql')
+    outbox = db_connections.get('outbox')
     host = node_spec.get('host')
     hostname = node_spec.get('hostname', host)
+    settled = set()
     for check_name, result in check_results.items():
-        is_success = result.get(KEY_SUCCESS, False)
-        issue_types = result.get(KEY_TYPES, [])
-        if not issue_types:
-            issue_types = [check_name]
+        issue_types = result.types or (check_name,)
+        check_settled = True
         for issue_type in issue_types:
-            event_data = {
-                KEY_HOST: host,
-                KEY_HOSTNAME: hostname,
-                KEY_TYPE: issue_type,
-                KEY_EXTRA: result.get(KEY_EXTRA, ''),
-            }
-            if is_success:
-                handle_resolved_issue(sqlite_conn, mysql_conn, app_config, host, issue_type)
+            if result.success:
+                if not handle_resolved_issue(sqlite_conn, outbox, app_config, host, issue_type):
+                    check_settled = False
             else:
-                handle_failed_issue(sqlite_conn, mysql_conn, app_config, event_data)
+                event_data = IssueEvent(host, hostname, issue_type, extra=result.extra if result.extra is not None else '')
+                handle_failed_issue(sqlite_conn, outbox, app_config, event_data)
+                check_settled = False
+        if check_settled:
+            settled.add(check_name)
+    return settled
 
 def process_connection_failure(node_spec, result):
     LOG.error(f"上报连接失败: {node_spec.get('hostname')}")
@@ -1,91 +1,320 @@
+import os
+import gzip
+import json
+import time
+import hashlib
 import logbook
-import paramiko
 import inspect
+import importlib
+from collections import namedtuple
 
-from checks import gpu_checks, system_checks, network_checks, storage_checks, muxi_checks
 from core.models import *
+from core import metrics, tracing, transitions
 
 LOG = logbook.Logger(__name__)
 
+# 检查项名称 -> (checks 下的模块, 命令函数, 解析函数)。模块在首次编译执行计划时才导入，
+# 单节点 CLI 只加载所选检查项用到的模块
 CHECK_REGISTRY = {
     # --- GPU Checks ---
-    "gpu.count": (gpu_checks.get_gpu_count_command, gpu_checks.parse_gpu_count),
-    "gpu.temperature": (gpu_checks.get_gpu_temp_command, gpu_checks.parse_gpu_temp),
-    "gpu.thermal_slowdown": (gpu_checks.get_gpu_thermal_status_command, gpu_checks.parse_gpu_thermal_status),
-    "gpu.ecc_soft_error": (gpu_checks.get_ecc_soft_uncorr_command, gpu_checks.parse_ecc_soft_uncorr),
-    "gpu.xid_error": (gpu_checks.get_xid_command, gpu_checks.parse_xid),
-    "gpu.nvlink_status": (gpu_checks.get_nvlink_status_command, gpu_checks.parse_nvlink_status),
-    "gpu.pcie_status": (gpu_checks.get_pcie_limit_command, gpu_checks.parse_pcie_limit),
-    "gpu.gdr_status": (gpu_checks.get_gdr_status_command, gpu_checks.parse_gdr_status),
-    "gpu.acs_status": (gpu_checks.get_acs_status_command, gpu_checks.parse_acs_status),
-    "gpu.fabric_manager_status": (gpu_checks.get_fabricmanager_status_command, gpu_checks.parse_fabricmanager_status),
+    "gpu.count": ("gpu_checks", "get_gpu_count_command", "parse_gpu_count"),
+    "gpu.temperature": ("gpu_checks", "get_gpu_temp_command", "parse_gpu_temp"),
+    "gpu.thermal_slowdown": ("gpu_checks", "get_gpu_thermal_status_command", "parse_gpu_thermal_status"),
+    "gpu.ecc_soft_error": ("gpu_checks", "get_ecc_soft_uncorr_command", "parse_ecc_soft_uncorr"),
+    "gpu.xid_error": ("gpu_checks", "get_xid_command", "parse_xid"),
+    "gpu.nvlink_status": ("gpu_checks", "get_nvlink_status_command", "parse_nvlink_status"),
+    "gpu.pcie_status": ("gpu_checks", "get_pcie_limit_command", "parse_pcie_limit"),
+    "gpu.gdr_status": ("gpu_checks", "get_gdr_status_command", "parse_gdr_status"),
+    "gpu.acs_status": ("gpu_checks", "get_acs_status_command", "parse_acs_status"),
+    "gpu.fabric_manager_status": ("gpu_checks", "get_fabricmanager_status_command", "parse_fabricmanager_status"),
     
     # --- System Checks ---
-    "system.disk_usage": (system_checks.get_disk_usage_command, system_checks.parse_disk_usage),
-    "system.memory_usage": (system_checks.get_memory_status_command, system_checks.parse_memory_status),
-    "system.hw_error": (system_checks.get_hardware_error_command, system_checks.parse_hardware_error),
+    "system.disk_usage": ("system_checks", "get_disk_usage_command", "parse_disk_usage"),
+    "system.memory_usage": ("system_checks", "get_memory_status_command", "parse_memory_status"),
+    "system.hw_error": ("system_checks", "get_hardware_error_command", "parse_hardware_error"),
     
     # --- Network Checks ---
-    "network.route": (network_checks.get_route_status_command, network_checks.parse_route_status),
-    "network.ib_device_status": (network_checks.get_ibdev2netdev_status_command, network_checks.parse_ibdev2netdev_status),
-    "network.ib_device_count": (network_checks.get_ibdev2netdev_count_command, network_checks.parse_ibdev2netdev_count),
-    "network.ip_rule": (network_checks.get_ip_rule_count_command, network_checks.parse_ip_rule_count),
+    "network.route": ("network_checks", "get_route_status_command", "parse_route_status"),
+    "network.ib_device_status": ("network_checks", "get_ibdev2netdev_status_command", "parse_ibdev2netdev_status"),
+    "network.ib_device_count": ("network_checks", "get_ibdev2netdev_count_command", "parse_ibdev2netdev_count"),
+    "network.ip_rule": ("network_checks", "get_ip_rule_count_command", "parse_ip_rule_count"),
+    # IB 端口计数器的三个检查项共用一条命令，run_plan 对同一节点只执行一次
+    "network.traffic": ("network_checks", "get_ib_counters_command", "parse_ib_traffic"),
+    "network.ib_link_errors": ("network_checks", "get_ib_counters_command", "parse_ib_link_errors"),
+    "network.ib_port_errors": ("network_checks", "get_ib_counters_command", "parse_ib_port_errors"),
 
     # --- Storage Checks ---
-    "storage.gpfs": (storage_checks.get_gpfs_status_command, storage_checks.parse_gpfs_status),
+    "storage.gpfs": ("storage_checks", "get_gpfs_status_command", "parse_gpfs_status"),
 
     # --- muxi Checks ---
-    "gpu.muxi.count": (muxi_checks.get_muxi_gpu_count_command, muxi_checks.parse_muxi_gpu_count),
-    "gpu.muxi.temperature": (muxi_checks.get_muxi_gpu_temp_command, muxi_checks.parse_muxi_gpu_temp),
-    "gpu.muxi.ecc_state": (muxi_checks.get_muxi_ecc_state_command, muxi_checks.parse_muxi_ecc_state),
-    "gpu.muxi.pcie_status": (muxi_checks.get_muxi_pcie_status_command, muxi_checks.parse_muxi_pcie_status),
-    # 宁夏muxi不支持 mx-smi --show-clk-tr，可注释
-    "gpu.muxi.thermal_status" : (muxi_checks.get_muxi_thermal_status_command, muxi_checks.parse_muxi_thermal_status),
-    "network.muxi.metaxlink_status": (muxi_checks.get_muxi_metaxlink_status_command, muxi_checks.parse_muxi_metaxlink_status)
+    # 全部沐曦检查项共用一条 mxgpu-smi 快照命令，run_plan 对同一节点只执行一次
+    # (宁夏muxi不支持的子命令会在快照中被识别并跳过对应检查)
+    "gpu.muxi.count": ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_gpu_count"),
+    "gpu.muxi.temperature": ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_gpu_temp"),
+    "gpu.muxi.ecc_state": ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_ecc_state"),
+    "gpu.muxi.pcie_status": ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_pcie_status"),
+    "gpu.muxi.thermal_status" : ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_thermal_status"),
+    "network.muxi.metaxlink_status": ("muxi_checks", "get_muxi_snapshot_command", "parse_muxi_metaxlink_status")
 }
 
-def _execute_ssh_command(client: paramiko.SSHClient, command: str, timeout=15) -> dict:
-    try:
-        stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
-        exit_code = stdout.channel.recv_exit_status()
-        output = stdout.read().decode('utf-8', errors='ignore')
-        error = stderr.read().decode('utf-8', errors='ignore')
+DEFAULT_CHECK_TIMEOUT = 15
 
-        is_a_grep_command = "grep" in command
+# 读取整个内核环形缓冲区的检查在长时间运行的节点上可能较慢
+CHECK_TIMEOUTS = {
+    "gpu.xid_error": 30,
+    "system.hw_error": 30,
+}
 
-        if exit_code == 0 or (is_a_grep_command and exit_code == 1):
-            return {'success': True, 'output': output.strip()}
-        else:
-            err_msg = f"ExitCode:{exit_code}, Stderr:'{error.strip()}', Stdout:'{output.strip()}'"
-            return {'success': False, 'error': err_msg}
+# 沐曦快照依次执行多个 mxgpu-smi 子命令 (每段在节点上另有 10 秒超时)
+MUXI_SNAPSHOT_TIMEOUT = 65
+CHECK_TIMEOUTS.update({name: MUXI_SNAPSHOT_TIMEOUT for name, (module_name, _, _) in CHECK_REGISTRY.items() if module_name == "muxi_checks"})
+
+# 每个检查项负责的告警类型 (与解析函数成功时返回的 KEY_TYPES 一致)，用于执行计划与回放统计
+CHECK_ISSUE_TYPES = {
+    "gpu.count": (TYPE_GPU_CNT, TYPE_SMI_CMD_ERROR),
+    "gpu.temperature": (TYPE_GPU_HIGH_TEMP, TYPE_GPU_TEMP, TYPE_SMI_CMD_ERROR),
+    "gpu.thermal_slowdown": (TYPE_GPU_THERMAL_SLOWDOWN,),
+    "gpu.ecc_soft_error": (TYPE_ECC_SOFT, TYPE_SMI_CMD_ERROR),
+    "gpu.xid_error": (TYPE_XID_ERROR, TYPE_XID_INFO),
+    "gpu.nvlink_status": (TYPE_NVLINK,),
+    "gpu.pcie_status": (TYPE_PCIE,),
+    "gpu.gdr_status": (TYPE_GDR,),
+    "gpu.acs_status": (TYPE_ACS,),
+    "gpu.fabric_manager_status": (TYPE_FM,),
+    "system.disk_usage": (TYPE_DISK_USAGE, TYPE_SHUTDOWN),
+    "system.memory_usage": (TYPE_MEMORY_USAGE, TYPE_SHUTDOWN),
+    "system.hw_error": (TYPE_HW_ERROR, TYPE_SHUTDOWN),
+    "network.route": (TYPE_ROUTE, TYPE_IP_RULE, TYPE_SHUTDOWN),
+    "network.ib_device_status": (TYPE_IBDEV, TYPE_SHUTDOWN),
+    "network.ib_device_count": (TYPE_IBDEV_CNT, TYPE_SHUTDOWN),
+    "network.ip_rule": (TYPE_IP_RULE, TYPE_SHUTDOWN),
+    "network.traffic": (TYPE_TRAFFIC,),
+    "network.ib_link_errors": (TYPE_IB_LINK_ERROR,),
+    "network.ib_port_errors": (TYPE_IB_PORT_ERROR,),
+    "storage.gpfs": (TYPE_GPFS_STATUS, TYPE_SHUTDOWN),
+    "gpu.muxi.count": (TYPE_MUXI_GPU_CNT, TYPE_MUXI_SMI_CMD_ERROR),
+    "gpu.muxi.temperature": (TYPE_MUXI_GPU_TEMP, TYPE_MUXI_SMI_CMD_ERROR),
+    "gpu.muxi.ecc_state": (TYPE_MUXI_ECC_STATE,),
+    "gpu.muxi.pcie_status": (TYPE_MUXI_PCIE_STATUS,),
+    "gpu.muxi.thermal_status": (TYPE_MUXI_THERMAL_STATUS,),
+    "network.muxi.metaxlink_status": (TYPE_MUXI_METAXLINK_STATUS,),
+}
+
+# 执行计划中的一步: 命令已按阈值展开，热路径中只需执行与解析。salt 由检查项名、阈值与该步各告警类型的状态机策略计算，
+# 阈值或 TRANSITION_POLICIES 变化后指纹全部失效
+CheckStep = namedtuple('CheckStep', ['name', 'command', 'parse', 'timeout', 'issue_types', 'salt'])
+
+# 输出指纹: 每个 (节点, 检查项) 的原始输出摘要保存在状态库中。上一轮结果为成功、没有指标、且告警决策没有产生任何变化
+# (无记录或已恢复、观测历史已饱和、无待过期的抖动翻转) 时才保存；本轮摘要相同则跳过解析与上报。
+# 失败结果每轮都有重复告警，不会被跳过；指纹超过 max_age_seconds 后强制完整处理一次。
+DEFAULT_FINGERPRINT_CONFIG = {
+    'enabled': True,
+    'max_age_seconds': 3600,
+}
+
+_PLAN_CACHE = {}
+
+_RECORD_DIR = None
+_session_counter = 0
+_RECORDED_THRESHOLDS = set()
+
+def configure_recording(record_dir):
+    # 开启后每个节点的命令原始输出都会追加到 record_dir 下的压缩语料中，供离线回放
+    global _RECORD_DIR
+    _RECORD_DIR = record_dir or None
+    _RECORDED_THRESHOLDS.clear()
+    if _RECORD_DIR:
+        os.makedirs(_RECORD_DIR, exist_ok=True)
 
+def _record_thresholds(thresholds):
+    # 语料只在记录中保存阈值摘要，阈值本身按摘要写入 thresholds-<摘要>.json；回放时按录制时的阈值编译计划，
+    # 阈值修改后命令 (如 GPFS 路径) 变化也能找到录制的输出
+    key = _thresholds_key(thresholds)
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+    if digest not in _RECORDED_THRESHOLDS:
+        path = os.path.join(_RECORD_DIR, f"thresholds-{digest}.json")
+        try:
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(key)
+                os.replace(tmp_path, path)
+            _RECORDED_THRESHOLDS.add(digest)
+        except OSError as e:
+            LOG.error(f"写入录制阈值文件失败: {path}, 错误: {e}")
+    return digest
+
+def _save_records(records):
+    # 每个进程写独立文件；每个节点追加一个 gzip member，进程被强制结束也不会丢失已完成节点的数据
+    path = os.path.join(_RECORD_DIR, f"ssh-{os.getpid()}.jsonl.gz")
+    try:
+        with gzip.open(path, 'ab') as f:
+            f.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8'))
+    except OSError as e:
+        LOG.error(f"写入命令录制文件失败: {path}, 错误: {e}")
+
+def _run_remote(client, command, timeout):
+    if hasattr(client, 'replay_command'):
+        return client.replay_command(command)
+    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+    # exec_command 的 timeout 只作用于读操作，recv_exit_status() 会一直等待，命令卡住时按步骤超时关闭通道
+    channel = stdout.channel
+    if not channel.status_event.wait(timeout):
+        channel.close()
+        raise TimeoutError(f"command did not exit within {timeout}s")
+    exit_code = channel.recv_exit_status()
+    output = stdout.read().decode('utf-8', errors='ignore')
+    error = stderr.read().decode('utf-8', errors='ignore')
+    return exit_code, output, error
+
+def _execute_ssh_command(client: "paramiko.SSHClient", command: str, timeout=15, records=None, check_name=None) -> dict:
+    start = time.perf_counter()
+    try:
+        exit_code, output, error = _run_remote(client, command, timeout)
     except Exception as e:
+        if records is not None:
+            records.append({'check': check_name, 'command': command, 'exit_code': None, 'stdout': '',
+                            'stderr': str(e), 'latency': round(time.perf_counter() - start, 4)})
         return {'success': False, 'error': f"Command execution exception: {e}"}
 
-def run_specific_checks(client: paramiko.SSHClient, node_spec: dict, thresholds: dict, checks_to_run: list) -> dict:
-    all_results = {}
-    hostname = node_spec.get('hostname', node_spec.get('host'))
+    if records is not None:
+        records.append({'check': check_name, 'command': command, 'exit_code': exit_code, 'stdout': output,
+                        'stderr': error, 'latency': round(time.perf_counter() - start, 4)})
+
+    is_a_grep_command = "grep" in command
+
+    if exit_code == 0 or (is_a_grep_command and exit_code == 1):
+        return {'success': True, 'output': output.strip()}
+    else:
+        err_msg = f"ExitCode:{exit_code}, Stderr:'{error.strip()}', Stdout:'{output.strip()}'"
+        return {'success': False, 'error': err_msg}
+
+def resolve_check(check_name):
+    module_name, command_func_name, parse_func_name = CHECK_REGISTRY[check_name]
+    module = importlib.import_module(f"checks.{module_name}")
+    return getattr(module, command_func_name), getattr(module, parse_func_name)
 
+def get_fingerprint_config(app_config):
+    return {**DEFAULT_FINGERPRINT_CONFIG, **(app_config.get('OUTPUT_FINGERPRINTS') or {})}
+
+def _payload_hash(payload):
+    text = payload.get('output', '') if payload['success'] else payload.get('error', '')
+    return hashlib.blake2b(text.encode('utf-8', errors='surrogatepass'), digest_size=16,
+                           person=b'ok' if payload['success'] else b'err').digest()
+
+def _policies_key(app_config, issue_types):
+    return json.dumps([transitions.get_policy(app_config or {}, issue_type) for issue_type in issue_types], sort_keys=True)
+
+def compile_plan(checks_to_run, thresholds, hostname=None, app_config=None):
+    steps = []
+    thresholds_key = _thresholds_key(thresholds)
     for check_name in checks_to_run:
         if check_name not in CHECK_REGISTRY:
-            LOG.warning(f"[{hostname}] Check '{check_name}' is not defined in CHECK_REGISTRY. Skipping.")
+            LOG.warning(f"[{hostname or '-'}] Check '{check_name}' is not defined in CHECK_REGISTRY. Skipping.")
             continue
-        
-        get_command_func, parse_result_func = CHECK_REGISTRY[check_name]
 
-        command = ""
-        sig = inspect.signature(get_command_func)
-        if len(sig.parameters) > 0:
+        get_command_func, parse_result_func = resolve_check(check_name)
+        if len(inspect.signature(get_command_func).parameters) > 0:
             command = get_command_func(thresholds)
         else:
             command = get_command_func()
-        
-        LOG.debug(f"[{hostname}] Executing check '{check_name}': {command}")
-        result_payload = _execute_ssh_command(client, command)
-        
-        final_result = parse_result_func(result_payload, node_spec, thresholds)
+        issue_types = CHECK_ISSUE_TYPES.get(check_name, (check_name,))
+        salt = f"{check_name}\0{thresholds_key}\0{_policies_key(app_config, issue_types)}"
+        steps.append(CheckStep(check_name, command, parse_result_func,
+                               CHECK_TIMEOUTS.get(check_name, DEFAULT_CHECK_TIMEOUT), issue_types,
+                               hashlib.blake2b(salt.encode(), digest_size=16).digest()))
+    return tuple(steps)
+
+def _thresholds_key(thresholds):
+    return json.dumps(thresholds, sort_keys=True, default=str)
+
+def get_plan(profile_name, runner_type, checks_to_run, thresholds, app_config=None):
+    # 同一 (profile, 任务类型, 检查项列表, 阈值, 状态机策略) 的计划只编译一次；配置热加载后由 clear_plan_cache 失效
+    policies = (app_config or {}).get('TRANSITION_POLICIES')
+    key = (profile_name, runner_type, tuple(checks_to_run), _thresholds_key(thresholds), _thresholds_key(policies))
+    plan = _PLAN_CACHE.get(key)
+    if plan is None:
+        plan = _PLAN_CACHE[key] = compile_plan(checks_to_run, thresholds, app_config=app_config)
+        LOG.debug(f"编译执行计划: profile='{profile_name}', 任务类型='{runner_type}', {len(plan)} 个检查项")
+    return plan
+
+def compile_plans(all_profiles, runner_type, thresholds, app_config=None):
+    # 主进程每轮调用，返回 {profile: plan}，随 config_payload 下发给 worker
+    return {profile_name: get_plan(profile_name, runner_type, (profile or {}).get('checks', {}).get(runner_type, []), thresholds,
+                                   app_config)
+            for profile_name, profile in all_profiles.items()}
+
+def clear_plan_cache():
+    _PLAN_CACHE.clear()
+
+def run_plan(client: "paramiko.SSHClient", node_spec: dict, thresholds: dict, plan, fingerprints=None) -> dict:
+    # fingerprints: {'previous': {检查项: 指纹}, 'current': {}}。传入时记录本轮每个检查项的指纹，
+    # 与 previous 相同的检查项不解析、不出现在返回结果中
+    global _session_counter
+    all_results = {}
+    hostname = node_spec.get('hostname', node_spec.get('host'))
+    records = [] if _RECORD_DIR else None
+
+    # 多个检查项共用同一条命令 (如沐曦快照) 时每个节点只执行一次，后续检查项复用同一个 payload
+    shared_payloads = {}
+
+    for step in plan:
+        check_name = step.name
+        with tracing.span(check_name, cat='check'):
+            shared = shared_payloads.get(step.command)
+            if shared is not None:
+                result_payload, record, source_check, payload_hash = shared
+                LOG.debug(f"[{hostname}] Check '{check_name}' reuses output of '{source_check}'")
+                if record is not None:
+                    records.append({**record, 'check': check_name, 'latency': 0.0})
+            else:
+                LOG.debug(f"[{hostname}] Executing check '{check_name}': {step.command}")
+                with metrics.timer('inspector_check_command_seconds', check=check_name), tracing.span('exec', cat='ssh'):
+                    result_payload = _execute_ssh_command(client, step.command, timeout=step.timeout,
+                                                          records=records, check_name=check_name)
+                payload_hash = _payload_hash(result_payload) if fingerprints is not None else None
+                shared_payloads[step.command] = (result_payload, records[-1] if records else None, check_name, payload_hash)
+
+            if fingerprints is not None:
+                digest = hashlib.blake2b(payload_hash, digest_size=8, key=step.salt).hexdigest()
+                fingerprints['current'][check_name] = digest
+                if fingerprints['previous'].get(check_name) == digest:
+                    metrics.inc('inspector_fingerprint_hits_total', check=check_name)
+                    LOG.debug(f"[{hostname}] Check '{check_name}' output unchanged, skipping parse and report")
+                    continue
+                metrics.inc('inspector_fingerprint_misses_total', check=check_name)
+
+            with metrics.timer('inspector_check_parse_seconds', check=check_name):
+                final_result = step.parse(result_payload, node_spec, thresholds)
+        if not final_result.success:
+            metrics.inc('inspector_check_failures_total', check=check_name)
         
         all_results[check_name] = final_result
 
+    if records:
+        _session_counter += 1
+        session = f"{os.getpid()}-{int(time.time())}-{_session_counter}"
+        thresholds_digest = _record_thresholds(thresholds)
+        for record in records:
+            record.update({'session': session, 'host': node_spec.get('host'), 'hostname': hostname, 'ts': int(time.time()),
+                           'thresholds': thresholds_digest})
+        _save_records(records)
+
     return all_results
 
+def time_plan(client: "paramiko.SSHClient", plan) -> dict:
+    # 只执行命令、不解析与上报 (容量规划采样用)，返回 {检查项: 命令耗时}；多个检查项共用的命令只执行一次，记在第一个检查项上
+    timings = {}
+    executed = set()
+    for step in plan:
+        if step.command in executed:
+            continue
+        executed.add(step.command)
+        start = time.perf_counter()
+        _execute_ssh_command(client, step.command, timeout=step.timeout)
+        timings[step.name] = time.perf_counter() - start
+    return timings
+
+def run_specific_checks(client: "paramiko.SSHClient", node_spec: dict, thresholds: dict, checks_to_run: list) -> dict:
+    hostname = node_spec.get('hostname', node_spec.get('host'))
+    return run_plan(client, node_spec, thresholds, compile_plan(checks_to_run, thresholds, hostname))
@@ -0,0 +1,129 @@
+import os
+import time
+import bisect
+import hashlib
+import sqlite3
+import threading
+import logbook
+
+LOG = logbook.Logger(__name__)
+
+# 多实例分片: 每个巡检实例在共享 SQLite 租约库中定期续约，存活实例组成一致性哈希环，
+# 每个实例只巡检哈希到自己的节点。实例租约过期后其节点自动迁移到其余实例，恢复后再迁回。
+DEFAULT_LEASE_SECONDS = 90
+DEFAULT_VNODES = 64
+
+LEASE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS inspector_leases (
+        instance_id TEXT PRIMARY KEY,
+        pid INTEGER,
+        hostname TEXT,
+        expires_at REAL,
+        renewed_at REAL
+    )
+'''
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+def build_ring(instances, vnodes=DEFAULT_VNODES):
+    ring = sorted((_hash(f"{instance}#{i}"), instance) for instance in instances for i in range(vnodes))
+    return [point for point, _ in ring], [instance for _, instance in ring]
+
+def ring_owner(ring, key):
+    points, owners = ring
+    if not points:
+        return None
+    idx = bisect.bisect(points, _hash(key)) % len(points)
+    return owners[idx]
+
+class ShardCoordinator:
+    def __init__(self, sharding_config):
+        self.instance_id = str(sharding_config['instance_id'])
+        self.instances = sorted({str(i) for i in sharding_config.get('instances', [])})
+        self.lease_path = sharding_config.get('lease_path', 'data/inspector_leases.db')
+        self.lease_seconds = sharding_config.get('lease_seconds', DEFAULT_LEASE_SECONDS)
+        self.vnodes = sharding_config.get('vnodes', DEFAULT_VNODES)
+        if self.instance_id not in self.instances:
+            raise ValueError(f"SHARDING.instance_id '{self.instance_id}' 不在 SHARDING.instances 中")
+        self._ring_members = None
+        self._ring = ([], [])
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        lease_dir = os.path.dirname(self.lease_path)
+        if lease_dir:
+            os.makedirs(lease_dir, exist_ok=True)
+        conn = sqlite3.connect(self.lease_path, timeout=10)
+        conn.execute(LEASE_TABLE_SQL)
+        return conn
+
+    def start(self):
+        self.renew()
+        # 独立线程续约，避免长时间运行的巡检周期阻塞续约导致租约过期、节点被其他实例重复巡检
+        self._thread = threading.Thread(target=self._heartbeat, name="shard-lease", daemon=True)
+        self._thread.start()
+        LOG.info(f"分片模式已启用: 实例 '{self.instance_id}'，配置实例 {self.instances}，租约 {self.lease_seconds} 秒")
+        return self
+
+    def _heartbeat(self):
+        while not self._stop.wait(max(self.lease_seconds / 3, 1)):
+            self.renew()
+
+    def renew(self):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT INTO inspector_leases (instance_id, pid, hostname, expires_at, renewed_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(instance_id) DO UPDATE SET pid = excluded.pid, hostname = excluded.hostname, '
+                    'expires_at = excluded.expires_at, renewed_at = excluded.renewed_at',
+                    (self.instance_id, os.getpid(), os.uname().nodename, now + self.lease_seconds, now)
+                )
+            return True
+        except sqlite3.Error as e:
+            LOG.error(f"续约分片租约失败 ({self.lease_path}): {e}")
+            return False
+
+    def stop(self):
+        # 正常退出时释放租约，其余实例在下一轮即可接管本实例的节点，而无需等待租约过期
+        self._stop.set()
+        try:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM inspector_leases WHERE instance_id = ?', (self.instance_id,))
+        except sqlite3.Error as e:
+            LOG.error(f"释放分片租约失败: {e}")
+
+    def live_instances(self):
+        try:
+            with self._connect() as conn:
+                rows = conn.execute('SELECT instance_id FROM inspector_leases WHERE expires_at > ?', (time.time(),)).fetchall()
+        except sqlite3.Error as e:
+            # 租约库不可用时退化为按全部配置实例静态分片，宁可漏检失联实例的节点也不重复告警
+            LOG.error(f"读取分片租约失败，按全部配置实例静态分片: {e}")
+            return list(self.instances)
+        live = sorted({row[0] for row in rows} & set(self.instances))
+        # 自身总是参与分片，即使刚好错过一次续约
+        if self.instance_id not in live:
+            live = sorted(live + [self.instance_id])
+        return live
+
+    def _current_ring(self):
+        members = tuple(self.live_instances())
+        if members != self._ring_members:
+            if self._ring_members is not None:
+                LOG.warning(f"分片成员变化: {list(self._ring_members)} -> {list(members)}，节点将重新分配。")
+            self._ring_members = members
+            self._ring = build_ring(members, self.vnodes)
+        return self._ring
+
+    def owns(self, key):
+        return ring_owner(self._current_ring(), key) == self.instance_id
+
+    def select(self, node_specs):
+        ring = self._current_ring()
+        selected = node_specs.select(predicate=lambda host: ring_owner(ring, host) == self.instance_id)
+        LOG.info(f"实例 '{self.instance_id}' 负责 {len(selected)}/{len(node_specs)} 个节点 "
+                 f"(存活实例: {', '.join(self._ring_members)})")
+        return selected
@@ -1,35 +1,138 @@
 import time
+import multiprocessing
 import paramiko
 import logbook
 
+from core import metrics
+
 LOG = logbook.Logger(__name__)
 
-def create_ssh_client(host, port, username, password, retries=3, delay=5):
+# 跳板机: app_config.yaml 的 BASTIONS 定义跳板机，节点 (通常在 nodes.yaml 分组的 defaults 中) 以 bastion 字段引用。
+# 每个 worker 进程对每台跳板机只保持一个已认证的连接，节点连接通过其上的 direct-tcpip 通道建立，
+# 不再为每个节点与跳板机握手；同一跳板机同时打开的通道数由所有 worker 共享的信号量限制 (max_channels)。
+DEFAULT_BASTION_CONFIG = {
+    'port': 22,
+    'username': 'root',
+    'password': None,
+    'key_filename': None,
+    'timeout': 15,
+    'max_channels': 64,       # 所有 worker 合计同时经该跳板机连接的节点数
+    'acquire_timeout': 60,    # 等待通道配额的最长秒数
+    'keepalive': 30,
+}
+
+_BASTIONS = {'config': {}, 'limits': {}, 'clients': {}}
+
+def configure_bastions(bastions_config):
+    # 在主进程创建进程池之前调用，worker 通过 fork 继承信号量
+    close_bastions()
+    _BASTIONS['config'] = {name: {**DEFAULT_BASTION_CONFIG, **(cfg or {})} for name, cfg in (bastions_config or {}).items()}
+    _BASTIONS['limits'] = {name: multiprocessing.BoundedSemaphore(int(cfg['max_channels']))
+                           for name, cfg in _BASTIONS['config'].items()}
+
+def close_bastions():
+    for client in _BASTIONS['clients'].values():
+        client.close()
+    _BASTIONS['clients'] = {}
+
+def _bastion_transport(name):
+    client = _BASTIONS['clients'].get(name)
+    if client is not None and client.get_transport() is not None and client.get_transport().is_active():
+        return client.get_transport()
+    config = _BASTIONS['config'][name]
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(hostname=config['host'], port=config['port'], username=config['username'], password=config['password'],
+                   key_filename=config['key_filename'], timeout=config['timeout'])
+    client.get_transport().set_keepalive(config['keepalive'])
+    metrics.inc('inspector_bastion_handshakes_total', bastion=name)
+    LOG.debug(f"已连接跳板机 {name} ({config['username']}@{config['host']}:{config['port']})")
+    _BASTIONS['clients'][name] = client
+    return client.get_transport()
+
+def _open_bastion_channel(name, host, port, timeout):
+    if name not in _BASTIONS['config']:
+        raise ValueError(f"未定义的跳板机 '{name}' (app_config.yaml 中的 BASTIONS)")
+    limit = _BASTIONS['limits'][name]
+    with metrics.timer('inspector_bastion_channel_wait_seconds', bastion=name):
+        acquired = limit.acquire(timeout=_BASTIONS['config'][name]['acquire_timeout'])
+    if not acquired:
+        raise TimeoutError(f"跳板机 {name} 的通道数已达上限 {_BASTIONS['config'][name]['max_channels']}")
+    try:
+        # 连接或认证跳板机失败时原异常直接返回给调用方
+        cached = _BASTIONS['clients'].get(name)
+        transport = _bastion_transport(name)
+        try:
+            channel = transport.open_channel('direct-tcpip', (host, port), ('127.0.0.1', 0), timeout=timeout)
+        except paramiko.ssh_exception.ChannelException:
+            # 跳板机到节点的连接失败 (拒绝、不可达)，跳板机连接本身正常
+            raise
+        except (paramiko.ssh_exception.SSHException, EOFError, OSError):
+            # 只有复用的跳板机连接已断开 (如空闲超时被关闭) 时才重连一次
+            if cached is None or _BASTIONS['clients'].get(name) is not cached:
+                raise
+            _BASTIONS['clients'].pop(name, None)
+            cached.close()
+            channel = _bastion_transport(name).open_channel('direct-tcpip', (host, port), ('127.0.0.1', 0), timeout=timeout)
+    except Exception:
+        limit.release()
+        raise
+    return channel, limit
+
+class _BastionSSHClient(paramiko.SSHClient):
+    # 经跳板机通道建立的节点连接，关闭时归还通道配额
+    def __init__(self, limit):
+        super().__init__()
+        self._limit = limit
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._limit is not None:
+                self._limit.release()
+                self._limit = None
+
+def _discard(client):
+    if client is not None:
+        client.close()
+    return None
+
+@metrics.timed('inspector_ssh_connect_seconds')
+def create_ssh_client(host, port, username, password, retries=3, delay=5, timeout=10, bastion=None):
     client = None
     error = ""
     for attempt in range(retries):
         try:
-            client = paramiko.SSHClient()
+            sock = None
+            if bastion:
+                sock, limit = _open_bastion_channel(bastion, host, port, timeout)
+                client = _BastionSSHClient(limit)
+            else:
+                client = paramiko.SSHClient()
             client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            client.connect(hostname=host, port=port, username=username, password=password, timeout=10)
-            LOG.debug(f"成功连接到 {username}@{host}:{port}")
+            client.connect(hostname=host, port=port, username=username, password=password, timeout=timeout, sock=sock)
+            LOG.debug(f"成功连接到 {username}@{host}:{port}" + (f" (经跳板机 {bastion})" if bastion else ""))
             return client, error  # 成功连接，返回
         except paramiko.ssh_exception.NoValidConnectionsError as e:
             LOG.error(f"无法建立有效的连接 (尝试 {attempt+1}/{retries}): {e}")
-            client, error = None, str(e)
+            client, error = _discard(client), str(e)
         except paramiko.ssh_exception.AuthenticationException as e:
             LOG.error(f"认证失败 (尝试 {attempt+1}/{retries}): {e}")
-            client, error = None, str(e)
+            client, error = _discard(client), str(e)
             break  # 认证失败时不再重试
+        except paramiko.ssh_exception.ChannelException as e:
+            LOG.error(f"跳板机 {bastion} 无法连接到 {host}:{port} (尝试 {attempt+1}/{retries}): {e}")
+            client, error = _discard(client), f"bastion {bastion}: {e}"
         except paramiko.ssh_exception.SSHException as e:
             LOG.error(f"SSH异常 (尝试 {attempt+1}/{retries}): {e}")
-            client, error = None, "SSH_EXCEPTION_INTERNAL"
+            client, error = _discard(client), "SSH_EXCEPTION_INTERNAL"
         except TimeoutError as e:
             LOG.error(f"连接超时 (尝试 {attempt+1}/{retries}): {e}")
-            client, error = None, str(e)
+            client, error = _discard(client), str(e)
         except Exception as e:
             LOG.error(f"SSH未知异常 (尝试 {attempt+1}/{retries}): {e}")
-            client, error = None, f"ssh unknown exception {e}"
+            client, error = _discard(client), f"ssh unknown exception {e}"
 
         if attempt < retries - 1:
             LOG.info(f"等待 {delay} 秒后重试...")
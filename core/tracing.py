@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import random
+from contextlib import contextmanager
+from datetime import datetime
+
+import logbook
+
+LOG = logbook.Logger(__name__)
+
+# 轻量 span 追踪: cycle → node → connect/discover/check/report。
+# worker 在节点处理结束时 drain() 出本节点的 span，随节点报告返回主进程；
+# 主进程在一轮结束后按采样策略决定是否落盘，可用 chrome://tracing 或 Perfetto 直接打开。
+DEFAULT_TRACE_CONFIG = {
+    'dir': 'data/traces',
+    'format': 'chrome',        # chrome: Chrome trace-event JSON; jsonl: 每行一个 span
+    'sample_rate': 0.0,        # 按轮随机保留的比例
+    'slow_cycle_seconds': 0,   # 整轮耗时超过该值时总是保留 (0 表示不启用)
+    'max_files': 50,           # 目录中最多保留的轨迹文件数，超出后删除最旧的
+}
+
+_CONFIG = None
+_SPANS = []
+
+def configure(trace_config):
+    # trace_config 为 app_config.yaml 中的 TRACE，未配置时追踪关闭且 span() 几乎零开销
+    global _CONFIG
+    _CONFIG = {**DEFAULT_TRACE_CONFIG, **trace_config} if trace_config else None
+    if _CONFIG:
+        os.makedirs(_CONFIG['dir'], exist_ok=True)
+
+def enabled():
+    return _CONFIG is not None
+
+@contextmanager
+def span(name, cat='node', **args):
+    if _CONFIG is None:
+        yield
+        return
+    ts = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _SPANS.append({
+            'name': name,
+            'cat': cat,
+            'ts': int(ts * 1e6),
+            'dur': int((time.perf_counter() - start) * 1e6),
+            'pid': os.getpid(),
+            'args': args,
+        })
+
+def drain():
+    global _SPANS
+    spans, _SPANS = _SPANS, []
+    return spans
+
+def extend(spans):
+    if _CONFIG is not None and spans:
+        _SPANS.extend(spans)
+
+def _should_keep(cycle_seconds):
+    slow = _CONFIG.get('slow_cycle_seconds') or 0
+    if slow and cycle_seconds >= slow:
+        return True
+    return random.random() < (_CONFIG.get('sample_rate') or 0)
+
+def _to_chrome(spans, runner_type):
+    parent_pid = os.getpid()
+    events = []
+    for pid in sorted({s['pid'] for s in spans}):
+        label = f"inspector ({runner_type})" if pid == parent_pid else f"worker-{pid}"
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid, 'args': {'name': label}})
+    for s in spans:
+        events.append({'name': s['name'], 'cat': s['cat'], 'ph': 'X', 'ts': s['ts'], 'dur': s['dur'],
+                       'pid': s['pid'], 'tid': s['pid'], 'args': s['args']})
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, ensure_ascii=False)
+
+def _rotate(trace_dir, max_files):
+    files = sorted(f for f in os.listdir(trace_dir) if f.startswith('cycle-'))
+    for name in files[:max(len(files) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(trace_dir, name))
+        except OSError as e:
+            LOG.warning(f"删除旧轨迹文件失败: {name}, 错误: {e}")
+
+def export_cycle(runner_type, cycle_seconds):
+    # 取出本轮所有 span (主进程 + worker)，按采样策略决定是否写入文件；返回写入路径或 None
+    spans = drain()
+    if _CONFIG is None or not spans or not _should_keep(cycle_seconds):
+        return None
+
+    fmt = _CONFIG.get('format', 'chrome')
+    suffix = 'jsonl' if fmt == 'jsonl' else 'json'
+    path = os.path.join(_CONFIG['dir'], f"cycle-{datetime.now():%Y%m%d-%H%M%S}-{runner_type}.{suffix}")
+    spans.sort(key=lambda s: s['ts'])
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            if fmt == 'jsonl':
+                f.write(''.join(json.dumps(s, ensure_ascii=False, separators=(',', ':')) + '\n' for s in spans))
+            else:
+                f.write(_to_chrome(spans, runner_type))
+    except OSError as e:
+        LOG.error(f"写入巡检轨迹文件失败: {path}, 错误: {e}")
+        return None
+
+    _rotate(_CONFIG['dir'], _CONFIG.get('max_files', 50))
+    LOG.info(f"本轮巡检轨迹已写入 {path} ({len(spans)} 个 span, 耗时 {cycle_seconds:.1f} 秒)")
+    return path
@@ -0,0 +1,97 @@
+import logbook
+
+LOG = logbook.Logger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_REPORTED = 'reported'
+STATUS_FLAPPING = 'flapping'
+STATUS_RESOLVED = 'resolved'
+ACTIVE_STATUSES = (STATUS_REPORTED, STATUS_FLAPPING)
+
+# 状态机给出的动作
+ACTION_NONE = 'none'            # 不通知，仅按需更新状态
+ACTION_PENDING = 'pending'      # 出现故障但尚未达到确认次数
+ACTION_RAISE = 'raise'          # 确认故障，执行完整告警流程
+ACTION_DUPLICATE = 'duplicate'  # 已告警故障持续存在
+ACTION_CLEAR = 'clear'          # 确认恢复
+ACTION_FLAPPING = 'flapping'    # 进入抖动状态，只通知一次
+ACTION_SUPPRESS = 'suppress'    # 抖动期间，抑制所有通知
+
+# window: 滑动窗口长度 M; raise_count: 窗口内失败 N 次才确认故障;
+# clear_count: 连续成功多少次才确认恢复;
+# flap_window_seconds / flap_threshold: 时间窗口内观测结果翻转次数达到阈值即判定为抖动
+DEFAULT_POLICY = {
+    'window': 1,
+    'raise_count': 1,
+    'clear_count': 1,
+    'flap_window_seconds': 1800,
+    'flap_threshold': 4,
+}
+
+def get_policy(app_config, issue_type):
+    policies = app_config.get('TRANSITION_POLICIES') or {}
+    policy = {**DEFAULT_POLICY, **(policies.get('default') or {}), **(policies.get(issue_type) or {})}
+    policy['window'] = max(int(policy['window']), 1)
+    policy['raise_count'] = min(max(int(policy['raise_count']), 1), policy['window'])
+    policy['clear_count'] = max(int(policy['clear_count']), 1)
+    return policy
+
+def _parse_flips(raw):
+    if not raw:
+        return []
+    return [int(t) for t in str(raw).split(',') if t]
+
+def evaluate(record, failed, policy, now):
+    record = record or {}
+    status = record.get('status')
+    old_history = record.get('history') or ''
+
+    history_len = max(policy['window'], policy['clear_count'])
+    history = (old_history + ('1' if failed else '0'))[-history_len:]
+
+    flips = [t for t in _parse_flips(record.get('flips')) if now - t <= policy['flap_window_seconds']]
+    if old_history and old_history[-1] != history[-1]:
+        flips.append(int(now))
+
+    clear_count = policy['clear_count']
+    confirmed_fail = history[-policy['window']:].count('1') >= policy['raise_count']
+    confirmed_clear = len(history) >= clear_count and history[-clear_count:] == '0' * clear_count
+
+    def decide(action, new_status):
+        return action, {'status': new_status, 'history': history, 'flips': ','.join(str(t) for t in flips)}
+
+    # 1. 抖动检测，优先于普通状态转换
+    if len(flips) >= policy['flap_threshold']:
+        if status != STATUS_FLAPPING:
+            return decide(ACTION_FLAPPING, STATUS_FLAPPING)
+        return decide(ACTION_SUPPRESS, STATUS_FLAPPING)
+
+    if status == STATUS_FLAPPING:
+        # 翻转次数回落到阈值一半以下才退出抖动状态，避免在阈值附近反复进出
+        if len(flips) > policy['flap_threshold'] // 2:
+            return decide(ACTION_SUPPRESS, STATUS_FLAPPING)
+        if confirmed_fail:
+            return decide(ACTION_RAISE, STATUS_REPORTED)
+        if confirmed_clear:
+            return decide(ACTION_CLEAR, STATUS_RESOLVED)
+        return decide(ACTION_SUPPRESS, STATUS_FLAPPING)
+
+    # 2. 普通状态转换 (N-of-M 确认 + 独立的恢复确认次数)
+    if status == STATUS_REPORTED:
+        if confirmed_clear:
+            return decide(ACTION_CLEAR, STATUS_RESOLVED)
+        if failed:
+            return decide(ACTION_DUPLICATE, STATUS_REPORTED)
+        return decide(ACTION_NONE, STATUS_REPORTED)
+
+    if confirmed_fail:
+        return decide(ACTION_RAISE, STATUS_REPORTED)
+    if failed:
+        return decide(ACTION_PENDING, STATUS_PENDING)
+    if status == STATUS_PENDING and confirmed_clear:
+        return decide(ACTION_NONE, STATUS_RESOLVED)
+    return decide(ACTION_NONE, status)
+
+def is_changed(record, fields):
+    record = record or {}
+    return any((record.get(k) or '') != (v or '') for k, v in fields.items())
@@ -1,5 +1,9 @@
+import os
 import sys
+import json
 import time
+import argparse
+from datetime import datetime
 import schedule
 import logbook
 from logbook.handlers import StreamHandler
@@ -7,16 +11,25 @@ from functools import partial
 from multiprocessing import Pool, Manager
 
 from core import config 
-from core import database, reporter, runners, discover
+from core import database, reporter, runners, discover, fleet, metrics, httpd, tracing, sharding, issue_index, db_maintenance, p3_digest, logpipe, memguard, counters, planner, replay
+from core import ssh_client
 from core.ssh_client import create_ssh_client
 from core.models import *
 
+LOG = logbook.Logger("GPU-INSPECTOR")
 _process_global_config = {}
 
 def init_worker(config_payload):
     global _process_global_config
     _process_global_config.update(config_payload)
-    setup_logging() 
+    memguard.init_worker()
+    if not logpipe.attach_worker():
+        setup_logging()
+    runners.configure_recording(config_payload['app_config'].get('SSH_RECORD_DIR'))
+    tracing.configure(config_payload['app_config'].get('TRACE'))
+    # 丢弃 fork 时从主进程继承的指标与 span，worker 只上报自身产生的增量
+    metrics.drain()
+    tracing.drain()
 
 def setup_logging():
     log_format = ('[{record.time:%Y-%m-%d %H:%M:%S.%f%z}] {record.level_name}: {record.channel}: '
@@ -25,105 +38,455 @@ def setup_logging():
     return logbook.Logger("GPU-INSPECTOR")
 
 def process_one_node(node_spec):
+    hostname = node_spec.get('hostname', node_spec['host'])
+    with metrics.timer('inspector_node_seconds', runner=_process_global_config['runner_type']), \
+            tracing.span(f"node {hostname}", host=node_spec['host']), logpipe.node_context(hostname):
+        node_report = _inspect_node(node_spec)
+    node_report['timings'] = metrics.drain()
+    node_report['spans'] = tracing.drain()
+    node_report['log_suppressed'] = logpipe.drain_suppressed()
+    node_report['counter_samples'] = counters.drain()
+    node_report['memory'] = memguard.worker_sample()
+    return node_report
+
+def _inspect_node(node_spec):
     runner_type = _process_global_config['runner_type']
     app_config = _process_global_config['app_config']
-    all_profiles = _process_global_config['all_profiles']
     thresholds = _process_global_config['thresholds']
     
     host = node_spec['host']
     hostname = node_spec.get('hostname', node_spec['host'])
-    LOG.info(f"[{hostname}] 开始处理节点，任务类型: '{runner_type}'")
+    LOG.info(f"[{hostname}] 开始处理节点，任务类型: '{runner_type}'", extra=logpipe.ROUTINE)
 
     sqlite_conn = database.init_sqlite(app_config.get('SQLITE_DB_PATH'))
-    mysql_conn = database.get_mysql_connection(app_config.get('MYSQL'))
-    db_connections = {'sqlite': sqlite_conn, 'mysql': mysql_conn}
+    # MySQL 事件与飞书表格行只在本地缓冲，随节点报告返回主进程后批量提交
+    node_report = {KEY_HOST: host, KEY_HOSTNAME: hostname, 'profile': None, KEY_METRICS: {}, 'outbox': reporter.new_outbox()}
+    db_connections = {'sqlite': sqlite_conn, 'outbox': node_report['outbox']}
 
     # 1. 建立SSH连接
-    client, ssh_error = create_ssh_client(
-        host=host,
-        port=node_spec.get('port', 22),
-        username=node_spec.get('username'),
-        password=node_spec.get('password')
-    )
+    with tracing.span('connect'):
+        client, ssh_error = create_ssh_client(
+            host=host,
+            port=node_spec.get('port', 22),
+            username=node_spec.get('username'),
+            password=node_spec.get('password'),
+            timeout=node_spec.get('timeout', 10),
+            bastion=node_spec.get('bastion')
+        )
 
     if not client:
         LOG.error(f"[{hostname}] SSH 连接失败: {ssh_error}")
-        result = {KEY_HOST: host, KEY_HOSTNAME: hostname, KEY_TYPE: TYPE_SSH, KEY_EXTRA: ssh_error}
-        reporter.handle_failed_issue(sqlite_conn, mysql_conn, app_config, result)
+        metrics.inc('inspector_ssh_connect_failures_total')
+        result = IssueEvent(host, hostname, TYPE_SSH, extra=ssh_error)
+        reporter.handle_failed_issue(sqlite_conn, node_report['outbox'], app_config, result)
         if sqlite_conn: sqlite_conn.close()
-        if mysql_conn: mysql_conn.close()
-        return
+        return node_report
 
     try:
         # 2. 动态发现GPU厂商
-        profile_name = discover.discover_node_profile(client, hostname)
-        LOG.info(f"[{hostname}] 自动发现节点 Profile 为: '{profile_name}'")
+        with tracing.span('discover'):
+            profile_name = discover.discover_node_profile(client, hostname)
+        LOG.info(f"[{hostname}] 自动发现节点 Profile 为: '{profile_name}'", extra=logpipe.ROUTINE)
+        node_report['profile'] = profile_name
 
-        # 3. 根据厂商和任务类型选择正确的检查项
-        selected_profile_checks = all_profiles.get(profile_name, {})
-        checks_to_run = selected_profile_checks.get(runner_type, [])
+        # 3. 根据厂商和任务类型选择主进程预编译的执行计划
+        plan = _process_global_config['plans'].get(profile_name)
 
-        if not checks_to_run:
+        if not plan:
             LOG.warning(f"[{hostname}] 对于 Profile '{profile_name}' 和任务类型 '{runner_type}'，没有配置任何检查项，跳过。")
-            if client: client.close()
-            if sqlite_conn: sqlite_conn.close()
-            if mysql_conn: mysql_conn.close()
-            return
+            return node_report
 
-        # 4. 执行检查 (使用通用的runner)
-        check_results = runners.run_specific_checks(client, node_spec, thresholds, checks_to_run)
+        # 4. 执行检查 (使用通用的runner)；输出与上一轮稳定状态相同的检查项跳过解析与上报
+        fingerprint_config = runners.get_fingerprint_config(app_config)
+        fingerprints = None
+        if fingerprint_config['enabled'] and sqlite_conn:
+            fingerprints = {'previous': database.load_fingerprints(sqlite_conn, host, fingerprint_config['max_age_seconds']),
+                            'current': {}}
+        check_results = runners.run_plan(client, node_spec, thresholds, plan, fingerprints)
         
         # 5. 处理和上报结果
         if check_results:
-            reporter.process_results(node_spec, check_results, db_connections, app_config)
+            with tracing.span('report'):
+                settled = reporter.process_results(node_spec, check_results, db_connections, app_config)
+            for check_name, result in check_results.items():
+                if result.metrics:
+                    node_report[KEY_METRICS][check_name] = result.metrics
+            if fingerprints is not None:
+                # 带指标的检查项 (如 GPU 温度) 每轮都需要结果，不保存指纹
+                steady = {name: fingerprints['current'][name] for name in settled
+                          if name in fingerprints['current'] and not check_results[name].metrics}
+                database.save_fingerprints(sqlite_conn, host, steady,
+                                           [name for name in check_results if name in fingerprints['previous'] and name not in steady])
             
     except Exception as e:
         LOG.error(f"[{hostname}] 在执行巡检时发生未知异常: {e}", exc_info=True)
     finally:
         if client: client.close()
         if sqlite_conn: sqlite_conn.close()
-        if mysql_conn: mysql_conn.close()
-        LOG.info(f"[{hostname}] 节点处理完毕。")
+        LOG.info(f"[{hostname}] 节点处理完毕。", extra=logpipe.ROUTINE)
+    return node_report
+
 
+def select_nodes(node_specs, node_selection):
+    # 命令行 --hosts / --groups 指定的节点子集；每轮对当前清单应用，配置热加载后仍然有效
+    if node_selection and node_selection.get('hosts'):
+        node_specs = node_specs.select(hosts=node_selection['hosts'])
+    if node_selection and node_selection.get('groups'):
+        node_specs = node_specs.select(groups=node_selection['groups'])
+    return node_specs
 
-def run_inspection_cycle(runner_type, node_specs, all_profiles, app_config):
+def run_inspection_cycle(runner_type, node_specs, all_profiles, app_config, thresholds, event_sink, table_sync, shard=None,
+                         node_selection=None):
+    node_specs = select_nodes(node_specs, node_selection)
+    if shard:
+        node_specs = shard.select(node_specs)
+        hosts = set(node_specs.hosts())
+        issue_index.retain_hosts(hosts)
+        p3_digest.retain_hosts(hosts)
+        counters.retain_hosts(hosts)
     if not node_specs:
         LOG.warning("节点列表为空，跳过本轮巡检。")
-        return
+        return []
 
     LOG.info(f"====== 开始新一轮巡检 (任务类型: '{runner_type}') ... ======")
+    cycle_start = time.perf_counter()
     
-    config_payload = {
-        'runner_type': runner_type,
-        'all_profiles': all_profiles,
-        'app_config': app_config,
-        'thresholds': thresholds
-    }
+    with tracing.span(f"cycle {runner_type}", cat='cycle', nodes=len(node_specs)):
+        config_payload = {
+            'runner_type': runner_type,
+            'app_config': app_config,
+            'thresholds': thresholds,
+            'plans': runners.compile_plans(all_profiles, runner_type, thresholds, app_config)
+        }
     
-    with Pool(processes=app_config.get('MAX_WORKERS', 5),
-              initializer=init_worker, 
-              initargs=(config_payload,)) as pool:
-        pool.map(process_one_node, node_specs)
+        max_workers = app_config.get('MAX_WORKERS', 5)
+        node_reports = []
+        worker_memory = []
+        log_suppressed = 0
+        metrics.set_gauge('inspector_nodes_in_flight', min(max_workers, len(node_specs)), runner=runner_type)
+        memguard.before_fork()
+        try:
+            with metrics.timer('inspector_pool_start_seconds', runner=runner_type):
+                pool = Pool(processes=max_workers, initializer=init_worker, initargs=(config_payload,),
+                            maxtasksperchild=memguard.max_tasks_per_child())
+            with pool:
+                # 逐个接收节点报告，指标与事件在本轮进行中即可被汇总；节点字典由清单按需生成，不预先展开
+                for node_report in pool.imap_unordered(process_one_node, node_specs):
+                    node_reports.append(node_report)
+                    metrics.merge(node_report.get('timings'))
+                    metrics.inc('inspector_nodes_processed_total', runner=runner_type)
+                    metrics.set_gauge('inspector_nodes_in_flight', min(max_workers, len(node_specs) - len(node_reports)), runner=runner_type)
+                    dispatch_outbox(node_report['outbox'], event_sink, table_sync)
+                    tracing.extend(node_report.pop('spans', None))
+                    log_suppressed += node_report.pop('log_suppressed', 0)
+                    counters.merge(node_report.pop('counter_samples', None))
+                    worker_memory.append(node_report.pop('memory', (0, 0)))
+                # 正常关闭而不是 terminate，worker 退出前会把队列中缓冲的日志写完
+                pool.close()
+                pool.join()
+        finally:
+            memguard.after_pool()
+
+        if runner_type == 'gpu':
+            fleet_outbox = reporter.new_outbox()
+            with tracing.span('fleet_analysis', cat='cycle'):
+                run_fleet_analysis(node_specs, node_reports, app_config, thresholds, fleet_outbox)
+            dispatch_outbox(fleet_outbox, event_sink, table_sync)
+
+        with tracing.span('mysql_flush', cat='cycle'):
+            event_sink.flush()
+        p3_digest.save()
+
+    cycle_seconds = time.perf_counter() - cycle_start
+    metrics.observe('inspector_cycle_seconds', cycle_seconds, runner=runner_type)
+    metrics.set_gauge('inspector_cycle_last_seconds', round(cycle_seconds, 3), runner=runner_type)
+    metrics.inc('inspector_cycles_total', runner=runner_type)
+    tracing.export_cycle(runner_type, cycle_seconds)
+    memguard.observe_cycle(runner_type, worker_memory)
+    if log_suppressed:
+        metrics.inc('inspector_log_records_suppressed_total', log_suppressed)
     
-    LOG.info(f"====== 本轮巡检 (任务类型: '{runner_type}') 完成 ======")
+    LOG.info(f"====== 本轮巡检 (任务类型: '{runner_type}') 完成，耗时 {cycle_seconds:.1f} 秒，"
+             f"{len(node_reports)} 个节点，采样省略例行日志 {log_suppressed} 条 ======")
+    return node_reports
 
-def run_p3_summary_job(app_config):
-    LOG.info("开始执行每日P3汇总任务...")
-    db_conn = database.init_sqlite(app_config.get('SQLITE_DB_PATH'))
-    if not db_conn:
-        LOG.error("无法为P3汇总任务创建数据库连接，任务跳过。")
+def dispatch_outbox(outbox, event_sink, table_sync):
+    event_sink.extend(outbox['events'])
+    table_sync.extend(outbox['table_rows'])
+    issue_index.apply(outbox['issues'])
+    p3_digest.add(outbox['digest'])
+
+def run_fleet_analysis(node_specs, node_reports, app_config, thresholds, outbox):
+    try:
+        analysis = fleet.analyze_gpu_temperatures(node_reports, thresholds)
+    except Exception as e:
+        LOG.error(f"集群 GPU 温度离群分析失败: {e}", exc_info=True)
         return
-        
+    if not analysis:
+        return
+
+    sqlite_conn = database.init_sqlite(app_config.get('SQLITE_DB_PATH'))
+    db_connections = {'sqlite': sqlite_conn, 'outbox': outbox}
     try:
-        reporter.send_daily_p3_summary(db_conn, app_config)
+        for node_report, result in analysis:
+            node_spec = node_specs.find(node_report[KEY_HOST]) or node_report
+            reporter.process_results(node_spec, {fleet.FLEET_CHECK_NAME: result}, db_connections, app_config)
+    finally:
+        if sqlite_conn: sqlite_conn.close()
+
+def run_p3_summary_job(app_config, instance_label=None):
+    LOG.info("开始执行每日P3汇总任务...")
+    try:
+        reporter.send_daily_p3_summary(app_config, instance_label)
     except Exception as e:
         LOG.error(f"执行P3汇总任务时出错: {e}", exc_info=True)
-    finally:
-        if db_conn:
-            db_conn.close()
-            LOG.info("P3汇总任务完成，数据库连接已关闭。")
+
+def run_scheduled_cycle(runner_type, task_args):
+    # 定时任务每次执行时从 task_args 取最新配置，热加载后下一轮即生效
+    return run_inspection_cycle(runner_type=runner_type, **task_args)
+
+def run_scheduled_p3_summary(task_args):
+    # 摘要只包含本实例巡检的节点，分片模式下每个实例各自发送并在标题中注明实例
+    shard = task_args.get('shard')
+    return run_p3_summary_job(task_args['app_config'], shard.instance_id if shard else None)
+
+def run_scheduled_db_maintenance(task_args):
+    # 分片实例共享状态库，只由一个实例执行维护
+    shard = task_args.get('shard')
+    if shard and not shard.owns('__db_maintenance__'):
+        LOG.info("状态库维护由其他分片实例负责，本实例跳过。")
+        return
+    app_config = task_args['app_config']
+    db_maintenance.run_maintenance(app_config.get('SQLITE_DB_PATH'), app_config.get('STATUS_DB_MAINTENANCE'))
+
+def schedule_jobs(task_args):
+    schedule.clear()
+    app_config = task_args['app_config']
+
+    gpu_interval = app_config.get('GPU_CHECK_INTERVAL_SECONDS', 30)
+    schedule.every(gpu_interval).seconds.do(run_scheduled_cycle, runner_type='gpu', task_args=task_args)
+    LOG.info(f"已安排高频 GPU 检查，每 {gpu_interval} 秒执行一次。")
+
+    sys_interval = app_config.get('SYSTEM_CHECK_INTERVAL_MINUTES', 10)
+    schedule.every(sys_interval).minutes.do(run_scheduled_cycle, runner_type='system', task_args=task_args)
+    LOG.info(f"已安排低频系统检查，每 {sys_interval} 分钟执行一次。")
+
+    # 安排每日 P3 汇总报告任务
+    schedule.every().day.at("09:00").do(run_scheduled_p3_summary, task_args=task_args)
+    LOG.info("已安排每日P3汇总报告任务，将于每天09:00执行。")
+
+    # 安排每日状态库维护 (归档、增量回收、统计信息)
+    maintenance_at = (app_config.get('STATUS_DB_MAINTENANCE') or {}).get('at', db_maintenance.DEFAULT_MAINTENANCE_CONFIG['at'])
+    schedule.every().day.at(maintenance_at).do(run_scheduled_db_maintenance, task_args=task_args)
+    LOG.info(f"已安排每日状态库维护任务，将于每天{maintenance_at}执行。")
+
+def apply_config_changes(task_args, new_configs, diff):
+    LOG.info(f"应用新配置: {config.describe_diff(diff)}")
+    if diff['nodes_removed']:
+        LOG.info(f"以下节点已从巡检列表移除，其历史告警状态保留在 SQLite 中: {', '.join(diff['nodes_removed'])}")
+
+    # 1. 节点、Profile、阈值: 每轮巡检都会重新下发给 worker，替换引用即可；命令行指定的节点子集在每轮巡检时重新应用
+    task_args['node_specs'] = new_configs.get('nodes', [])
+    task_args['all_profiles'] = new_configs.get('profiles', {})
+    task_args['thresholds'] = new_configs.get('thresholds', {})
+    task_args['app_config'] = new_configs
+
+    if diff['profiles_changed'] or diff['thresholds_changed']:
+        runners.clear_plan_cache()
+
+    # 2. 应用级配置: 只重建受影响的组件
+    changed = set(diff['app_changed'])
+    if changed & {'FEISHU_WEBHOOKS', 'FEISHU_RATE_LIMIT'}:
+        reporter.configure_webhooks(new_configs)
+    if changed & {'FEISHU_WEBHOOKS', 'TABLE_SYNC_BATCH_SIZE', 'TABLE_SYNC_FLUSH_SECONDS'}:
+        task_args['table_sync'].flush()
+        task_args['table_sync'] = reporter.TableSyncBatcher(new_configs)
+    if 'TRACE' in changed:
+        tracing.configure(new_configs.get('TRACE'))
+    if 'MEMORY_GUARD' in changed:
+        memguard.configure(new_configs.get('MEMORY_GUARD'))
+    if changed & {'GPU_CHECK_INTERVAL_SECONDS', 'SYSTEM_CHECK_INTERVAL_MINUTES', 'STATUS_DB_MAINTENANCE'}:
+        schedule_jobs(task_args)
+    restart_keys = changed & set(config.RESTART_REQUIRED_KEYS)
+    if restart_keys:
+        LOG.warning(f"以下配置项需要重启程序才能生效: {', '.join(sorted(restart_keys))}")
+
+def restart_engine(task_args):
+    # 主进程内存超限: 提交缓冲中的事件与表格行、保存 P3 摘要后重新执行自身。
+    # 告警状态在状态库中，重启后 issue_index 与 P3 摘要从状态库和快照恢复；分片实例 ID 不变，租约由新进程续期
+    LOG.warning("巡检引擎内存超限，提交缓冲数据后重启...")
+    task_args['table_sync'].flush()
+    task_args['event_sink'].flush()
+    p3_digest.save()
+    logpipe.stop()
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+def record_schedule_lag():
+    # 在任务执行前记录其相对计划时间的延迟，持续为正说明巡检周期跟不上配置的间隔
+    now = datetime.now()
+    for job in schedule.get_jobs():
+        if job.should_run:
+            runner = job.job_func.keywords.get('runner_type', job.job_func.__name__)
+            metrics.set_gauge('inspector_cycle_lag_seconds', round((now - job.next_run).total_seconds(), 3), runner=runner)
+
+def _find_node_spec(node_specs, host):
+    # 不在清单中的节点使用 ssh_defaults 与 nodes.yaml 的 defaults，未配置密码时由 paramiko 使用本地密钥
+    return node_specs.find(host) or node_specs.default_spec(host)
+
+def _print_check_results(output):
+    print(f"{output['hostname']} ({output['host']})  profile={output['profile']}  runner={output['runner']}  "
+          f"耗时 {output['elapsed_seconds']}s")
+    if output.get('error'):
+        print(f"  [ERROR] {output['error']}")
+    for check_name, result in output['results'].items():
+        if result.success:
+            print(f"  [ OK ] {check_name}")
+        else:
+            print(f"  [FAIL] {check_name}: {result.type} - {result.extra}")
+
+def run_one_shot_check(args):
+    # 单节点即时检查: 不启动调度器、进程池和启动全量巡检，默认不写状态库、不发送告警
+    log_level = 'DEBUG' if args.verbose else 'WARNING'
+    StreamHandler(sys.stderr, level=log_level, format_string='[{record.time:%H:%M:%S}] {record.level_name}: {record.message}').push_application()
+    start = time.perf_counter()
+
+    all_configs = config.load_all_configs()
+    if not all_configs:
+        return 2
+    thresholds = all_configs.get('thresholds', {})
+    node_spec = _find_node_spec(all_configs['nodes'], args.host)
+    ssh_client.configure_bastions(all_configs.get('BASTIONS'))
+    hostname = node_spec.get('hostname', node_spec['host'])
+    output = {'host': node_spec['host'], 'hostname': hostname, 'runner': args.runner, 'profile': args.profile,
+              'results': {}, 'error': None}
+
+    client, ssh_error = create_ssh_client(host=node_spec['host'], port=node_spec.get('port', 22),
+                                          username=node_spec.get('username'), password=node_spec.get('password'),
+                                          timeout=node_spec.get('timeout', 10), bastion=node_spec.get('bastion'), retries=1)
+    if not client:
+        output['error'] = f"SSH 连接失败: {ssh_error}"
+        output['results'][TYPE_SSH] = CheckResult(node_spec['host'], hostname, TYPE_SSH, ssh_error, False)
+    else:
+        try:
+            if not output['profile']:
+                output['profile'] = discover.discover_node_profile(client, hostname)
+            if args.checks:
+                checks_to_run = [c.strip() for c in args.checks.split(',') if c.strip()]
+            else:
+                checks_to_run = all_configs.get('profiles', {}).get(output['profile'], {}).get('checks', {}).get(args.runner, [])
+            plan = runners.get_plan(output['profile'], args.runner, checks_to_run, thresholds)
+            output['results'] = runners.run_plan(client, node_spec, thresholds, plan)
+        finally:
+            client.close()
+
+    if args.report and output['results']:
+        sqlite_conn = database.init_sqlite(all_configs.get('SQLITE_DB_PATH'))
+        reporter.configure_webhooks(all_configs)
+        db_connections = {'sqlite': sqlite_conn, 'outbox': reporter.new_outbox()}
+        try:
+            if client:
+                reporter.process_results(node_spec, output['results'], db_connections, all_configs)
+            else:
+                reporter.handle_failed_issue(sqlite_conn, db_connections['outbox'], all_configs,
+                                             IssueEvent(node_spec['host'], hostname, TYPE_SSH, extra=ssh_error))
+            table_sync = reporter.TableSyncBatcher(all_configs)
+            table_sync.extend(db_connections['outbox']['table_rows'])
+            table_sync.flush()
+            event_sink = database.MySQLEventSink(all_configs.get('MYSQL'), spool_path=all_configs.get('MYSQL_SPOOL_PATH', 'data/mysql_spool.jsonl'))
+            event_sink.extend(db_connections['outbox']['events'])
+            event_sink.close()
+        finally:
+            if sqlite_conn: sqlite_conn.close()
+
+    output['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+    if args.json:
+        print(json.dumps(output, ensure_ascii=False, indent=2, default=lambda o: o.to_dict() if isinstance(o, CheckResult) else str(o)))
+    else:
+        _print_check_results(output)
+
+    if output['error']:
+        return 2
+    return 0 if all(r.success for r in output['results'].values()) else 1
+
+def run_capacity_plan(args):
+    # 容量规划 (dry-run): 不启动调度器与进程池，按录制语料与/或采样节点的实测耗时预测每轮巡检耗时与所需并发
+    log_level = 'DEBUG' if args.verbose else 'WARNING'
+    StreamHandler(sys.stderr, level=log_level, format_string='[{record.time:%H:%M:%S}] {record.level_name}: {record.message}').push_application()
+
+    all_configs = config.load_all_configs()
+    if not all_configs:
+        return 2
+    node_specs = all_configs['nodes']
+    all_profiles = all_configs.get('profiles', {})
+    thresholds = all_configs.get('thresholds', {})
+    node_specs = select_nodes(node_specs, parse_node_selection(args))
+    if not node_specs and not args.add_nodes:
+        print("没有匹配的节点。", file=sys.stderr)
+        return 2
+    runner_types = [r.strip() for r in args.runner.split(',') if r.strip()] if args.runner else None
+
+    observations = planner.new_observations()
+    corpus_dir = args.corpus or all_configs.get('SSH_RECORD_DIR')
+    if corpus_dir and os.path.isdir(corpus_dir):
+        planner.observe_corpus(observations, replay.load_corpus(corpus_dir), all_profiles, thresholds,
+                               runner_types or list(planner.runner_intervals(all_configs)))
+    elif args.corpus:
+        print(f"录制语料目录不存在: {args.corpus}", file=sys.stderr)
+        return 2
+    if args.sample:
+        ssh_client.configure_bastions(all_configs.get('BASTIONS'))
+        planner.observe_sample(observations, node_specs, all_profiles, thresholds,
+                               runner_types or list(planner.runner_intervals(all_configs)), args.sample, args.seed)
+
+    report = planner.plan_capacity(node_specs, all_profiles, thresholds, all_configs, observations, runner_types=runner_types,
+                                   max_workers=args.workers, shards=args.shards, headroom=args.headroom, extra_nodes=args.add_nodes)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(planner.format_report(report))
+    overrun = any(entry['required_workers'] is None or entry['predicted_cycle_seconds'] > entry['interval_seconds'] * args.headroom
+                  for entry in report['runners'].values())
+    return 1 if overrun else 0
+
+def parse_node_selection(args):
+    return {'hosts': {h.strip() for h in args.hosts.split(',') if h.strip()} if args.hosts else None,
+            'groups': {g.strip() for g in args.groups.split(',') if g.strip()} if args.groups else None}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GPU 节点巡检程序")
+    parser.add_argument('--hosts', help="只巡检指定节点 (host 或 hostname，逗号分隔)")
+    parser.add_argument('--groups', help="只巡检 nodes.yaml 中这些分组的节点 (逗号分隔)")
+    subparsers = parser.add_subparsers(dest='command')
+
+    check_parser = subparsers.add_parser('check', help="对单个节点立即执行一次检查并输出结果")
+    check_parser.add_argument('--host', required=True, help="节点 host 或 hostname，不在 nodes.yaml 中时使用 ssh_defaults")
+    check_parser.add_argument('--runner', default='gpu', choices=['gpu', 'system', 'network', 'storage'])
+    check_parser.add_argument('--profile', help="跳过自动发现，直接使用该 Profile")
+    check_parser.add_argument('--checks', help="只执行这些检查项 (逗号分隔)，覆盖 Profile 中的配置")
+    check_parser.add_argument('--report', action='store_true', help="同时写入状态库并按正常流程发送告警")
+    check_parser.add_argument('--json', action='store_true', help="以 JSON 输出结果")
+    check_parser.add_argument('-v', '--verbose', action='store_true', help="输出调试日志")
+
+    plan_parser = subparsers.add_parser('plan', help="容量规划: 预测每轮巡检耗时、所需 worker 与分片数，不执行巡检")
+    plan_parser.add_argument('--corpus', help="命令录制目录 (默认 SSH_RECORD_DIR)，按其中的命令耗时估算")
+    plan_parser.add_argument('--sample', type=int, default=0, help="随机采样 N 个节点实测连接、自动发现与检查命令耗时")
+    plan_parser.add_argument('--seed', type=int, help="采样随机种子")
+    plan_parser.add_argument('--runner', help="只规划这些定时任务 (逗号分隔，gpu/system)")
+    plan_parser.add_argument('--workers', type=int, help="假设的 MAX_WORKERS (默认取配置)")
+    plan_parser.add_argument('--shards', type=int, help="假设的分片实例数 (默认取 SHARDING.instances)")
+    plan_parser.add_argument('--add-nodes', type=int, default=0, help="假设再增加 N 个节点 (按当前 Profile 分布)")
+    plan_parser.add_argument('--headroom', type=float, default=planner.DEFAULT_HEADROOM, help="一轮巡检最多占用间隔的比例")
+    plan_parser.add_argument('--json', action='store_true', help="以 JSON 输出结果")
+    plan_parser.add_argument('-v', '--verbose', action='store_true', help="输出调试日志")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    if args.command == 'check':
+        sys.exit(run_one_shot_check(args))
+    if args.command == 'plan':
+        sys.exit(run_capacity_plan(args))
+
     LOG = setup_logging()
     LOG.info("========= GPU 节点巡检程序启动 =========")
     
@@ -132,43 +495,66 @@ def main():
     if not all_configs:
         LOG.critical("配置文件加载失败，程序退出。")
         sys.exit(1)
+    # 配置加载后切换到非阻塞日志管道: 主进程与 worker 只入队，由写线程输出到控制台与 JSON 行文件
+    logpipe.start(all_configs.get('LOGGING'))
     
-    node_specs = all_configs.get('nodes', [])
+    node_specs = all_configs['nodes']
     all_profiles = all_configs.get('profiles', {})
     thresholds = all_configs.get('thresholds', {}) 
     app_config = all_configs
 
-    if not node_specs:
+    node_selection = parse_node_selection(args)
+    if not select_nodes(node_specs, node_selection):
         LOG.critical("在 nodes.yaml 中未找到任何节点配置 (nodes)，程序退出。")
         sys.exit(1)
     if not all_profiles:
         LOG.critical("在 profiles.yaml 中未找到任何策略配置 (profiles)，程序退出。")
         sys.exit(1)
 
-    # 2. 初始化数据库连接
-    database.init_sqlite(all_configs.get('SQLITE_DB_PATH'))
+    # 2. 初始化数据库连接，并从状态库加载一次当前故障作为内存视图的起点
+    sqlite_conn = database.init_sqlite(all_configs.get('SQLITE_DB_PATH'))
+    if sqlite_conn:
+        issue_index.load(database.query_active_issues(sqlite_conn))
+        p3_types = [issue_type for issue_type, meta in ALERT_METADATA.items() if meta['priority'] == P3]
+        p3_digest.load(all_configs, database.query_active_issues_by_types(sqlite_conn, p3_types))
+        sqlite_conn.close()
     database.init_mysql(all_configs.get('MYSQL'))
+    event_sink = database.MySQLEventSink(
+        all_configs.get('MYSQL'),
+        spool_path=all_configs.get('MYSQL_SPOOL_PATH', 'data/mysql_spool.jsonl'),
+        batch_size=all_configs.get('MYSQL_BATCH_SIZE', 500)
+    )
+    reporter.configure_webhooks(all_configs)
+    table_sync = reporter.TableSyncBatcher(all_configs)
+    ssh_client.configure_bastions(all_configs.get('BASTIONS'))
+    httpd.start_server(all_configs.get('METRICS_LISTEN', '127.0.0.1:9109'))
+    tracing.configure(all_configs.get('TRACE'))
+    memguard.configure(all_configs.get('MEMORY_GUARD'))
+    shard = None
+    if all_configs.get('SHARDING'):
+        try:
+            shard = sharding.ShardCoordinator(all_configs['SHARDING']).start()
+        except (KeyError, ValueError) as e:
+            LOG.critical(f"分片配置 (SHARDING) 错误: {e}，程序退出。")
+            sys.exit(1)
 
     # 3. 准备调度任务的通用参数
     task_args = {
         'node_specs': node_specs,
         'all_profiles': all_profiles,
         'app_config': app_config,
-        'thresholds': thresholds
+        'thresholds': thresholds,
+        'event_sink': event_sink,
+        'table_sync': table_sync,
+        'shard': shard,
+        'node_selection': node_selection
     }
 
     # 4. 安排定时任务
-    gpu_interval = app_config.get('GPU_CHECK_INTERVAL_SECONDS', 30)
-    schedule.every(gpu_interval).seconds.do(run_inspection_cycle, runner_type='gpu', **task_args)
-    LOG.info(f"已安排高频 GPU 检查，每 {gpu_interval} 秒执行一次。")
-
-    sys_interval = app_config.get('SYSTEM_CHECK_INTERVAL_MINUTES', 10)
-    schedule.every(sys_interval).minutes.do(run_inspection_cycle, runner_type='system', **task_args)
-    LOG.info(f"已安排低频系统检查，每 {sys_interval} 分钟执行一次。")
-
-    # 安排每日 P3 汇总报告任务
-    schedule.every().day.at("09:00").do(run_p3_summary_job, app_config=app_config)
-    LOG.info("已安排每日P3汇总报告任务，将于每天09:00执行。")
+    schedule_jobs(task_args)
+    config_watcher = config.ConfigWatcher(all_configs, known_checks=set(runners.CHECK_REGISTRY))
+    reload_interval = app_config.get('CONFIG_RELOAD_INTERVAL_SECONDS', 10)
+    last_reload_check = time.monotonic()
     
     LOG.info("程序启动，立即执行一次全量检查...")
     run_inspection_cycle(runner_type='gpu', **task_args)
@@ -179,12 +565,26 @@ def main():
     LOG.info("所有任务已调度，进入主循环... (按 Ctrl+C 退出)")
     try:
         while True:
+            # schedule 串行执行任务，两次 run_pending 之间即为巡检周期边界，在此应用新配置
+            if reload_interval and time.monotonic() - last_reload_check >= reload_interval:
+                last_reload_check = time.monotonic()
+                new_configs, diff = config_watcher.poll()
+                if new_configs:
+                    apply_config_changes(task_args, new_configs, diff)
+            record_schedule_lag()
             schedule.run_pending()
+            task_args['table_sync'].flush_if_due()
+            if memguard.restart_requested():
+                restart_engine(task_args)
             time.sleep(1)
     except KeyboardInterrupt:
         LOG.info("收到退出信号 (Ctrl+C)...")
     finally:
         LOG.info("正在关闭数据库连接...")
+        event_sink.close()
+        task_args['table_sync'].flush()
+        p3_digest.save()
+        if shard: shard.stop()
         LOG.info("程序已退出。")
 
 
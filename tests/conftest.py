@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+@pytest.fixture
+def repo_cwd(monkeypatch):
+    # 配置文件按相对路径 configs/ 加载
+    monkeypatch.chdir(REPO_ROOT)
+    return REPO_ROOT
@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from core import inventory
+from conftest import REPO_ROOT
+
+@pytest.fixture(scope='module')
+def checker():
+    spec = importlib.util.spec_from_file_location("gpu_node_checker", os.path.join(REPO_ROOT, "gpu-node-checker.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["gpu_node_checker"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def _inventory(hosts):
+    return inventory.from_specs([{'host': host} for host in hosts])
+
+def _grouped_inventory(groups):
+    return inventory.load_inventory({'groups': {name: {'hosts': hosts} for name, hosts in groups.items()}})
+
+def _no_diff():
+    return {'nodes_added': [], 'nodes_removed': [], 'nodes_changed': [], 'profiles_changed': [],
+            'thresholds_changed': [], 'app_changed': []}
+
+def test_host_selection_survives_reload(checker):
+    args = checker.parse_args(['--hosts', '10.0.0.1, 10.0.0.3'])
+    task_args = {'node_specs': _inventory(['10.0.0.1', '10.0.0.2']), 'node_selection': checker.parse_node_selection(args)}
+    new_configs = {'nodes': _inventory(['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4']), 'profiles': {}, 'thresholds': {}}
+
+    checker.apply_config_changes(task_args, new_configs, {**_no_diff(), 'nodes_added': ['10.0.0.3', '10.0.0.4']})
+    selected = checker.select_nodes(task_args['node_specs'], task_args['node_selection'])
+    assert sorted(selected.hosts()) == ['10.0.0.1', '10.0.0.3']
+
+def test_no_selection_keeps_inventory(checker):
+    nodes = _inventory(['10.0.0.1', '10.0.0.2'])
+    assert checker.select_nodes(nodes, checker.parse_node_selection(checker.parse_args([]))) is nodes
+
+def test_group_selection_survives_reload(checker):
+    args = checker.parse_args(['--groups', 'rack-a'])
+    task_args = {'node_specs': _grouped_inventory({'rack-a': ['10.0.1.1'], 'rack-b': ['10.0.2.1']}),
+                 'node_selection': checker.parse_node_selection(args)}
+    new_configs = {'nodes': _grouped_inventory({'rack-a': ['10.0.1.1', '10.0.1.2'], 'rack-b': ['10.0.2.1', '10.0.2.2']}),
+                   'profiles': {}, 'thresholds': {}}
+
+    checker.apply_config_changes(task_args, new_configs, {**_no_diff(), 'nodes_added': ['10.0.1.2', '10.0.2.2']})
+    selected = checker.select_nodes(task_args['node_specs'], task_args['node_selection'])
+    assert sorted(selected.hosts()) == ['10.0.1.1', '10.0.1.2']
@@ -0,0 +1,74 @@
+import os
+import shutil
+
+from core import config, inventory, runners
+
+def _copy_configs(repo_root, tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(repo_root, config.CONFIG_DIR), tmp_path / config.CONFIG_DIR)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / config.CONFIG_DIR
+
+def test_shipped_configs_are_valid(repo_cwd):
+    all_configs = config.load_all_configs()
+    assert all_configs is not None
+    assert config.validate_configs(all_configs, known_checks=set(runners.CHECK_REGISTRY)) == []
+
+def test_validate_reports_each_problem(repo_cwd):
+    all_configs = config.load_all_configs()
+    broken = {**all_configs,
+              'nodes': inventory.load_inventory({'nodes': [{'host': 'a'}, {'hostname': 'no-host'}, {'host': 'a'}]}),
+              'profiles': {**all_configs['profiles'], 'bad': {'checks': {'gpu': ['no_such_check']}}},
+              'thresholds': {**all_configs['thresholds'], 'gpu_count': [8]}}
+    errors = config.validate_configs(broken, known_checks=set(runners.CHECK_REGISTRY))
+    assert errors == ["nodes.yaml 第 2 个节点缺少 host", "nodes.yaml 第 3 个节点 a 重复",
+                      "Profile 'bad' 引用了未注册的检查项 'no_such_check'", "阈值 'gpu_count' 不是标量"]
+
+def test_threshold_maps_must_be_numeric(repo_cwd):
+    all_configs = config.load_all_configs()
+    thresholds = {**all_configs['thresholds'], 'ib_link_error_per_min': {'symbol_error': 'ten'}, 'gpu_count': [8]}
+    errors = config.validate_configs({**all_configs, 'thresholds': thresholds})
+    assert "阈值 'ib_link_error_per_min.symbol_error' 不是数值" in errors
+    assert "阈值 'gpu_count' 不是标量" in errors
+
+def test_diff_configs_reports_each_section():
+    old = {'nodes': [{'host': 'a', 'port': 22}, {'host': 'b'}], 'profiles': {'p': {'checks': {}}},
+           'thresholds': {'disk_usage_percent': 80}, 'INTERVAL': 60}
+    new = {'nodes': [{'host': 'a', 'port': 2222}, {'host': 'c'}], 'profiles': {'p': {'checks': {}}},
+           'thresholds': {'disk_usage_percent': 90}, 'INTERVAL': 30}
+    diff = config.diff_configs(old, new)
+    assert diff == {'nodes_added': ['c'], 'nodes_removed': ['b'], 'nodes_changed': ['a'], 'profiles_changed': [],
+                    'thresholds_changed': ['disk_usage_percent'], 'app_changed': ['INTERVAL']}
+    assert config.describe_diff(diff) == ("nodes_added=c; nodes_removed=b; nodes_changed=a; "
+                                          "thresholds_changed=disk_usage_percent; app_changed=INTERVAL")
+    assert config.describe_diff(config.diff_configs(old, old)) == '无变化'
+
+def test_watcher_applies_valid_change(repo_cwd, tmp_path, monkeypatch):
+    config_dir = _copy_configs(repo_cwd, tmp_path, monkeypatch)
+    watcher = config.ConfigWatcher(config.load_all_configs())
+    assert watcher.poll() == (None, None)
+
+    path = config_dir / 'thresholds.yaml'
+    path.write_text(path.read_text(encoding='utf-8').replace('disk_usage_percent: 80', 'disk_usage_percent: 85'),
+                    encoding='utf-8')
+    new_configs, diff = watcher.poll()
+    assert new_configs['thresholds']['disk_usage_percent'] == 85
+    assert diff['thresholds_changed'] == ['disk_usage_percent']
+    assert watcher.current is new_configs
+    assert watcher.poll() == (None, None)
+
+def test_watcher_keeps_current_config_when_invalid(repo_cwd, tmp_path, monkeypatch):
+    config_dir = _copy_configs(repo_cwd, tmp_path, monkeypatch)
+    current = config.load_all_configs()
+    watcher = config.ConfigWatcher(current, known_checks=set(runners.CHECK_REGISTRY))
+    (config_dir / 'nodes.yaml').write_text("nodes: []\n", encoding='utf-8')
+    assert watcher.poll() == (None, None)
+    assert watcher.current is current
+    # 同一个无效版本不会在下一轮重复加载
+    assert watcher.poll() == (None, None)
+
+def test_watcher_ignores_touch_without_content_change(repo_cwd, tmp_path, monkeypatch):
+    config_dir = _copy_configs(repo_cwd, tmp_path, monkeypatch)
+    watcher = config.ConfigWatcher(config.load_all_configs())
+    path = config_dir / 'profiles.yaml'
+    path.write_text(path.read_text(encoding='utf-8') + "\n# 注释\n", encoding='utf-8')
+    assert watcher.poll() == (None, None)
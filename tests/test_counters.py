@@ -0,0 +1,68 @@
+import pytest
+
+from core import counters
+
+@pytest.fixture(autouse=True)
+def clean_samples():
+    counters._SAMPLES.clear()
+    counters._PENDING.clear()
+    yield
+    counters._SAMPLES.clear()
+    counters._PENDING.clear()
+
+def _observe(host, timestamp, values, boot_id='boot-1', widths=None):
+    rates = counters.observe(host, timestamp, boot_id, values, widths)
+    counters.merge(counters.drain())
+    return rates
+
+def test_counter_delta_increase():
+    assert counters.counter_delta(100, 250) == (150, 'ok')
+
+def test_counter_delta_reset_on_64_bit_counter():
+    # 64 位计数器从 3e9 降到 100 是清零，不是 32 位回绕
+    assert counters.counter_delta(3_000_000_000, 100) == (100, 'reset')
+
+def test_counter_delta_wrap():
+    assert counters.counter_delta((1 << 64) - 10, 5) == (15, 'wrap')
+    assert counters.counter_delta((1 << 32) - 10, 5, 32) == (15, 'wrap')
+    # 32 位计数器从低位下降仍是清零
+    assert counters.counter_delta(1000, 5, 32) == (5, 'reset')
+
+def test_counter_delta_saturation():
+    assert counters.counter_delta(65000, 65535, 16, True) == (None, 'saturated')
+    assert counters.counter_delta(200, 20, 16, True) == (20, 'reset')
+
+def test_first_sample_is_baseline_then_rates():
+    assert _observe('n1', 1000.0, {'a': 100}) is None
+    rates = _observe('n1', 1010.0, {'a': 600})
+    assert rates['interval'] == 10.0
+    assert rates['deltas'] == {'a': 500}
+    assert rates['rates'] == {'a': 50.0}
+
+def test_reset_and_saturation_reported():
+    widths = {'err': (16, True)}
+    _observe('n1', 1000.0, {'data': 3_000_000_000, 'err': 65000}, widths=widths)
+    rates = _observe('n1', 1060.0, {'data': 100, 'err': 65535}, widths=widths)
+    assert rates['resets'] == ['data'] and rates['deltas']['data'] == 100
+    assert rates['saturated'] == ['err'] and 'err' not in rates['deltas']
+
+def test_boot_id_change_starts_new_baseline():
+    _observe('n1', 1000.0, {'a': 100})
+    assert _observe('n1', 1010.0, {'a': 5}, boot_id='boot-2') is None
+    assert _observe('n1', 1020.0, {'a': 25}, boot_id='boot-2')['deltas'] == {'a': 20}
+
+def test_stale_or_backwards_interval_starts_new_baseline():
+    _observe('n1', 1000.0, {'a': 100})
+    assert _observe('n1', 1000.0 + counters.MAX_INTERVAL_SECONDS + 1, {'a': 200}) is None
+    assert _observe('n1', 500.0, {'a': 300}) is None
+
+def test_new_counter_has_no_delta_until_seen_twice():
+    _observe('n1', 1000.0, {'a': 1})
+    rates = _observe('n1', 1010.0, {'a': 2, 'b': 7})
+    assert rates['deltas'] == {'a': 1}
+
+def test_retain_hosts():
+    _observe('n1', 1000.0, {'a': 1})
+    _observe('n2', 1000.0, {'a': 1})
+    counters.retain_hosts({'n2'})
+    assert set(counters._SAMPLES) == {'n2'}
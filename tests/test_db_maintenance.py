@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from core import database, db_maintenance, transitions
+from core.models import TABLE_NAME
+
+def _ago(days):
+    return (datetime.now(timezone(timedelta(hours=8))) - timedelta(days=days)).isoformat()
+
+def _insert(conn, host, status, update_at, issue_type='gpu.temp'):
+    with conn:
+        conn.execute(f"INSERT INTO {TABLE_NAME} (host, hostname, type, extra, status, priority, create_at, update_at) "
+                     f"VALUES (?, ?, ?, '', ?, 'P2', ?, ?)", (host, host, issue_type, status, update_at, update_at))
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'status.db')
+    conn = database.init_sqlite(path)
+    _insert(conn, 'old-resolved', transitions.STATUS_RESOLVED, _ago(40))
+    _insert(conn, 'new-resolved', transitions.STATUS_RESOLVED, _ago(1))
+    _insert(conn, 'old-reported', transitions.STATUS_REPORTED, _ago(40))
+    _insert(conn, 'old-flapping', transitions.STATUS_FLAPPING, _ago(40), issue_type='gpu.xid_info')
+    conn.close()
+    return path
+
+def _hosts(conn, table):
+    return sorted(row[0] for row in conn.execute(f"SELECT host FROM {table}"))
+
+def test_archive_moves_only_expired_resolved_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    assert db_maintenance.archive_resolved(conn, retention_days=30, history_days=365) == (1, 0)
+    assert _hosts(conn, TABLE_NAME) == ['new-resolved', 'old-flapping', 'old-reported']
+    assert _hosts(conn, db_maintenance.HISTORY_TABLE) == ['old-resolved']
+    # 再次执行不会重复归档
+    assert db_maintenance.archive_resolved(conn, retention_days=30, history_days=365) == (0, 0)
+    conn.close()
+
+def test_history_purged_after_history_days(db_path):
+    conn = sqlite3.connect(db_path)
+    db_maintenance.archive_resolved(conn, retention_days=30, history_days=0)
+    with conn:
+        conn.execute(f"UPDATE {db_maintenance.HISTORY_TABLE} SET archived_at = ?", (_ago(400),))
+    assert db_maintenance.archive_resolved(conn, retention_days=30, history_days=0) == (0, 0)
+    assert db_maintenance.archive_resolved(conn, retention_days=30, history_days=365) == (0, 1)
+    assert _hosts(conn, db_maintenance.HISTORY_TABLE) == []
+    conn.close()
+
+def test_run_maintenance_switches_to_incremental_vacuum(db_path):
+    stats = db_maintenance.run_maintenance(db_path, {'retention_days': 30})
+    assert stats['archived'] == 1
+    assert stats['status_rows'] == 3 and stats['active_rows'] == 2 and stats['history_rows'] == 1
+    assert isinstance(stats['active_query_uses_index'], bool)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+    assert db_maintenance.run_maintenance(db_path)['archived'] == 0
+
+def test_run_maintenance_without_database(tmp_path):
+    assert db_maintenance.run_maintenance(str(tmp_path / 'missing' / 'status.db')) is None
@@ -0,0 +1,25 @@
+from core import fleet
+from core.models import KEY_METRICS, TYPE_GPU_TEMP_OUTLIER
+
+THRESHOLDS = {'fleet_temp_zscore': 3.0, 'fleet_temp_node_spread': 15, 'fleet_min_profile_gpus': 16}
+
+def _reports(hot_temp):
+    reports = [{'host': f'10.0.0.{i}', 'hostname': f'node{i}', 'profile': 'a100',
+                KEY_METRICS: {'gpu.temperature': {'gpu_temp': [60 + (i + g) % 3 for g in range(8)]}}} for i in range(8)]
+    reports[0][KEY_METRICS]['gpu.temperature']['gpu_temp'][3] = hot_temp
+    return reports
+
+def test_outlier_extra_is_stable_across_cycles():
+    first = fleet.analyze_gpu_temperatures(_reports(91), THRESHOLDS)
+    second = fleet.analyze_gpu_temperatures(_reports(93), THRESHOLDS)
+    failed = [(report['host'], result) for report, result in first if not result.success]
+    assert [host for host, _ in failed] == ['10.0.0.0']
+    result = failed[0][1]
+    assert result.type == TYPE_GPU_TEMP_OUTLIER
+    assert "GPU-3 at 90-94C (z-score, node spread)" in result.extra and "z=" not in result.extra
+    assert second[0][1].extra == result.extra
+
+def test_small_profile_only_reports_node_spread():
+    reports = _reports(91)[:1]
+    (_, result), = fleet.analyze_gpu_temperatures(reports, THRESHOLDS)
+    assert not result.success and "(node spread)" in result.extra and "z-score" not in result.extra
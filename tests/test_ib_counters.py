@@ -0,0 +1,75 @@
+import pytest
+
+from checks import network_checks
+from core import counters
+from core.models import TYPE_TRAFFIC, TYPE_IB_LINK_ERROR, TYPE_IB_PORT_ERROR
+
+NODE = {'host': '10.0.0.1', 'hostname': 'gpu01'}
+THRESHOLDS = {
+    'ib_traffic_gbps': 100,
+    'ib_link_error_per_min': {'symbol_error': 10, 'link_downed': 0},
+    'ib_port_error_per_min': {'port_rcv_errors': 10, 'out_of_buffer': 1000},
+}
+
+@pytest.fixture(autouse=True)
+def clean_samples():
+    counters._SAMPLES.clear()
+    counters._PENDING.clear()
+    yield
+    counters._SAMPLES.clear()
+    counters._PENDING.clear()
+
+def _payload(timestamp, data=0, symbol_error=0, link_downed=0, port_rcv_errors=0, out_of_buffer=0, boot_id='boot-1'):
+    lines = [boot_id, f"{timestamp:.6f}"]
+    for name, value in (('port_rcv_data', data), ('port_xmit_data', data), ('symbol_error', symbol_error),
+                        ('link_downed', link_downed), ('port_rcv_errors', port_rcv_errors)):
+        lines.append(f"mlx5_0/ports/1/counters/{name}:{value}")
+    lines.append(f"mlx5_0/ports/1/hw_counters/out_of_buffer:{out_of_buffer}")
+    return {'success': True, 'output': "\n".join(lines)}
+
+PARSERS = (network_checks.parse_ib_traffic, network_checks.parse_ib_link_errors, network_checks.parse_ib_port_errors)
+
+def _run_cycle(payload):
+    # 三个检查项共享同一个 payload，与 run_plan 中共用命令的行为一致
+    results = [parse(payload, NODE, THRESHOLDS) for parse in PARSERS]
+    counters.merge(counters.drain())
+    return results
+
+def test_first_cycle_is_baseline():
+    assert all(result.success for result in _run_cycle(_payload(1000.0, data=10 ** 12, symbol_error=500)))
+
+def test_quiet_ports_pass():
+    _run_cycle(_payload(1000.0, data=10 ** 9))
+    # 60 秒内 1e9 个 4 字节单位 ≈ 0.53 Gbps
+    assert all(result.success for result in _run_cycle(_payload(1060.0, data=2 * 10 ** 9, symbol_error=3)))
+
+def test_traffic_and_error_growth_alert():
+    _run_cycle(_payload(1000.0, data=0))
+    traffic, link, port = _run_cycle(_payload(1060.0, data=300 * 10 ** 9, symbol_error=50, link_downed=1,
+                                              port_rcv_errors=5, out_of_buffer=5000))
+    assert not traffic.success and traffic.type == TYPE_TRAFFIC
+    assert not link.success and link.type == TYPE_IB_LINK_ERROR
+    assert 'symbol_error' in link.extra and 'link_downed' in link.extra
+    assert not port.success and port.type == TYPE_IB_PORT_ERROR
+    assert 'out_of_buffer' in port.extra and 'port_rcv_errors' not in port.extra
+    assert port.metrics['ib_counter_growth']['mlx5_0/1/out_of_buffer'] == {'delta': 5000, 'per_min': 5000.0}
+
+def test_persisting_growth_keeps_same_extra():
+    _run_cycle(_payload(1000.0))
+    first = _run_cycle(_payload(1060.0, data=300 * 10 ** 9, symbol_error=50))
+    second = _run_cycle(_payload(1090.0, data=500 * 10 ** 9, symbol_error=90))
+    assert [r.extra for r in first[:2]] == [r.extra for r in second[:2]]
+    assert first[1].metrics != second[1].metrics
+
+def test_counter_clear_is_not_an_alert():
+    # perfquery -x 清零: 64 位数据计数从 3e9 下降不能被当成 32 位回绕
+    _run_cycle(_payload(1000.0, data=3_000_000_000, out_of_buffer=3_000_000_000))
+    assert all(result.success for result in _run_cycle(_payload(1060.0, data=100, out_of_buffer=10)))
+
+def test_reboot_starts_new_baseline():
+    _run_cycle(_payload(1000.0, symbol_error=0))
+    assert all(result.success for result in _run_cycle(_payload(1060.0, symbol_error=500, boot_id='boot-2')))
+
+def test_command_failure():
+    result = network_checks.parse_ib_link_errors({'success': False, 'error': 'timeout'}, NODE, THRESHOLDS)
+    assert not result.success
@@ -0,0 +1,54 @@
+import pytest
+
+from core import inventory
+
+def test_expand_hosts_ranges():
+    assert inventory.expand_hosts('gpu[001-003]') == ['gpu001', 'gpu002', 'gpu003']
+    assert inventory.expand_hosts('10.1.3.[1-2,31]') == ['10.1.3.1', '10.1.3.2', '10.1.3.31']
+    assert inventory.expand_hosts('r[1-2]n[1-2]') == ['r1n1', 'r1n2', 'r2n1', 'r2n2']
+    assert inventory.expand_hosts('gpu[8-10]') == ['gpu8', 'gpu9', 'gpu10']
+    assert inventory.expand_hosts('plain-host') == ['plain-host']
+
+@pytest.mark.parametrize('pattern', ['gpu[10-01]', 'gpu[a-c]', 'gpu[1-x]'])
+def test_expand_hosts_rejects_invalid_ranges(pattern):
+    with pytest.raises(ValueError):
+        inventory.expand_hosts(pattern)
+
+def test_groups_inherit_defaults():
+    nodes = inventory.load_inventory({
+        'defaults': {'username': 'ops', 'port': 22},
+        'groups': {'rack-a': {'defaults': {'port': 2222}, 'hosts': ['gpu[01-02]']}},
+        'nodes': [{'host': '10.0.0.9', 'hostname': 'login01', 'port': 22022}],
+    }, ssh_defaults={'timeout': 10})
+    assert nodes.errors == []
+    assert nodes.group_counts() == {'default': 1, 'rack-a': 2}
+    assert nodes.find('gpu01') == {'username': 'ops', 'port': 2222, 'timeout': 10, 'host': 'gpu01', 'hostname': 'gpu01',
+                                   'group': 'rack-a'}
+    assert nodes.find('login01')['port'] == 22022
+
+def test_invalid_and_duplicate_hosts_are_reported():
+    nodes = inventory.load_inventory({'groups': {'rack-a': {'hosts': ['gpu[01-02]', 'gpu[02-01]', 'gpu02']}}})
+    assert list(nodes.hosts()) == ['gpu01', 'gpu02']
+    assert len(nodes.errors) == 2
+
+def test_text_and_csv_sources(tmp_path):
+    (tmp_path / 'rack.txt').write_text("gpu[1-2]  # 机柜 A\ngpu9 gpu-nine\n", encoding='utf-8')
+    (tmp_path / 'rack.csv').write_text("host,hostname,port\n10.0.0.1,cpu01,2200\n10.0.0.2,,bad\n", encoding='utf-8')
+    nodes = inventory.load_inventory({'groups': {'rack-a': {'sources': ['rack.txt', 'rack.csv']}}}, base_dir=str(tmp_path))
+    assert sorted(nodes.hosts()) == ['10.0.0.1', 'gpu1', 'gpu2', 'gpu9']
+    assert nodes.find('gpu-nine')['host'] == 'gpu9'
+    assert nodes.find('cpu01')['port'] == 2200
+    assert len(nodes.errors) == 1
+
+def test_bad_range_in_text_source_skips_only_that_line(tmp_path):
+    (tmp_path / 'rack.txt').write_text("gpu[1-2]\ngpu[5-3]\ngpu9\n", encoding='utf-8')
+    nodes = inventory.load_inventory({'groups': {'rack-a': {'sources': ['rack.txt']}}}, base_dir=str(tmp_path))
+    assert sorted(nodes.hosts()) == ['gpu1', 'gpu2', 'gpu9']
+    assert len(nodes.errors) == 1 and '第 2 行' in nodes.errors[0]
+
+def test_select_subset():
+    nodes = inventory.load_inventory({'groups': {'a': {'hosts': ['a[1-3]']}, 'b': {'hosts': ['b[1-2]']}}})
+    subset = nodes.select(groups={'b'})
+    assert list(subset.hosts()) == ['b1', 'b2'] and len(subset) == 2
+    assert subset.find('a1') is None and nodes.find('a1') is not None
+    assert list(subset.select(hosts={'b2', 'a1'}).hosts()) == ['b2']
@@ -0,0 +1,63 @@
+import json
+import urllib.request
+
+import pytest
+
+from core import httpd, issue_index, transitions
+
+def _issue(host, issue_type, priority='P2 (中)', status=transitions.STATUS_REPORTED, hostname=None):
+    return {'host': host, 'hostname': hostname or f"{host}-name", 'type': issue_type, 'priority': priority,
+            'status': status, 'extra': 'x', 'update_at': '2026-10-19 09:00:00'}
+
+@pytest.fixture(autouse=True)
+def index():
+    issue_index.load([_issue('10.0.0.1', 'gpu.count', 'P1 (高)'), _issue('10.0.0.1', 'gpu.temp'),
+                      _issue('10.0.0.2', 'gpu.temp', status=transitions.STATUS_FLAPPING)])
+    yield
+    issue_index.load([])
+
+def _hosts_types(items):
+    return [(item['host'], item['type']) for item in items]
+
+def test_query_filters_intersect():
+    total, items = issue_index.query(types=['gpu.temp'])
+    assert total == 2
+    assert _hosts_types(items) == [('10.0.0.1', 'gpu.temp'), ('10.0.0.2', 'gpu.temp')]
+    assert _hosts_types(issue_index.query(hosts=['10.0.0.1-name'], types=['gpu.temp'])[1]) == [('10.0.0.1', 'gpu.temp')]
+    assert _hosts_types(issue_index.query(priorities=['P1'])[1]) == [('10.0.0.1', 'gpu.count')]
+    assert _hosts_types(issue_index.query(statuses=[transitions.STATUS_FLAPPING])[1]) == [('10.0.0.2', 'gpu.temp')]
+    assert issue_index.query(hosts=['unknown']) == (0, [])
+
+def test_query_pagination():
+    total, items = issue_index.query(offset=1, limit=1)
+    assert total == 3
+    assert _hosts_types(items) == [('10.0.0.1', 'gpu.temp')]
+
+def test_apply_upserts_active_and_removes_cleared():
+    issue_index.apply([_issue('10.0.0.1', 'gpu.temp', 'P0 (紧急)'),
+                       _issue('10.0.0.2', 'gpu.temp', status=transitions.STATUS_RESOLVED),
+                       _issue('10.0.0.3', 'gpu.count', status=transitions.STATUS_PENDING)])
+    assert issue_index.summary() == {'total': 2, 'hosts': 1, 'by_priority': {'P0': 1, 'P1': 1},
+                                     'by_type': {'gpu.count': 1, 'gpu.temp': 1}}
+    assert issue_index.query(priorities=['P2'])[0] == 0
+
+def test_retain_hosts_drops_other_shards():
+    issue_index.retain_hosts({'10.0.0.2'})
+    assert _hosts_types(issue_index.query()[1]) == [('10.0.0.2', 'gpu.temp')]
+    assert issue_index.query(hosts=['10.0.0.1-name']) == (0, [])
+
+def test_http_api():
+    server = httpd.start_server('127.0.0.1:0')
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(base + '/api/issues?type=gpu.temp,gpu.count&host=10.0.0.1&limit=abc', timeout=5) as resp:
+            payload = json.load(resp)
+        assert payload['total'] == 2 and payload['limit'] == issue_index.DEFAULT_PAGE_SIZE
+        with urllib.request.urlopen(base + '/api/issues?limit=100000&offset=-5', timeout=5) as resp:
+            payload = json.load(resp)
+        assert payload['offset'] == 0 and payload['limit'] == issue_index.MAX_PAGE_SIZE and payload['total'] == 3
+        with urllib.request.urlopen(base + '/api/summary', timeout=5) as resp:
+            assert json.load(resp)['by_type'] == {'gpu.count': 1, 'gpu.temp': 2}
+    finally:
+        server.shutdown()
+        server.server_close()
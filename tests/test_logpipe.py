@@ -0,0 +1,63 @@
+import json
+import multiprocessing
+
+import logbook
+import pytest
+
+from core import logpipe
+
+LOG = logbook.Logger('test_logpipe')
+
+def _worker(hostnames, results):
+    logpipe.attach_worker()
+    for hostname in hostnames:
+        with logpipe.node_context(hostname):
+            LOG.info(f"[{hostname}] 开始处理节点", extra=logpipe.ROUTINE)
+            LOG.warning(f"[{hostname}] 连接缓慢", extra=logpipe.ROUTINE)
+    results.put(logpipe.drain_suppressed())
+
+def _run_worker(hostnames):
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    process = ctx.Process(target=_worker, args=(hostnames, results))
+    process.start()
+    suppressed = results.get(timeout=10)
+    process.join(10)
+    return suppressed
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'logs' / 'inspector.jsonl'
+    yield path
+    logpipe.stop()
+
+def _entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_unsampled_routine_lines_counted_not_written(log_file):
+    logpipe.start({'file': str(log_file), 'console_level': 'CRITICAL', 'routine_sample_rate': 0.0})
+    LOG.info("主进程例行日志", extra=logpipe.ROUTINE)
+    assert _run_worker(['n1', 'n2']) == 2
+    logpipe.stop()
+
+    entries = {e['message']: e for e in _entries(log_file)}
+    assert sorted(entries) == sorted(["主进程例行日志", "[n1] 连接缓慢", "[n2] 连接缓慢"])
+    warning = entries["[n1] 连接缓慢"]
+    assert warning['level'] == 'WARNING' and warning['node'] == 'n1' and warning['routine'] is True
+
+def test_sampled_nodes_keep_routine_lines(log_file):
+    logpipe.start({'file': str(log_file), 'console_level': 'CRITICAL', 'routine_sample_rate': 1.0})
+    assert _run_worker(['n1']) == 0
+    logpipe.stop()
+    assert sorted(e['message'] for e in _entries(log_file)) == sorted(["[n1] 开始处理节点", "[n1] 连接缓慢"])
+
+def test_level_filters_file_output(log_file):
+    logpipe.start({'file': str(log_file), 'console_level': 'CRITICAL', 'level': 'WARNING'})
+    LOG.info("不写入")
+    LOG.error("写入")
+    logpipe.stop()
+    assert [e['message'] for e in _entries(log_file)] == ["写入"]
+
+def test_attach_worker_without_pipeline():
+    assert logpipe.attach_worker() is False
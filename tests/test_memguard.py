@@ -0,0 +1,57 @@
+import copy
+
+import pytest
+
+from core import memguard
+
+MB = memguard.MB
+
+@pytest.fixture(autouse=True)
+def guard(monkeypatch):
+    monkeypatch.setattr(memguard, '_STATE', copy.deepcopy(memguard._STATE))
+    monkeypatch.setattr(memguard, 'rss_bytes', lambda: 100 * MB)
+
+def test_worker_recycling_follows_first_crossing_and_only_tightens():
+    memguard.configure({'worker_rss_limit_mb': 200})
+    assert memguard.max_tasks_per_child() is None
+
+    memguard.observe_cycle('gpu', [(150 * MB, 3), (250 * MB, 6), (400 * MB, 9)])
+    assert memguard.max_tasks_per_child() == 5
+    memguard.observe_cycle('gpu', [(250 * MB, 20)])
+    assert memguard.max_tasks_per_child() == 5
+    memguard.observe_cycle('gpu', [(250 * MB, 1)])
+    assert memguard.max_tasks_per_child() == 1
+
+def test_configured_max_tasks_without_crossing():
+    memguard.configure({'worker_rss_limit_mb': 200, 'worker_max_tasks': 50})
+    memguard.observe_cycle('gpu', [(150 * MB, 40)])
+    assert memguard.max_tasks_per_child() == 50
+
+def test_parent_over_limit_requests_restart():
+    memguard.configure({'parent_rss_limit_mb': 150})
+    memguard.observe_cycle('system', [])
+    assert not memguard.restart_requested()
+    memguard.configure({'parent_rss_limit_mb': 50})
+    memguard.observe_cycle('system', [])
+    assert memguard.restart_requested()
+    assert 'restart_requested True' in memguard.report()
+
+def test_worker_sample_counts_tasks():
+    memguard.init_worker()
+    assert memguard.worker_sample() == (100 * MB, 1)
+    assert memguard.worker_sample() == (100 * MB, 2)
+
+def test_growth_ranks_largest_changes():
+    previous = {'a.py:1': (1000, 10), 'b.py:2': (5000, 5), 'gone.py:3': (2048, 1)}
+    current = {'a.py:1': (1000, 10), 'b.py:2': (9096, 9), 'new.py:4': (1024, 2)}
+    growth = memguard._growth(current, previous, top=2)
+    assert [diff for diff, _ in growth] == [4096, -2048]
+    assert growth[0][1] == "b.py:2: size=8.9 KiB (+4.0 KiB), count=9 (+4)"
+
+def test_report_without_tracemalloc():
+    memguard.configure({})
+    memguard.observe_cycle('gpu', [(120 * MB, 4)])
+    text = memguard.report()
+    assert 'last_cycle gpu parent_rss_mb 100.0 worker_rss_max_mb 120.0' in text
+    assert 'worker_max_tasks unlimited' in text
+    assert memguard.dump() is None
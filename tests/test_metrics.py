@@ -0,0 +1,71 @@
+import urllib.request
+import urllib.error
+
+import pytest
+
+from core import httpd, metrics
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    for name in ('_COUNTERS', '_GAUGES', '_HISTOGRAMS'):
+        monkeypatch.setattr(metrics, name, {})
+
+def test_counter_and_gauge_exposition():
+    metrics.inc('inspector_cycles_total')
+    metrics.inc('inspector_cycles_total', 2)
+    metrics.set_gauge('inspector_nodes_in_flight', 5, runner='gpu')
+    text = metrics.render()
+    assert "# TYPE inspector_cycles_total counter\ninspector_cycles_total 3\n" in text
+    assert '# HELP inspector_nodes_in_flight 当前正在处理的节点数' in text
+    assert 'inspector_nodes_in_flight{runner="gpu"} 5' in text
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.003, 0.02, 0.02, 400):
+        metrics.observe('inspector_node_seconds', value)
+    lines = metrics.render().splitlines()
+    assert 'inspector_node_seconds_bucket{le="0.005"} 1' in lines
+    assert 'inspector_node_seconds_bucket{le="0.025"} 3' in lines
+    assert 'inspector_node_seconds_bucket{le="300"} 3' in lines
+    assert 'inspector_node_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'inspector_node_seconds_count 4' in lines
+
+def test_label_values_are_escaped():
+    metrics.inc('inspector_check_failures_total', check='a"b\\c')
+    assert 'inspector_check_failures_total{check="a\\"b\\\\c"} 1' in metrics.render()
+
+def test_drain_and_merge_move_deltas_between_processes():
+    metrics.inc('inspector_nodes_processed_total', host='n1')
+    metrics.observe('inspector_node_seconds', 0.2)
+    snapshot = metrics.drain()
+    assert 'inspector_nodes_processed_total' not in metrics.render()
+
+    metrics.inc('inspector_nodes_processed_total', host='n1')
+    metrics.merge(snapshot)
+    metrics.merge(None)
+    text = metrics.render()
+    assert 'inspector_nodes_processed_total{host="n1"} 2' in text
+    assert 'inspector_node_seconds_count 1' in text
+
+def test_timer_records_duration():
+    with metrics.timer('inspector_sqlite_seconds', op='upsert'):
+        pass
+    assert 'inspector_sqlite_seconds_count{op="upsert"} 1' in metrics.render()
+
+def test_metrics_served_over_http():
+    metrics.inc('inspector_cycles_total')
+    server = httpd.start_server('127.0.0.1:0')
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(base + '/metrics', timeout=5) as resp:
+            assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'inspector_cycles_total 1' in resp.read().decode('utf-8')
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(base + '/missing', timeout=5)
+        assert excinfo.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_start_server_disabled_or_invalid():
+    assert httpd.start_server('') is None
+    assert httpd.start_server('127.0.0.1:not-a-port') is None
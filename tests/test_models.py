@@ -0,0 +1,24 @@
+import pickle
+
+import pytest
+
+from core.models import CheckResult, IssueEvent
+
+def test_optional_fields_read_as_none():
+    result = CheckResult.ok(['gpu.count'])
+    assert result['extra'] is None
+    assert result['types'] == ('gpu.count',)
+    assert result.get('extra', 'n/a') == 'n/a'
+    assert 'extra' not in result
+
+def test_unknown_field_raises_key_error():
+    with pytest.raises(KeyError):
+        CheckResult.ok(['gpu.count'])['no_such_field']
+    with pytest.raises(KeyError):
+        CheckResult.ok(['gpu.count'])['no_such_field'] = 1
+
+def test_records_round_trip_through_pickle():
+    result = CheckResult.failure({'host': '10.0.0.1', 'hostname': 'gpu01'}, 'gpu.count', 'found 7')
+    assert pickle.loads(pickle.dumps(result)) == result
+    event = IssueEvent('10.0.0.1', 'gpu01', 'gpu.count', extra='found 7')
+    assert pickle.loads(pickle.dumps(event)) == event
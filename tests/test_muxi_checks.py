@@ -0,0 +1,63 @@
+from checks import muxi_checks
+from core.models import TYPE_MUXI_GPU_CNT, TYPE_MUXI_GPU_TEMP, TYPE_MUXI_SMI_CMD_ERROR, TYPE_MUXI_PCIE_STATUS
+
+NODE = {'host': '10.0.0.1', 'hostname': 'muxi01'}
+THRESHOLDS = {'muxi_gpu_count': 8, 'muxi_gpu_temp': 85}
+
+def _snapshot(**overrides):
+    mark = muxi_checks.SNAPSHOT_MARK
+    sections = {
+        'list': (0, [f"GPU#{i} MXC500" for i in range(8)]),
+        'temperature': (0, ["60"] * 8),
+        'pcie': (0, ["5, 5, 16, 16"] * 8),
+        'ecc': (0, [line for i in range(8) for line in (f"GPU {i}", "    ECC Errors : 0")]),
+        'performance': (0, [line for i in range(8) for line in (f"GPU {i}", "    Thermal Slowdown : Not Active")]),
+        'metaxlink': (0, [f"Link {i}: UP" for i in range(7)]),
+        **overrides,
+    }
+    lines = []
+    for name, (rc, body) in sections.items():
+        lines.extend([f"{mark}{name}", *body, f"{mark}rc={rc}"])
+    return {'success': True, 'output': "\n".join(lines)}
+
+def test_healthy_snapshot():
+    payload = _snapshot()
+    for parse in (muxi_checks.parse_muxi_gpu_count, muxi_checks.parse_muxi_gpu_temp, muxi_checks.parse_muxi_ecc_state,
+                  muxi_checks.parse_muxi_pcie_status, muxi_checks.parse_muxi_thermal_status,
+                  muxi_checks.parse_muxi_metaxlink_status):
+        assert parse(payload, NODE, THRESHOLDS).success
+
+def test_rejected_pcie_fields_only_skip_pcie_check():
+    payload = _snapshot(pcie=(2, ["Error: unknown option field 'pci.link.width.max'"]))
+    for parse in (muxi_checks.parse_muxi_gpu_count, muxi_checks.parse_muxi_gpu_temp, muxi_checks.parse_muxi_pcie_status):
+        assert parse(payload, NODE, THRESHOLDS).success
+
+def test_rejected_temperature_query_fails_temp_but_not_count():
+    payload = _snapshot(temperature=(2, ["Error: unknown option field 'temperature.gpu'"]))
+    assert muxi_checks.parse_muxi_gpu_count(payload, NODE, THRESHOLDS).success
+    result = muxi_checks.parse_muxi_gpu_temp(payload, NODE, THRESHOLDS)
+    assert not result.success and result.type == TYPE_MUXI_SMI_CMD_ERROR
+
+def test_not_available_fields_are_skipped_per_gpu():
+    payload = _snapshot(temperature=(0, ["N/A"] + ["90"] + ["60"] * 6),
+                        pcie=(0, ["N/A, 5, N/A, 16"] + ["5, 5, 8, 16"] + ["5, 5, 16, 16"] * 6))
+    result = muxi_checks.parse_muxi_gpu_temp(payload, NODE, THRESHOLDS)
+    assert not result.success and result.type == TYPE_MUXI_GPU_TEMP and "GPU-1 at 90C" in result.extra
+    assert result.metrics == {'gpu_temp': [90] + [60] * 6}
+    result = muxi_checks.parse_muxi_pcie_status(payload, NODE, THRESHOLDS)
+    assert not result.success and result.type == TYPE_MUXI_PCIE_STATUS
+    assert "GPU-1" in result.extra and "GPU-0" not in result.extra
+
+def test_count_uses_gpu_listing():
+    result = muxi_checks.parse_muxi_gpu_count(_snapshot(list=(0, ["GPU#0 MXC500"] * 7)), NODE, THRESHOLDS)
+    assert not result.success and result.type == TYPE_MUXI_GPU_CNT
+
+def test_count_ignores_driver_warnings_in_listing():
+    listing = ["WARNING: mxgpu-smi driver/library version mismatch"] + [f"GPU#{i} MXC500" for i in range(8)] + [""]
+    assert muxi_checks.parse_muxi_gpu_count(_snapshot(list=(0, listing)), NODE, THRESHOLDS).success
+
+def test_unsupported_optional_section_is_skipped():
+    payload = _snapshot(performance=(1, ["-d PERFORMANCE: not supported"]), pcie=(0, ["4, 5, 16, 16"] * 8))
+    assert muxi_checks.parse_muxi_thermal_status(payload, NODE, THRESHOLDS).success
+    result = muxi_checks.parse_muxi_pcie_status(payload, NODE, THRESHOLDS)
+    assert not result.success and result.type == TYPE_MUXI_PCIE_STATUS
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from core import database
+
+MYSQL_CONFIG = {'host': 'db', 'port': 3306, 'user': 'u', 'password': 'p', 'db_name': 'inspector'}
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, batch):
+        if 'INSERT INTO' in sql and 'ON DUPLICATE KEY' not in sql:
+            self.rows.extend(batch)
+
+class _Connection:
+    def __init__(self):
+        self.rows = []
+
+    def cursor(self):
+        return _Cursor(self.rows)
+
+    def commit(self):
+        pass
+
+def _event(host):
+    return {'host': host, 'hostname': host, 'type': 'gpu.count', 'priority': 'P1', 'status': 'active',
+            'extra': 'found 7', 'event_time': '2026-10-19 08:00:00'}
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    sink = database.MySQLEventSink(MYSQL_CONFIG, spool_path=str(tmp_path / 'spool.jsonl'))
+    conn = _Connection()
+    monkeypatch.setattr(sink, '_get_connection', lambda: conn)
+    return sink, conn
+
+def test_corrupt_spool_lines_are_quarantined(sink):
+    sink, conn = sink
+    with open(sink.spool_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event('10.0.0.1')) + '\n')
+        f.write('{"host": "10.0.0.2", "hostn\n')
+        f.write('42\n')
+        f.write(json.dumps(_event('10.0.0.3')) + '\n')
+        f.write('{"host": "10.0.0.4"')
+
+    sink.append(_event('10.0.0.5'))
+    sink.flush()
+
+    assert [row['host'] for row in conn.rows] == ['10.0.0.1', '10.0.0.3', '10.0.0.5']
+    with open(sink.spool_path + '.bad', encoding='utf-8') as f:
+        assert len(f.readlines()) == 3
+    assert not os.path.exists(sink.spool_path)
+    assert not os.path.exists(sink.spool_path + '.replay')
+
+def test_leftover_replay_file_is_merged_not_overwritten(sink):
+    sink, conn = sink
+    with open(sink.spool_path + '.replay', 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event('10.0.0.1')) + '\n')
+    with open(sink.spool_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event('10.0.0.2')) + '\n')
+
+    sink.append(_event('10.0.0.3'))
+    sink.flush()
+    assert sorted(row['host'] for row in conn.rows) == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+def test_unreadable_spool_does_not_abort_flush(sink, monkeypatch):
+    sink, conn = sink
+    with open(sink.spool_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event('10.0.0.1')) + '\n')
+
+    def broken_read(path):
+        raise OSError("I/O error")
+    monkeypatch.setattr(sink, '_read_spool', broken_read)
+
+    sink.append(_event('10.0.0.2'))
+    sink.flush()
+    assert [row['host'] for row in conn.rows] == ['10.0.0.2']
+    # 暂存数据保留到下次补写
+    assert os.path.exists(sink.spool_path + '.replay')
+
+def test_spool_is_replayed_without_new_events(sink):
+    sink, conn = sink
+    with open(sink.spool_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event('10.0.0.1')) + '\n')
+
+    sink.flush()
+
+    assert [row['host'] for row in conn.rows] == ['10.0.0.1']
+    assert not os.path.exists(sink.spool_path)
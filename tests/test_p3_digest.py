@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from core import p3_digest
+
+@pytest.fixture
+def digest(tmp_path):
+    snapshot_path = str(tmp_path / 'p3_digest.json')
+    p3_digest.load({'P3_SUMMARY': {'snapshot_path': snapshot_path}})
+    yield snapshot_path
+    p3_digest.reset()
+
+def _obs(host, issue_type, ts, extra='x'):
+    return {'host': host, 'hostname': f"{host}-name", 'type': issue_type, 'extra': extra, 'ts': ts}
+
+def _texts(lines):
+    return [item.get('text', '') for line in lines for item in line]
+
+def test_make_observation_truncates_extra():
+    obs = p3_digest.make_observation({'host': '10.0.0.1', 'type': 'disk_full', 'extra': 'a' * 50}, max_chars=10)
+    assert obs['extra'] == 'a' * 10 + '...'
+    assert obs['hostname'] == '10.0.0.1'
+
+def test_counts_and_render_order(digest):
+    p3_digest.add([_obs('h1', 'type_a', 100), _obs('h3', 'type_b', 150), _obs('h2', 'type_a', 200),
+                   _obs('h1', 'type_a', 300, 'latest')])
+    texts = _texts(p3_digest.render_lines(hosts_per_type=1))
+    type_a = texts.index(next(t for t in texts if 'type_a: 3 次, 2 个节点' in t))
+    assert type_a < texts.index(next(t for t in texts if 'type_b: 1 次' in t))
+    assert texts[type_a + 1] == '  示例: latest'
+    assert texts[type_a + 2].startswith('  - h1-name: 2 次')
+    assert '  ... 其余 1 个节点' in texts
+
+def test_status_api_link(digest):
+    p3_digest.add([_obs('h1', 'type a', 100)])
+    links = [item for line in p3_digest.render_lines('http://status:8080/') for item in line if item['tag'] == 'a']
+    assert links[0]['href'] == 'http://status:8080/api/issues?type=type%20a'
+
+def test_empty_digest_renders_nothing(digest):
+    assert p3_digest.render_lines() == []
+    assert p3_digest.paginate([]) == []
+
+def test_paginate_respects_byte_limit():
+    lines = [[{"tag": "text", "text": f"第 {i} 行 " + '节点' * 20}] for i in range(50)]
+    pages = p3_digest.paginate(lines, max_bytes=1000)
+    assert len(pages) > 1
+    assert [line for page in pages for line in page] == lines
+    for page in pages:
+        assert len(json.dumps(page, ensure_ascii=False).encode('utf-8')) <= 1000
+
+def test_paginate_keeps_oversized_line_on_its_own_page():
+    big = [{"tag": "text", "text": 'x' * 500}]
+    small = [{"tag": "text", "text": 'y'}]
+    assert p3_digest.paginate([small, big, small], max_bytes=100) == [[small], [big], [small]]
+
+def test_retain_hosts_recounts_types(digest):
+    p3_digest.add([_obs('h1', 'type_a', 100), _obs('h2', 'type_a', 200), _obs('h2', 'type_b', 300)])
+    p3_digest.retain_hosts({'h1'})
+    texts = _texts(p3_digest.render_lines())
+    assert any('type_a: 1 次, 1 个节点' in t for t in texts)
+    assert not any('type_b' in t for t in texts)
+
+def test_snapshot_round_trip(digest):
+    p3_digest.add([_obs('h1', 'type_a', 100), _obs('h1', 'type_a', 200)])
+    p3_digest.save()
+    p3_digest.reset()
+    p3_digest.load({'P3_SUMMARY': {'snapshot_path': digest}}, active_p3_records=[{'host': 'h9', 'type': 'type_z'}])
+    texts = _texts(p3_digest.render_lines())
+    assert any('type_a: 2 次' in t for t in texts)
+    assert not any('type_z' in t for t in texts)
+
+def test_seeded_from_active_records_without_snapshot(digest):
+    p3_digest.load({'P3_SUMMARY': {'snapshot_path': digest}},
+                   active_p3_records=[{'host': 'h9', 'hostname': 'gpu09', 'type': 'type_z', 'extra': 'seed'}])
+    texts = _texts(p3_digest.render_lines())
+    assert any('type_z: 1 次' in t for t in texts) and '  示例: seed' in texts
+
+def test_corrupt_snapshot_starts_fresh(digest):
+    with open(digest, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    p3_digest.load({'P3_SUMMARY': {'snapshot_path': digest}})
+    assert p3_digest.render_lines() == []
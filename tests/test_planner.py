@@ -0,0 +1,96 @@
+import pytest
+
+from core import inventory, planner, runners
+
+PROFILES = {
+    'nvidia': {'checks': {'gpu': ['storage.gpfs', 'system.disk_usage'], 'system': ['system.memory_usage']}},
+    'ib': {'checks': {'gpu': ['network.traffic', 'network.ib_link_errors', 'network.ib_port_errors']}},
+}
+APP_CONFIG = {'GPU_CHECK_INTERVAL_SECONDS': 30, 'SYSTEM_CHECK_INTERVAL_MINUTES': 10, 'MAX_WORKERS': 10}
+
+@pytest.fixture(autouse=True)
+def plan_cache():
+    runners.clear_plan_cache()
+    yield
+    runners.clear_plan_cache()
+
+def _nodes(count, **defaults):
+    return inventory.load_inventory({'groups': {'rack': {'defaults': defaults, 'hosts': [f"gpu[1-{count}]"]}}})
+
+def _observations(profiles=('nvidia',), connect=(0.5,), discover=(0.5,), unreachable=()):
+    observations = planner.new_observations()
+    observations['checks'] = {'storage.gpfs': [1.0], 'system.disk_usage': [2.0], 'system.memory_usage': [1.0],
+                              'network.traffic': [2.0]}
+    observations['connect'] = list(connect)
+    observations['discover'] = list(discover)
+    observations['unreachable'] = list(unreachable)
+    observations['profiles'].update(profiles)
+    return observations
+
+def test_cycle_workers_and_shards():
+    report = planner.plan_capacity(_nodes(101), PROFILES, {}, APP_CONFIG, _observations(), runner_types=['gpu'])
+    gpu = report['runners']['gpu']
+    # 单节点 = 连接 0.5 + 发现 0.5 + 命令 1 + 2；一轮 = 100 × 4 / 10 + 4
+    assert gpu['node_seconds_mean'] == 4.0 and gpu['node_seconds_p90'] == 4.0
+    assert gpu['predicted_cycle_seconds'] == 44.0
+    # 可用预算 30 × 0.8 - 4 = 20 秒
+    assert gpu['required_workers'] == 20 and gpu['required_shards'] == 2
+    assert gpu['ssh_connections_per_cycle'] == 101
+    assert gpu['exec_channels_per_cycle'] == 101 * (2 + planner.DISCOVER_COMMANDS)
+    assert any(w.startswith('[gpu] 预计一轮耗时 44.0s') for w in report['warnings'])
+
+def test_sharding_divides_nodes_per_instance():
+    report = planner.plan_capacity(_nodes(101), PROFILES, {}, APP_CONFIG, _observations(), runner_types=['gpu'], shards=2)
+    gpu = report['runners']['gpu']
+    assert report['nodes_per_instance'] == 51
+    assert gpu['predicted_cycle_seconds'] == 24.0
+    assert gpu['required_workers'] == 10 and gpu['required_shards'] == 2
+    assert gpu['peak_ssh_sessions_fleet'] == 20
+    assert not any(w.startswith('[gpu] 预计一轮耗时') for w in report['warnings'])
+
+def test_shared_command_counted_once():
+    report = planner.plan_capacity(_nodes(11), PROFILES, {}, APP_CONFIG, _observations(profiles=('ib',)), runner_types=['gpu'])
+    gpu = report['runners']['gpu']
+    assert gpu['node_seconds_mean'] == 3.0
+    assert gpu['exec_channels_per_cycle'] == 11 * (1 + planner.DISCOVER_COMMANDS)
+    assert gpu['checks_without_latency'] == []
+
+def test_unreachable_nodes_only_cost_connect_time():
+    observations = _observations(unreachable=(10.0,))
+    report = planner.plan_capacity(_nodes(11), PROFILES, {}, APP_CONFIG, observations, runner_types=['gpu'])
+    assert report['unreachable_ratio'] == 0.5
+    assert report['runners']['gpu']['node_seconds_mean'] == 7.0
+
+def test_defaults_without_observations_use_slowest_profile():
+    report = planner.plan_capacity(_nodes(10), PROFILES, {}, APP_CONFIG, planner.new_observations(), runner_types=['gpu'])
+    expected = planner.DEFAULT_CONNECT_SECONDS + planner.DEFAULT_DISCOVER_SECONDS + 2 * planner.DEFAULT_COMMAND_SECONDS
+    assert report['runners']['gpu']['node_seconds_mean'] == pytest.approx(expected)
+    assert len(report['warnings']) == 2
+
+def test_node_slower_than_interval_cannot_be_fixed_by_scaling():
+    observations = _observations()
+    observations['checks']['system.disk_usage'] = [40.0]
+    report = planner.plan_capacity(_nodes(10), PROFILES, {}, APP_CONFIG, observations, runner_types=['gpu'])
+    assert report['runners']['gpu']['required_workers'] is None
+    assert any('增加 worker 或分片都无法满足' in w for w in report['warnings'])
+
+def test_serial_scheduler_utilization_adds_up():
+    report = planner.plan_capacity(_nodes(101), PROFILES, {}, APP_CONFIG, _observations())
+    gpu, system = report['runners']['gpu'], report['runners']['system']
+    assert system['predicted_cycle_seconds'] == 22.0
+    assert report['total_utilization'] == pytest.approx(44 / 30 + 22 / 600, abs=1e-3)
+    assert any('同一调度线程中串行执行' in w for w in report['warnings'])
+    assert '定时任务合计占用' in planner.format_report(report)
+
+def test_bastion_channel_limit():
+    app_config = {**APP_CONFIG, 'BASTIONS': {'bj': {'host': '10.0.0.254', 'max_channels': 4}}}
+    report = planner.plan_capacity(_nodes(20, bastion='bj'), PROFILES, {}, app_config, _observations(), runner_types=['gpu'])
+    assert report['bastions']['bj'] == {'nodes': 20, 'max_channels': 4, 'peak_channels': 4, 'peak_channels_fleet': 4}
+    assert any('跳板机 bj 的 max_channels=4' in w for w in report['warnings'])
+
+def test_observe_corpus_counts_shared_commands_once_and_infers_profile():
+    plan = runners.compile_plan(PROFILES['ib']['checks']['gpu'], {})
+    session = [{'check': step.name, 'command': step.command, 'latency': 2.0 if i == 0 else 0.0} for i, step in enumerate(plan)]
+    observations = planner.observe_corpus(planner.new_observations(), [session, session], PROFILES, {}, ['gpu'])
+    assert observations['checks'] == {'network.traffic': [2.0, 2.0]}
+    assert observations['profiles'] == {'ib': 2}
@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from core import runners
+from core.models import *
+
+@pytest.fixture(autouse=True)
+def plan_cache():
+    runners.clear_plan_cache()
+    yield
+    runners.clear_plan_cache()
+
+class _ReplayClient:
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.commands = []
+
+    def replay_command(self, command):
+        self.commands.append(command)
+        return self.outputs[command]
+
+def test_compile_plan_expands_commands_and_timeouts():
+    plan = runners.compile_plan(['storage.gpfs', 'no.such_check', 'gpu.xid_error'], {'gpfs_mount_path': '/mnt/gpfs'})
+    assert [step.name for step in plan] == ['storage.gpfs', 'gpu.xid_error']
+    assert "'/mnt/gpfs'" in plan[0].command
+    assert plan[0].timeout == runners.DEFAULT_CHECK_TIMEOUT
+    assert plan[1].timeout == runners.CHECK_TIMEOUTS['gpu.xid_error']
+    assert plan[1].issue_types == (TYPE_XID_ERROR, TYPE_XID_INFO)
+
+def test_get_plan_is_cached_per_profile_and_thresholds():
+    plan = runners.get_plan('a100', 'system', ['storage.gpfs'], {'gpfs_mount_path': '/a'})
+    assert runners.get_plan('a100', 'system', ['storage.gpfs'], {'gpfs_mount_path': '/a'}) is plan
+    changed = runners.get_plan('a100', 'system', ['storage.gpfs'], {'gpfs_mount_path': '/b'})
+    assert changed is not plan and "'/b'" in changed[0].command
+    runners.clear_plan_cache()
+    assert runners.get_plan('a100', 'system', ['storage.gpfs'], {'gpfs_mount_path': '/a'}) is not plan
+
+def test_compile_plans_covers_every_profile():
+    profiles = {'a100': {'checks': {'system': ['system.disk_usage'], 'gpu': ['gpu.count']}}, 'cpu': {'checks': {}}}
+    plans = runners.compile_plans(profiles, 'system', {})
+    assert [step.name for step in plans['a100']] == ['system.disk_usage']
+    assert plans['cpu'] == ()
+
+def test_run_plan_executes_and_parses_each_step():
+    thresholds = {'gpfs_mount_path': '/gpfs'}
+    plan = runners.compile_plan(['storage.gpfs', 'system.disk_usage'], thresholds)
+    client = _ReplayClient({plan[0].command: (0, 'mounted\n', ''), plan[1].command: (1, '', 'df: failed')})
+    results = runners.run_plan(client, {'host': '10.0.0.1', 'hostname': 'n1'}, thresholds, plan)
+    assert client.commands == [step.command for step in plan]
+    assert results['storage.gpfs'][KEY_SUCCESS] is True
+    assert results['system.disk_usage'][KEY_SUCCESS] is False
+    assert 'df: failed' in results['system.disk_usage'][KEY_EXTRA]
+
+def test_salt_covers_transition_policies_of_step_types():
+    base = runners.compile_plan(['gpu.xid_error', 'storage.gpfs'], {})
+    policies = {'TRANSITION_POLICIES': {TYPE_XID_INFO: {'raise_count': 2, 'window': 3}}}
+    changed = runners.compile_plan(['gpu.xid_error', 'storage.gpfs'], {}, app_config=policies)
+    assert changed[0].salt != base[0].salt
+    assert changed[1].salt == base[1].salt
+    assert runners.get_plan('a100', 'gpu', ['gpu.xid_error'], {}, policies) is not runners.get_plan('a100', 'gpu', ['gpu.xid_error'], {})
+
+def test_unchanged_fingerprint_skips_parse_and_report():
+    plan = runners.compile_plan(['storage.gpfs'], {'gpfs_mount_path': '/gpfs'})
+    client = _ReplayClient({plan[0].command: (0, 'mounted\n', '')})
+    node = {'host': '10.0.0.1', 'hostname': 'n1'}
+    first = {'previous': {}, 'current': {}}
+    assert 'storage.gpfs' in runners.run_plan(client, node, {}, plan, first)
+    hit = {'previous': dict(first['current']), 'current': {}}
+    assert runners.run_plan(client, node, {}, plan, hit) == {}
+    assert hit['current'] == first['current']
+    client.outputs[plan[0].command] = (0, 'not mounted\n', '')
+    miss = {'previous': dict(first['current']), 'current': {}}
+    assert 'storage.gpfs' in runners.run_plan(client, node, {}, plan, miss)
+
+class _HungChannel:
+    def __init__(self):
+        self.status_event = threading.Event()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class _HungStream:
+    def __init__(self, channel):
+        self.channel = channel
+
+class _HungClient:
+    def __init__(self):
+        self.channel = _HungChannel()
+
+    def exec_command(self, command, timeout=None):
+        stream = _HungStream(self.channel)
+        return stream, stream, stream
+
+def test_hung_command_times_out_and_closes_channel():
+    client = _HungClient()
+    payload = runners._execute_ssh_command(client, "sleep infinity", timeout=0.05)
+    assert not payload['success'] and 'did not exit within' in payload['error']
+    assert client.channel.closed
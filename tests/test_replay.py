@@ -0,0 +1,29 @@
+import pytest
+
+from core import replay, runners
+
+class _Client:
+    def replay_command(self, command):
+        return 0, 'mounted', ''
+
+@pytest.fixture
+def corpus(tmp_path):
+    runners.configure_recording(str(tmp_path))
+    try:
+        thresholds = {'gpfs_mount_path': '/gpfs/old'}
+        plan = runners.compile_plan(['storage.gpfs'], thresholds)
+        runners.run_plan(_Client(), {'host': '10.0.0.1', 'hostname': 'gpu01'}, thresholds, plan)
+    finally:
+        runners.configure_recording(None)
+    return str(tmp_path)
+
+def test_replay_uses_recorded_thresholds(corpus):
+    sessions = replay.load_corpus(corpus)
+    stats = replay.replay_sessions(sessions, {'gpfs_mount_path': '/gpfs/new'}, {}, None, with_report=False,
+                                   recorded_thresholds=replay.load_thresholds(corpus))
+    assert stats['checks'] == 1 and stats['mismatched'] == 0
+
+def test_replay_reports_threshold_mismatch(corpus):
+    sessions = replay.load_corpus(corpus)
+    stats = replay.replay_sessions(sessions, {'gpfs_mount_path': '/gpfs/new'}, {}, None, with_report=False)
+    assert stats['checks'] == 0 and stats['mismatched'] == 1
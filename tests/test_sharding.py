@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from core import inventory, sharding
+
+HOSTS = [f"gpu{i:03d}" for i in range(200)]
+
+def _coordinator(tmp_path, instance_id, instances=('a', 'b', 'c')):
+    return sharding.ShardCoordinator({'instance_id': instance_id, 'instances': list(instances),
+                                      'lease_path': str(tmp_path / 'leases.db')})
+
+def test_ring_partitions_every_host():
+    ring = sharding.build_ring(['a', 'b', 'c'])
+    owners = {host: sharding.ring_owner(ring, host) for host in HOSTS}
+    assert set(owners.values()) == {'a', 'b', 'c'}
+    assert sharding.ring_owner(sharding.build_ring([]), 'gpu001') is None
+
+def test_ring_only_moves_hosts_of_departed_instance():
+    before = sharding.build_ring(['a', 'b', 'c'])
+    after = sharding.build_ring(['a', 'b'])
+    for host in HOSTS:
+        owner = sharding.ring_owner(before, host)
+        if owner != 'c':
+            assert sharding.ring_owner(after, host) == owner
+
+def test_unknown_instance_id_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _coordinator(tmp_path, 'z')
+
+def test_live_instances_split_inventory(tmp_path):
+    nodes = inventory.load_inventory({'groups': {'rack': {'hosts': ['gpu[000-199]']}}})
+    coordinators = [_coordinator(tmp_path, name) for name in ('a', 'b', 'c')]
+    for coordinator in coordinators:
+        coordinator.renew()
+    selected = [set(c.select(nodes).hosts()) for c in coordinators]
+    assert set().union(*selected) == set(HOSTS)
+    assert sum(len(s) for s in selected) == len(HOSTS)
+
+def test_released_and_expired_leases_hand_over_nodes(tmp_path):
+    a, b, c = (_coordinator(tmp_path, name) for name in ('a', 'b', 'c'))
+    for coordinator in (a, b, c):
+        coordinator.renew()
+    assert a.live_instances() == ['a', 'b', 'c']
+
+    c.stop()
+    assert a.live_instances() == ['a', 'b']
+    assert all(a.owns(host) or b.owns(host) for host in HOSTS)
+
+    with sqlite3.connect(str(tmp_path / 'leases.db')) as conn:
+        conn.execute("UPDATE inspector_leases SET expires_at = 0 WHERE instance_id = 'b'")
+    assert a.live_instances() == ['a']
+    assert all(a.owns(host) for host in HOSTS)
+
+def test_self_always_live_and_unconfigured_leases_ignored(tmp_path):
+    stray = _coordinator(tmp_path, 'x', instances=('x',))
+    stray.renew()
+    assert _coordinator(tmp_path, 'a').live_instances() == ['a']
+
+def test_unreadable_lease_db_falls_back_to_static_sharding(tmp_path):
+    (tmp_path / 'leases.db').mkdir()
+    coordinator = _coordinator(tmp_path, 'a')
+    assert coordinator.renew() is False
+    assert coordinator.live_instances() == ['a', 'b', 'c']
@@ -0,0 +1,76 @@
+import paramiko
+import pytest
+
+from core import ssh_client
+
+class _FakeTransport:
+    def __init__(self, error=None):
+        self.error = error
+        self.opened = 0
+
+    def is_active(self):
+        return True
+
+    def open_channel(self, kind, dest, src, timeout=None):
+        self.opened += 1
+        if self.error:
+            raise self.error
+        return object()
+
+class _FakeClient:
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+
+def _configure(monkeypatch):
+    ssh_client.configure_bastions({'jump': {'host': 'jump.example', 'acquire_timeout': 1}})
+    monkeypatch.setattr(ssh_client.time, 'sleep', lambda seconds: None)
+
+def test_bastion_auth_failure_is_reported(monkeypatch):
+    _configure(monkeypatch)
+
+    def refuse(self, **kwargs):
+        raise paramiko.ssh_exception.AuthenticationException("Authentication failed.")
+    monkeypatch.setattr(paramiko.SSHClient, 'connect', refuse)
+
+    client, error = ssh_client.create_ssh_client('10.0.0.1', 22, 'root', None, retries=2, bastion='jump')
+    assert client is None
+    assert error == "Authentication failed."
+    # 通道配额已归还
+    assert ssh_client._BASTIONS['limits']['jump'].acquire(timeout=0)
+
+def test_stale_bastion_is_reconnected_once(monkeypatch):
+    _configure(monkeypatch)
+    stale = _FakeClient(_FakeTransport(EOFError()))
+    fresh = _FakeClient(_FakeTransport())
+    ssh_client._BASTIONS['clients']['jump'] = stale
+
+    def reconnect(name):
+        if ssh_client._BASTIONS['clients'].get(name) is stale:
+            return stale.get_transport()
+        ssh_client._BASTIONS['clients'][name] = fresh
+        return fresh.get_transport()
+    monkeypatch.setattr(ssh_client, '_bastion_transport', reconnect)
+
+    channel, limit = ssh_client._open_bastion_channel('jump', '10.0.0.1', 22, 5)
+    limit.release()
+    assert stale.closed and fresh.get_transport().opened == 1
+
+def test_new_bastion_channel_error_is_not_retried(monkeypatch):
+    _configure(monkeypatch)
+    transport = _FakeTransport(paramiko.ssh_exception.SSHException("administratively prohibited"))
+
+    def connect(name):
+        ssh_client._BASTIONS['clients'][name] = _FakeClient(transport)
+        return transport
+    monkeypatch.setattr(ssh_client, '_bastion_transport', connect)
+
+    with pytest.raises(paramiko.ssh_exception.SSHException, match="prohibited"):
+        ssh_client._open_bastion_channel('jump', '10.0.0.1', 22, 5)
+    assert transport.opened == 1
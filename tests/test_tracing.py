@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+from core import tracing
+
+@pytest.fixture
+def trace_dir(tmp_path):
+    yield str(tmp_path / 'traces')
+    tracing.configure(None)
+    tracing.drain()
+
+def test_span_is_noop_when_disabled(trace_dir):
+    tracing.configure(None)
+    with tracing.span('connect'):
+        pass
+    assert not tracing.enabled()
+    assert tracing.drain() == []
+    assert tracing.export_cycle('gpu', 100) is None
+
+def test_spans_recorded_and_merged_from_workers(trace_dir):
+    tracing.configure({'dir': trace_dir})
+    with tracing.span('check', host='n1'):
+        pass
+    worker_spans = [{'name': 'node', 'cat': 'node', 'ts': 1, 'dur': 2, 'pid': 4242, 'args': {}}]
+    tracing.extend(worker_spans)
+    spans = tracing.drain()
+    assert [s['name'] for s in spans] == ['check', 'node']
+    assert spans[0]['args'] == {'host': 'n1'} and spans[0]['pid'] == os.getpid()
+
+def test_unsampled_cycle_is_dropped(trace_dir):
+    tracing.configure({'dir': trace_dir, 'sample_rate': 0.0})
+    with tracing.span('cycle', cat='cycle'):
+        pass
+    assert tracing.export_cycle('gpu', 5) is None
+    assert os.listdir(trace_dir) == []
+    assert tracing.drain() == []
+
+def test_slow_cycle_always_exported_as_chrome_trace(trace_dir):
+    tracing.configure({'dir': trace_dir, 'slow_cycle_seconds': 60})
+    tracing.extend([{'name': 'node', 'cat': 'node', 'ts': 20, 'dur': 5, 'pid': 4242, 'args': {'host': 'n1'}}])
+    with tracing.span('cycle', cat='cycle'):
+        pass
+    path = tracing.export_cycle('gpu', 61)
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+    names = {e['args']['name'] for e in trace['traceEvents'] if e['ph'] == 'M'}
+    assert names == {'inspector (gpu)', 'worker-4242'}
+    complete = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert [e['name'] for e in complete] == ['node', 'cycle']
+
+def test_jsonl_export(trace_dir):
+    tracing.configure({'dir': trace_dir, 'sample_rate': 1.0, 'format': 'jsonl'})
+    with tracing.span('report', host='n1'):
+        pass
+    path = tracing.export_cycle('system', 1)
+    assert path.endswith('.jsonl')
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['name'] for line in f] == ['report']
+
+def test_rotation_keeps_newest_files(trace_dir):
+    tracing.configure({'dir': trace_dir, 'sample_rate': 1.0, 'max_files': 2})
+    for name in ('cycle-20260101-000000-gpu.json', 'cycle-20260102-000000-gpu.json', 'notes.txt'):
+        open(os.path.join(trace_dir, name), 'w').close()
+    with tracing.span('cycle', cat='cycle'):
+        pass
+    path = tracing.export_cycle('gpu', 1)
+    assert sorted(os.listdir(trace_dir)) == sorted(['cycle-20260102-000000-gpu.json', os.path.basename(path), 'notes.txt'])
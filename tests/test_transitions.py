@@ -0,0 +1,54 @@
+from core import transitions as t
+
+def _policy(**overrides):
+    return t.get_policy({'TRANSITION_POLICIES': {'default': overrides}}, 'gpu.count')
+
+def _run(observations, policy, start=1000, step=30, record=None):
+    # 依次输入观测结果 (True 表示失败)，返回每一步的动作与最终记录
+    actions = []
+    for i, failed in enumerate(observations):
+        action, fields = t.evaluate(record, failed, policy, start + i * step)
+        record = {**(record or {}), **fields}
+        actions.append(action)
+    return actions, record
+
+def test_default_policy_raises_and_clears_immediately():
+    actions, record = _run([True, True, False], _policy())
+    assert actions == [t.ACTION_RAISE, t.ACTION_DUPLICATE, t.ACTION_CLEAR]
+    assert record['status'] == t.STATUS_RESOLVED
+
+def test_n_of_m_confirmation():
+    actions, record = _run([True, False, True], _policy(window=3, raise_count=2))
+    assert actions == [t.ACTION_PENDING, t.ACTION_NONE, t.ACTION_RAISE]
+    assert record['status'] == t.STATUS_REPORTED
+
+def test_pending_failure_that_recovers_is_never_raised():
+    actions, record = _run([True, False, False], _policy(window=3, raise_count=3))
+    assert t.ACTION_RAISE not in actions
+    assert record['status'] == t.STATUS_RESOLVED
+
+def test_clear_requires_consecutive_successes():
+    actions, _ = _run([True, False, True, False, False], _policy(clear_count=2))
+    assert actions == [t.ACTION_RAISE, t.ACTION_NONE, t.ACTION_DUPLICATE, t.ACTION_NONE, t.ACTION_CLEAR]
+
+def test_flapping_notifies_once_then_suppresses():
+    actions, record = _run([True, False, True, False, True, False], _policy(flap_threshold=4))
+    assert actions.count(t.ACTION_FLAPPING) == 1
+    assert actions[-1] == t.ACTION_SUPPRESS
+    assert record['status'] == t.STATUS_FLAPPING
+
+def test_flapping_exits_after_flips_age_out():
+    policy = _policy(flap_threshold=4, flap_window_seconds=300)
+    _, record = _run([True, False, True, False, True], policy)
+    assert record['status'] == t.STATUS_FLAPPING
+    # 窗口过后翻转记录过期，持续失败按正常流程重新确认
+    actions, record = _run([True], policy, start=10_000, record=record)
+    assert actions == [t.ACTION_RAISE] and record['status'] == t.STATUS_REPORTED
+
+def test_policy_bounds():
+    policy = _policy(window=0, raise_count=5, clear_count=0)
+    assert policy['window'] == 1 and policy['raise_count'] == 1 and policy['clear_count'] == 1
+
+def test_is_changed_treats_none_as_empty():
+    assert not t.is_changed({'history': None}, {'history': ''})
+    assert t.is_changed({'history': '1'}, {'history': '10'})
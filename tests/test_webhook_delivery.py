@@ -0,0 +1,93 @@
+import types
+
+import pytest
+
+from core import reporter
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class _Response:
+    status_code = 200
+    text = '{"code": 0}'
+
+    def json(self):
+        return {'code': 0}
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(reporter, 'time', types.SimpleNamespace(time=clock.time, sleep=clock.sleep))
+    return clock
+
+@pytest.fixture
+def posted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(reporter, '_post_webhook', lambda url, payload, timeout=10: calls.append((url, payload)) or _Response())
+    return calls
+
+def test_token_bucket_allows_burst_then_paces(clock):
+    bucket = reporter._TokenBucket(per_minute=60, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(1.0)]
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = reporter._TokenBucket(per_minute=120, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 1.0
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == []
+
+def test_configure_webhooks_one_limiter_per_url(clock):
+    reporter.configure_webhooks({'FEISHU_WEBHOOKS': {'p1': 'http://a', 'p2': 'http://a', 'p3': 'http://b', 'table_sync_webhook': ''},
+                                 'FEISHU_RATE_LIMIT': {'per_minute': 30, 'burst': 2}})
+    try:
+        assert sorted(reporter._RATE_LIMITERS) == ['http://a', 'http://b']
+        assert reporter._RATE_LIMITERS['http://a'].capacity == 2
+    finally:
+        reporter._RATE_LIMITERS.clear()
+
+def _batcher(batch_size, flush_seconds=10):
+    return reporter.TableSyncBatcher({'FEISHU_WEBHOOKS': {'table_sync_webhook': 'http://table'},
+                                      'TABLE_SYNC_BATCH_SIZE': batch_size, 'TABLE_SYNC_FLUSH_SECONDS': flush_seconds})
+
+def test_batcher_submits_full_batches(clock, posted):
+    batcher = _batcher(2)
+    batcher.extend([{'host': 'a'}, {'host': 'b'}, {'host': 'c'}])
+    assert posted == [('http://table', {'records': [{'host': 'a'}, {'host': 'b'}]})]
+    batcher.flush()
+    assert posted[-1] == ('http://table', {'records': [{'host': 'c'}]})
+
+def test_batcher_flushes_by_age(clock, posted):
+    batcher = _batcher(10, flush_seconds=5)
+    batcher.extend([{'host': 'a'}])
+    clock.now += 4
+    batcher.flush_if_due()
+    assert posted == []
+    clock.now += 1
+    batcher.flush_if_due()
+    assert posted == [('http://table', {'records': [{'host': 'a'}]})]
+
+def test_batch_size_one_keeps_single_row_payload(clock, posted):
+    _batcher(1).extend([{'host': 'a'}, {'host': 'b'}])
+    assert posted == [('http://table', {'host': 'a'}), ('http://table', {'host': 'b'})]
+
+def test_batcher_without_webhook_drops_rows(clock, posted):
+    batcher = reporter.TableSyncBatcher({})
+    batcher.extend([{'host': 'a'}])
+    batcher.flush()
+    assert posted == []